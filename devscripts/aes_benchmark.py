@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+from __future__ import unicode_literals, print_function
+
+"""
+This script measures the throughput of the pure Python AES implementation
+
+Example:
+$ ./aes_benchmark.py --size 1
+aes_cbc_decrypt_bytes        1.01 MB/s
+...
+"""
+
+# Allow direct execution
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import optparse
+import random
+import timeit
+
+from youtube_dl.aes import (
+    BLOCK_SIZE_BYTES,
+    aes_cbc_decrypt,
+    aes_cbc_decrypt_bytes,
+    aes_ctr_decrypt,
+    aes_decrypt,
+    inc,
+    key_expansion,
+    xor,
+)
+from youtube_dl.utils import intlist_to_bytes
+
+
+def block_cbc_decrypt(data, key, iv):
+    # CBC decryption with the byte-oriented block cipher, as a reference
+    expanded_key = key_expansion(key)
+    decrypted_data = []
+    previous_cipher_block = iv
+    for i in range(0, len(data), BLOCK_SIZE_BYTES):
+        block = data[i:i + BLOCK_SIZE_BYTES]
+        decrypted_data += xor(aes_decrypt(block, expanded_key), previous_cipher_block)
+        previous_cipher_block = block
+    return decrypted_data
+
+
+class Counter(object):
+    def __init__(self, iv):
+        self.value = iv
+
+    def next_value(self):
+        value, self.value = self.value, inc(self.value)
+        return value
+
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [OPTIONS]')
+    parser.add_option(
+        '--size', type=float, default=1,
+        help='Size of the data to decrypt, in MB (default: %default)')
+    parser.add_option(
+        '--repeat', type=int, default=3,
+        help='Number of measurements, the best one is reported (default: %default)')
+    parser.add_option(
+        '--key-size', type='choice', default='16', choices=('16', '24', '32'),
+        help='Key size in bytes (default: %default)')
+    parser.add_option(
+        '--reference', action='store_true', default=False,
+        help='Also measure the byte-oriented block cipher (slow)')
+    opts, _ = parser.parse_args()
+
+    rng = random.Random(0)
+    size = int(opts.size * 1024 * 1024) // BLOCK_SIZE_BYTES * BLOCK_SIZE_BYTES
+    data = [rng.randrange(256) for _ in range(size)]
+    key = [rng.randrange(256) for _ in range(int(opts.key_size))]
+    iv = [rng.randrange(256) for _ in range(BLOCK_SIZE_BYTES)]
+    data_bytes, key_bytes, iv_bytes = map(intlist_to_bytes, (data, key, iv))
+
+    benchmarks = [
+        ('aes_cbc_decrypt_bytes', lambda: aes_cbc_decrypt_bytes(data_bytes, key_bytes, iv_bytes)),
+        ('aes_cbc_decrypt', lambda: aes_cbc_decrypt(data, key, iv)),
+        ('aes_ctr_decrypt', lambda: aes_ctr_decrypt(data, key, Counter(iv))),
+    ]
+    if opts.reference:
+        benchmarks.append(('aes_decrypt (per block)', lambda: block_cbc_decrypt(data, key, iv)))
+
+    for name, func in benchmarks:
+        best = min(timeit.repeat(func, repeat=opts.repeat, number=1))
+        print('%-24s %8.2f MB/s' % (name, size / best / 1024 / 1024))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,397 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+from __future__ import unicode_literals, print_function
+
+"""
+This script benchmarks hot paths of youtube-dl and compares the results of
+two runs
+
+Example:
+$ ./bench.py run -o before.json
+$ git checkout my-branch
+$ ./bench.py run -o after.json
+$ ./bench.py compare before.json after.json
+"""
+
+# Allow direct execution
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import datetime
+import json
+import platform
+import random
+import re
+import shutil
+import tempfile
+import threading
+import timeit
+
+from devscripts.utils import read_file, write_file
+from youtube_dl import YoutubeDL
+from youtube_dl.aes import aes_cbc_decrypt_bytes
+from youtube_dl.compat import (
+    compat_etree_fromstring,
+    compat_http_server,
+)
+from youtube_dl.downloader.http import HttpFD
+from youtube_dl.extractor import gen_extractors
+from youtube_dl.extractor.common import InfoExtractor
+from youtube_dl.jsinterp import JSInterpreter
+from youtube_dl.utils import (
+    js_to_json,
+    traverse_obj,
+)
+from youtube_dl.version import __version__
+
+TEST_DATA_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test', 'testdata')
+
+BENCHMARKS = []
+
+
+def benchmark(name):
+    """
+    Register a benchmark: the decorated function prepares its input and
+    returns the function to be timed
+    """
+    def wrapper(func):
+        BENCHMARKS.append((name, func))
+        return func
+    return wrapper
+
+
+class BenchIE(InfoExtractor):
+    pass
+
+
+def _ydl(params=None):
+    ydl_params = {'quiet': True, 'no_warnings': True}
+    ydl_params.update(params or {})
+    return YoutubeDL(ydl_params)
+
+
+def _test_data(kind):
+    """ Yield (name, content) for the fixtures of a kind """
+    directory = os.path.join(TEST_DATA_DIR, kind)
+    for fn in sorted(os.listdir(directory)):
+        yield os.path.splitext(fn)[0], read_file(os.path.join(directory, fn))
+
+
+@benchmark('jsinterp')
+def bench_jsinterp():
+    # shaped like a YouTube n-parameter function
+    jsi = JSInterpreter(r'''
+        function f(a){var b=a.split(""),c=[function(d,e){e=(e%d.length+d.length)%d.length;
+        d.splice(-e).reverse().forEach(function(f){d.unshift(f)})},
+        -1249707345,function(d,e){d.push(e)},
+        function(d){d.reverse()},
+        function(d,e){e=(e%d.length+d.length)%d.length;var f=d[0];d[0]=d[e];d[e]=f},
+        "fXtE",null,function(d,e){for(e=(e%d.length+d.length)%d.length;e--;)d.unshift(d.pop())},
+        b,
+        function(d,e){d.splice(0,1,d.splice(e,1,d[0])[0])}];
+        c[6]=c;
+        try{c[3](c[8]),c[0](c[8],1),c[4](c[8],5),c[7](c[8],13),c[9](c[8],3),c[3](c[8]),
+        c[4](c[8],11),c[7](c[8],2),c[0](c[8],7),c[9](c[8],4),c[3](c[8]),c[4](c[8],1)}
+        catch(g){return"enhanced_except_"+a}
+        return b.join("")}''')
+    func = jsi.extract_function('f')
+    return lambda: func(['abcdefghijklmnopqrstuvwxyz0123456789'])
+
+
+@benchmark('aes_cbc_decrypt')
+def bench_aes_cbc_decrypt():
+    rng = random.Random(0)
+    data, key, iv = [
+        bytes(bytearray(rng.randrange(256) for _ in range(size)))
+        for size in (64 * 1024, 16, 16)]
+    return lambda: aes_cbc_decrypt_bytes(data, key, iv)
+
+
+@benchmark('js_to_json')
+def bench_js_to_json():
+    code = '{%s}' % ','.join(
+        '''item%d: {id: %d, 'title': "Item \\"%d\\"", tags: ['a', 'b'], // comment
+        duration: 0x%x, ratio: .5, live: !0, next: undefined, url: "https:\\/\\/example.com\\/%d"}'''
+        % (i, i, i, i, i) for i in range(100))
+    return lambda: js_to_json(code)
+
+
+@benchmark('traverse_obj')
+def bench_traverse_obj():
+    obj = {'contents': [{
+        'videoRenderer': {
+            'videoId': 'id%d' % i,
+            'title': {'runs': [{'text': 'Video %d' % i}]},
+            'lengthText': {'simpleText': '%d:00' % i},
+            'badges': [{'label': 'HD'}] if i % 2 else [],
+        },
+    } for i in range(200)]}
+    paths = (
+        ('contents', Ellipsis, 'videoRenderer', 'videoId'),
+        ('contents', Ellipsis, 'videoRenderer', 'title', 'runs', 0, 'text'),
+        ('contents', Ellipsis, 'videoRenderer', ('lengthText', 'badges'), Ellipsis),
+        ('contents', -1, 'videoRenderer', 'missing', 'key'),
+    )
+    return lambda: [traverse_obj(obj, path) for path in paths]
+
+
+@benchmark('parse_m3u8_formats')
+def bench_parse_m3u8_formats():
+    ie = BenchIE(_ydl())
+    docs = list(_test_data('m3u8'))
+    return lambda: [
+        ie._parse_m3u8_formats(doc, 'http://example.com/%s.m3u8' % name, ext='mp4')
+        for name, doc in docs]
+
+
+def _xml_docs(kind):
+    return [(name, compat_etree_fromstring(doc.encode('utf-8'))) for name, doc in _test_data(kind)]
+
+
+@benchmark('parse_mpd_formats')
+def bench_parse_mpd_formats():
+    ie = BenchIE(_ydl())
+    docs = _xml_docs('mpd')
+    return lambda: [
+        ie._parse_mpd_formats_and_subtitles(
+            doc, mpd_base_url='http://example.com/', mpd_url='http://example.com/%s.mpd' % name)
+        for name, doc in docs]
+
+
+@benchmark('parse_f4m_formats')
+def bench_parse_f4m_formats():
+    ie = BenchIE(_ydl())
+    docs = _xml_docs('f4m')
+    return lambda: [
+        ie._parse_f4m_formats(doc, 'http://example.com/%s.f4m' % name, None)
+        for name, doc in docs]
+
+
+@benchmark('parse_xspf')
+def bench_parse_xspf():
+    ie = BenchIE(_ydl())
+    docs = _xml_docs('xspf')
+    return lambda: [
+        ie._parse_xspf(doc, name, xspf_url='http://example.com/%s.xspf' % name,
+                       xspf_base_url='http://example.com/')
+        for name, doc in docs]
+
+
+@benchmark('format_selector')
+def bench_format_selector():
+    ydl = _ydl()
+    formats = []
+    for height in (144, 240, 360, 480, 720, 1080, 1440, 2160):
+        for ext, vcodec in (('mp4', 'avc1.4d401e'), ('webm', 'vp9')):
+            formats.append({
+                'format_id': '%s-%d' % (ext, height), 'url': 'http://example.com/v',
+                'ext': ext, 'vcodec': vcodec, 'acodec': 'none',
+                'height': height, 'width': height * 16 // 9, 'tbr': height * 2.5,
+            })
+    for ext, acodec, abr in (('m4a', 'mp4a.40.2', 128), ('webm', 'opus', 160), ('m4a', 'mp4a.40.5', 48)):
+        formats.append({
+            'format_id': '%s-%d' % (ext, abr), 'url': 'http://example.com/a',
+            'ext': ext, 'vcodec': 'none', 'acodec': acodec, 'abr': abr, 'tbr': abr,
+        })
+    formats.append({
+        'format_id': '18', 'url': 'http://example.com/18', 'ext': 'mp4',
+        'vcodec': 'avc1.42001E', 'acodec': 'mp4a.40.2', 'height': 360, 'tbr': 500,
+    })
+    spec = 'bestvideo[height<=?1080][ext=mp4]+bestaudio[ext=m4a]/bestvideo+bestaudio/best[height<=720]/best'
+
+    def select():
+        selector = ydl.build_format_selector(spec)
+        return list(selector({'formats': formats, 'incomplete_formats': False}))
+    return select
+
+
+@benchmark('extractor_dispatch')
+def bench_extractor_dispatch():
+    ydl = _ydl()
+    urls = [
+        tc['url'] for ie in gen_extractors()
+        for tc in ie.get_testcases(include_onlymatching=True)]
+    # a deterministic sample of the test URLs, plus URLs left to the generic extractor
+    urls = urls[::20] + ['http://example.com/video%d.html' % i for i in range(20)]
+    # initialize the extractors outside of the timed code
+    for url in urls:
+        ydl._suitable_info_extractor(url)
+    return lambda: [ydl._suitable_info_extractor(url) for url in urls]
+
+
+@benchmark('html_metadata')
+def bench_html_metadata():
+    # a metadata-heavy page, searched like by the generic extractor
+    ie = BenchIE(_ydl())
+    props = ['title', 'description', 'image', 'url', 'type', 'site_name', 'video:duration']
+    html = '<html><head>%s%s</head><body>%s</body></html>' % (
+        ''.join('<meta property="og:%s" content="%s value">\n' % (p, p) for p in props),
+        ''.join('<meta name="meta%d" content="value %d">\n' % (i, i) for i in range(100)),
+        ''.join('<div class="item" id="item%d"><a href="/watch/%d">Item %d</a></div>\n' % (i, i, i)
+                for i in range(2000)))
+
+    def search():
+        return [
+            ie._og_search_title(html), ie._og_search_description(html),
+            ie._og_search_thumbnail(html), ie._og_search_url(html),
+            ie._og_search_video_url(html, default=None),
+            ie._og_search_property('video:duration', html, fatal=False),
+            ie._html_search_meta(('description', 'twitter:description'), html),
+            ie._html_search_meta(['meta%d' % i for i in (99, 50, 0)], html),
+            ie._html_search_regex(r'<title>([^<]+)</title>', html, 'title', default=None),
+        ] + [ie._search_regex(r'id="item%d"' % i, html, 'item', default=None, group=0)
+             for i in range(0, 2000, 50)]
+    return search
+
+
+class _HTTPDownloadHandler(compat_http_server.BaseHTTPRequestHandler):
+    SIZE = 16 * 1024 * 1024
+    BLOCK = b'\0' * (1024 * 1024)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Content-Length', '%d' % self.SIZE)
+        self.end_headers()
+        for _ in range(self.SIZE // len(self.BLOCK)):
+            self.wfile.write(self.BLOCK)
+
+
+@benchmark('http_download')
+def bench_http_download():
+    # the receive loop of HttpFD, downloading from a local server
+    httpd = compat_http_server.HTTPServer(('127.0.0.1', 0), _HTTPDownloadHandler)
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+    url = 'http://127.0.0.1:%d/' % httpd.server_address[1]
+    directory = tempfile.mkdtemp(prefix='ytdl-bench-')
+    filename = os.path.join(directory, 'video.mp4')
+    params = {'quiet': True, 'noprogress': True, 'continuedl': False}
+    fd = HttpFD(_ydl(params), params)
+
+    def download():
+        fd.real_download(filename, {'url': url})
+        os.remove(filename)
+    download.cleanup = lambda: (httpd.shutdown(), shutil.rmtree(directory))
+    return download
+
+
+def measure(func, repeat, min_time):
+    """
+    Return the time of a call of func in seconds for each of the repeat
+    measurements, each one calling func enough times to last min_time
+    """
+    timer = timeit.Timer(func)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9) * 1.2))
+    return number, [elapsed / number] + [
+        timer.timeit(number) / number for _ in range(repeat - 1)]
+
+
+def run(opts):
+    results = {}
+    for name, setup in BENCHMARKS:
+        if opts.filter and not re.search(opts.filter, name):
+            continue
+        func = setup()
+        try:
+            number, times = measure(func, opts.repeat, opts.min_time)
+        finally:
+            getattr(func, 'cleanup', lambda: None)()
+        times.sort()
+        results[name] = {
+            'best': times[0],
+            'median': times[len(times) // 2],
+            'number': number,
+            'repeat': opts.repeat,
+        }
+        print('%-24s %12s' % (name, format_time(times[0])))
+    report = {
+        'version': __version__,
+        'python': '%s %s' % (platform.python_implementation(), platform.python_version()),
+        'platform': platform.platform(),
+        'date': datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'benchmarks': results,
+    }
+    if opts.output:
+        write_file(opts.output, json.dumps(report, indent=2, sort_keys=True) + '\n')
+    return 0
+
+
+def compare(opts):
+    old, new = [json.loads(read_file(fn))['benchmarks'] for fn in (opts.old, opts.new)]
+    regressions = []
+    print('%-24s %12s %12s %8s' % ('benchmark', 'old', 'new', 'change'))
+    for name in sorted(set(old) | set(new)):
+        if name not in old or name not in new:
+            print('%-24s %12s %12s' % (
+                name, format_time(old[name]['best']) if name in old else '-',
+                format_time(new[name]['best']) if name in new else '-'))
+            continue
+        change = new[name]['best'] / old[name]['best'] - 1
+        regressed = change > opts.threshold / 100
+        if regressed:
+            regressions.append(name)
+        print('%-24s %12s %12s %+7.1f%%%s' % (
+            name, format_time(old[name]['best']), format_time(new[name]['best']),
+            change * 100, '  REGRESSION' if regressed else ''))
+    if regressions:
+        print('\n%d benchmark(s) slower by more than %g%%: %s' % (
+            len(regressions), opts.threshold, ', '.join(regressions)))
+        return 1
+    return 0
+
+
+def format_time(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            break
+    return '%.3f %s' % (seconds / scale, unit)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark hot paths of youtube-dl')
+    subparsers = parser.add_subparsers(dest='command')
+
+    run_parser = subparsers.add_parser('run', help='Run the benchmarks')
+    run_parser.add_argument(
+        '-o', '--output', metavar='FILE', help='Write the results to FILE as JSON')
+    run_parser.add_argument(
+        '-k', '--filter', metavar='REGEX', help='Only run the benchmarks whose name matches REGEX')
+    run_parser.add_argument(
+        '--repeat', type=int, default=5, help='Number of measurements per benchmark (default: %(default)s)')
+    run_parser.add_argument(
+        '--min-time', type=float, default=0.2,
+        help='Minimum duration of a measurement in seconds (default: %(default)s)')
+
+    compare_parser = subparsers.add_parser(
+        'compare', help='Compare two results files, failing if a benchmark regressed')
+    compare_parser.add_argument('old', help='Results of the reference run')
+    compare_parser.add_argument('new', help='Results of the run to check')
+    compare_parser.add_argument(
+        '--threshold', type=float, default=10,
+        help='Slowdown in percent above which a benchmark regressed (default: %(default)s)')
+
+    opts = parser.parse_args()
+    if opts.command == 'run':
+        return run(opts)
+    if opts.command == 'compare':
+        return compare(opts)
+    parser.print_help()
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
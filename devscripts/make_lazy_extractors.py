@@ -28,6 +28,7 @@ compat_register_utf8()
 
 from youtube_dl.extractor import _ALL_CLASSES
 from youtube_dl.extractor.common import InfoExtractor, SearchInfoExtractor
+from youtube_dl.extractor.dispatch import dispatch_keys
 
 module_template = read_file('devscripts/lazy_load_template.py')
 
@@ -48,6 +49,7 @@ module_contents = [
 ie_template = '''
 class {name}({bases}):
     _VALID_URL = {valid_url!r}
+    _DISPATCH_KEYS = {dispatch_keys!r}
     _module = '{module}'
 '''
 
@@ -73,6 +75,7 @@ def build_lazy_ie(ie, name):
         name=name,
         bases=', '.join(map(get_base_name, ie.__bases__)),
         valid_url=valid_url,
+        dispatch_keys=dispatch_keys(ie),
         module=ie.__module__)
     if ie.suitable.__func__ is not InfoExtractor.suitable.__func__:
         s += '\n' + get_source(ie.suitable)
@@ -9,6 +9,7 @@ import unittest
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import re
 import threading
 
 from test.helper import (
@@ -69,6 +70,14 @@ class TestInfoExtractor(unittest.TestCase):
         search = lambda re, *args: self.ie._html_search_regex(re, html, *args)
         self.assertEqual(search(r'<p id="foo">(.+?)</p>', 'foo'), 'Watch this video')
 
+    def test_compile_regex(self):
+        regex = self.ie._compile_regex(r'(?P<id>[a-z]+)', re.I)
+        self.assertIs(self.ie._compile_regex(r'(?P<id>[a-z]+)', re.I), regex)
+        self.assertIsNot(self.ie._compile_regex(r'(?P<id>[a-z]+)'), regex)
+        self.assertIs(self.ie._compile_regex(regex), regex)
+        self.assertEqual(self.ie._search_regex(regex, 'ID', 'id', group='id'), 'ID')
+        self.assertRaises(ValueError, self.ie._search_regex, regex, 'ID', 'id', flags=re.I)
+
     def test_opengraph(self):
         ie = self.ie
         html = '''
@@ -10,7 +10,11 @@ import unittest
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import copy
+import io
 import json
+import subprocess
+import threading
+import time
 
 from test.helper import (
     FakeYDL,
@@ -27,12 +31,16 @@ from youtube_dl.compat import (
     compat_urllib_error,
 )
 
+from youtube_dl.downloader.common import FileDownloader
+from youtube_dl.downloader.http import HttpFD
 from youtube_dl.extractor import YoutubeIE
 from youtube_dl.extractor.common import InfoExtractor
 from youtube_dl.postprocessor.common import PostProcessor
 from youtube_dl.utils import (
     ExtractorError,
     match_filter_func,
+    OnDemandPagedList,
+    PostProcessingError,
     traverse_obj,
 )
 
@@ -686,6 +694,21 @@ class TestYoutubeDL(unittest.TestCase):
         self.assertEqual(fname('Hello %(title1)s'), 'Hello $PATH')
         self.assertEqual(fname('Hello %(title2)s'), 'Hello %PATH%')
 
+    def test_prepare_filename_reused_template(self):
+        # The compiled template must follow the fields of each call
+        ydl = YoutubeDL({'outtmpl': '%(playlist_index)s-%(height)04d-%(title)s.%(ext)s'})
+        self.assertEqual(ydl.prepare_filename({
+            'title': 'a/b', 'ext': 'mp4', 'height': 720, 'playlist_index': 3, 'n_entries': 120,
+        }), '003-0720-a_b.mp4')
+        self.assertEqual(ydl.prepare_filename({
+            'title': 'c', 'ext': 'webm', 'playlist_index': 4, 'n_entries': 9,
+        }), '4-NA-c.webm')
+        self.assertEqual(ydl.prepare_filename({
+            'title': 'd', 'ext': 'mp4', 'height': 1080, 'playlist_index': 5, 'n_entries': 10,
+        }), '05-1080-d.mp4')
+        ydl.params['outtmpl'] = '%(id)s.%(ext)s'
+        self.assertEqual(ydl.prepare_filename({'id': 'x', 'ext': 'mp4'}), 'x.mp4')
+
     def test_format_note(self):
         ydl = YoutubeDL()
         self.assertEqual(ydl._format_note({}), '')
@@ -901,6 +924,66 @@ class TestYoutubeDL(unittest.TestCase):
         self.assertEqual(result[1]['playlist_index'], 2)
         # @}
 
+    def test_lazy_playlist(self):
+        def get_events(params, make_entries):
+            events = []
+
+            class _YDL(YDL):
+                def process_info(self, info_dict):
+                    events.append((info_dict['id'], info_dict['playlist_index']))
+
+            def entry(i):
+                return {'id': compat_str(i), 'title': compat_str(i), 'url': TEST_URL}
+
+            def get_page(pagenum):
+                events.append('page %d' % pagenum)
+                return [entry(i) for i in range(pagenum * 2 + 1, min(pagenum * 2 + 3, 6))]
+
+            def generate():
+                for i in range(1, 6):
+                    events.append('entry %d' % i)
+                    yield entry(i)
+
+            params['lazy_playlist'] = True
+            res = _YDL(params).process_ie_result({
+                '_type': 'playlist',
+                'id': 'test',
+                'entries': OnDemandPagedList(get_page, 2) if make_entries == 'paged' else generate(),
+                'extractor': 'test:playlist',
+                'extractor_key': 'test:playlist',
+                'webpage_url': 'http://example.com',
+            })
+            # processed entries are only kept to be printed, or if the
+            # playlist is not processed lazily
+            keep_results = params.get('dump_single_json') or params.get('playlistreverse')
+            self.assertEqual(
+                len(res['entries']),
+                len([e for e in events if isinstance(e, tuple)]) if keep_results else 0)
+            return events
+
+        # each page is only fetched when its first entry is reached
+        self.assertEqual(get_events({}, 'paged'), [
+            'page 0', ('1', 1), ('2', 2), 'page 1', ('3', 3), ('4', 4), 'page 2', ('5', 5)])
+        self.assertEqual(get_events({'playliststart': 2, 'playlistend': 3}, 'paged'), [
+            'page 0', ('2', 2), 'page 1', ('3', 3)])
+        self.assertEqual(get_events({'playlist_items': '3,1'}, 'paged'), [
+            'page 1', ('3', 3), 'page 0', ('1', 1)])
+        self.assertEqual(get_events({'dump_single_json': True}, 'paged'), [
+            'page 0', ('1', 1), ('2', 2), 'page 1', ('3', 3), ('4', 4), 'page 2', ('5', 5)])
+        self.assertEqual(get_events({}, 'generator'), [
+            'entry 1', ('1', 1), 'entry 2', ('2', 2), 'entry 3', ('3', 3),
+            'entry 4', ('4', 4), 'entry 5', ('5', 5)])
+        self.assertEqual(get_events({'playlist_items': '2,1'}, 'generator'), [
+            'entry 1', 'entry 2', ('2', 2), ('1', 1)])
+        self.assertEqual(get_events({'playlist_items': '2,7'}, 'generator'), [
+            'entry 1', 'entry 2', ('2', 2), 'entry 3', 'entry 4', 'entry 5'])
+        # the whole playlist is needed to reverse it
+        self.assertEqual(get_events({'playlistreverse': True, 'playlistend': 2}, 'generator'), [
+            'entry 1', 'entry 2', ('2', 1), ('1', 2)])
+        # entries are only fetched ahead to be extracted concurrently
+        self.assertEqual(get_events({'concurrent_entries': 3}, 'paged'), [
+            'page 0', 'page 1', ('1', 1), ('2', 2), 'page 2', ('3', 3), ('4', 4), ('5', 5)])
+
     def test_urlopen_no_file_protocol(self):
         # see https://github.com/ytdl-org/youtube-dl/issues/8227
         ydl = YDL()
@@ -1012,6 +1095,375 @@ class TestYoutubeDL(unittest.TestCase):
         self.assertEqual(downloaded['extractor'], 'Video')
         self.assertEqual(downloaded['extractor_key'], 'Video')
 
+    def test_concurrent_entries(self):
+        lock = threading.Lock()
+        state = {'running': 0, 'max_running': 0, 'extracting': [], 'shared': False}
+
+        class VideoIE(InfoExtractor):
+            _VALID_URL = r'video:(?P<id>\d+)'
+
+            def _real_extract(self, url):
+                video_id = self._match_id(url)
+                with lock:
+                    state['running'] += 1
+                    state['max_running'] = max(state['max_running'], state['running'])
+                    state['shared'] = state['shared'] or self in state['extracting']
+                    state['extracting'].append(self)
+                self.to_screen('%s: Extracting' % video_id)
+                time.sleep(0.05 if video_id == '1' else 0.01)
+                with lock:
+                    state['running'] -= 1
+                    state['extracting'].remove(self)
+                if video_id == '3':
+                    raise ExtractorError('Video 3 is unavailable', expected=True)
+                return {
+                    'id': video_id,
+                    'title': 'Video %s' % video_id,
+                    'url': TEST_URL,
+                }
+
+        class PlaylistIE(InfoExtractor):
+            _VALID_URL = r'playlist:'
+
+            def _real_extract(self, url):
+                return self.playlist_result([
+                    self.url_result('video:%d' % n, VideoIE.ie_key())
+                    for n in range(1, 9)])
+
+        class Logger(list):
+            def debug(self, msg):
+                self.append(msg)
+
+            error = warning = debug
+
+        class LoggingYDL(YDL):
+            def to_screen(self, msg, skip_eol=False):
+                return YoutubeDL.to_screen(self, msg, skip_eol)
+
+        def run(concurrent_entries):
+            state['max_running'] = 0
+            logger = Logger()
+            ydl = LoggingYDL({
+                'concurrent_entries': concurrent_entries,
+                'ignoreerrors': True,
+                'logger': logger,
+            })
+            ydl.trouble = lambda message, *_, **__: ydl.to_stderr(message)
+            ydl.add_info_extractor(VideoIE(ydl))
+            ydl.add_info_extractor(PlaylistIE(ydl))
+            ydl.extract_info('playlist:')
+            self.assertEqual(
+                [(d['id'], d['playlist_index']) for d in ydl.downloaded_info_dicts],
+                [(compat_str(n), n) for n in range(1, 9) if n != 3])
+            return logger
+
+        sequential_output = run(1)
+        self.assertEqual(state['max_running'], 1)
+        self.assertEqual(run(4), sequential_output)
+        self.assertGreater(state['max_running'], 1)
+        self.assertLessEqual(state['max_running'], 4)
+        # concurrent extractions don't share an extractor instance
+        self.assertFalse(state['shared'])
+
+    def test_concurrent_sidecar_downloads(self):
+        filename = 'test_sidecars.mp4'
+        sidecars = ['test_sidecars.%s.vtt' % lang for lang in ('en', 'fr', 'de')] + [
+            'test_sidecars.mp4_%d.jpg' % n for n in range(3)]
+
+        class SidecarIE(InfoExtractor):
+            def _request_webpage(self, url, *args, **kwargs):
+                return self._downloader.urlopen(url)
+
+        class TruncatedResponse(io.BytesIO):
+            def read(self, *args):
+                data = super(TruncatedResponse, self).read(4)
+                if not data:
+                    raise IOError('connection reset')
+                return data
+
+        class SidecarYDL(YDL):
+            def urlopen(self, req):
+                url = req if isinstance(req, compat_str) else req.get_full_url()
+                # make later sidecars likely to complete first
+                time.sleep(0.05 if '/en.' in url or '/0.' in url else 0.01)
+                if '/missing/' in url:
+                    raise compat_urllib_error.URLError('not found')
+                if '/truncated/' in url:
+                    return TruncatedResponse(url.encode('utf-8'))
+                return io.BytesIO(url.encode('utf-8'))
+
+            def report_warning(self, message):
+                self.msgs.append('WARNING: ' + message)
+
+        class VideoFD(object):
+            def __init__(self, ydl, params):
+                pass
+
+            def download(self, name, info_dict):
+                with open(name, 'wb') as f:
+                    f.write(b'video')
+                return True
+
+        def sub(lang, path=''):
+            return {'url': 'http://localhost/%s%s.vtt' % (path, lang), 'ext': 'vtt'}
+
+        def run(concurrent_sidecar_downloads):
+            ydl = SidecarYDL({
+                'outtmpl': 'test_sidecars.%(ext)s',
+                'writesubtitles': True,
+                'write_all_thumbnails': True,
+                'concurrent_sidecar_downloads': concurrent_sidecar_downloads,
+            })
+            ie = SidecarIE(ydl)
+            ydl.add_info_extractor(ie)
+            YoutubeDL.process_info(ydl, {
+                'id': 'sidecars',
+                'title': 'sidecars',
+                'url': TEST_URL,
+                'ext': 'mp4',
+                'extractor': 'test',
+                'extractor_key': ie.ie_key(),
+                'webpage_url': 'http://localhost/sidecars',
+                'requested_subtitles': dict(
+                    [(lang, sub(lang)) for lang in ('en', 'fr', 'de')]
+                    + [('it', sub('it', 'missing/')), ('es', sub('es', 'truncated/'))]),
+                'thumbnails': [
+                    {'id': compat_str(n), 'url': 'http://localhost/%s%d.jpg' % ('missing/' if n == 3 else '', n)}
+                    for n in range(4)],
+            })
+            for fn in sidecars:
+                with open(fn, 'rb') as f:
+                    self.assertTrue(f.read().startswith(b'http://localhost/'))
+            # nothing is left of the interrupted subtitle download
+            for fn in ('test_sidecars.es.vtt', 'test_sidecars.es.vtt.part'):
+                self.assertFalse(os.path.exists(fn))
+            return ydl.msgs
+
+        ydl_module = sys.modules[YoutubeDL.__module__]
+        get_suitable_downloader = ydl_module.get_suitable_downloader
+        ydl_module.get_suitable_downloader = lambda *args: VideoFD
+        try:
+            sequential_msgs = run(1)
+            self.assertIn('WARNING: Unable to download subtitle for "it": <urlopen error not found>', sequential_msgs)
+            self.assertIn('WARNING: Unable to download subtitle for "es": connection reset', sequential_msgs)
+            concurrent_msgs = run(4)
+            # results are reported after the video download, in the same order
+            is_result = lambda msg: msg.startswith('WARNING') or 'Writing thumbnail' in msg
+            self.assertEqual(
+                list(filter(is_result, concurrent_msgs)), list(filter(is_result, sequential_msgs)))
+            self.assertEqual(sorted(concurrent_msgs), sorted(sequential_msgs))
+        finally:
+            ydl_module.get_suitable_downloader = get_suitable_downloader
+            for fn in [filename, 'test_sidecars.info.json'] + sidecars:
+                try_rm(fn)
+
+    def test_concurrent_format_downloads(self):
+        events = []
+
+        class FormatFD(FileDownloader):
+            def real_download(self, filename, info_dict):
+                format_id = info_dict['format_id']
+                events.append(('start', format_id))
+                for i in range(1, 11):
+                    time.sleep(0.01)
+                    if format_id == 'fail' and i == 3:
+                        events.append(('fail', format_id))
+                        return False
+                    if format_id == 'raise' and i == 3:
+                        raise compat_urllib_error.URLError('connection reset')
+                    self._hook_progress({
+                        'status': 'downloading',
+                        'filename': filename,
+                        'downloaded_bytes': i * 10,
+                        'total_bytes': 100,
+                        'speed': 1000,
+                    })
+                events.append(('end', format_id))
+                self._hook_progress({
+                    'status': 'finished',
+                    'filename': filename,
+                    'downloaded_bytes': 100,
+                    'total_bytes': 100,
+                })
+                return True
+
+        class FormatsYDL(YDL):
+            def to_screen(self, msg, skip_eol=False):
+                self.msgs.append(msg)
+
+            def report_warning(self, message):
+                self.msgs.append('WARNING: ' + message)
+
+            def report_error(self, message):
+                self.msgs.append('ERROR: ' + message)
+
+            def post_process(self, filename, info_dict):
+                events.append(('post_process', info_dict['__files_to_merge']))
+
+        def run(format_ids):
+            del events[:]
+            ydl = FormatsYDL({
+                'outtmpl': 'test_formats.%(ext)s',
+                'concurrent_format_downloads': True,
+                'progress_with_newline': True,
+            })
+            hooked = []
+            ydl.add_progress_hook(lambda s: hooked.append((s['status'], s['filename'])))
+            YoutubeDL.process_info(ydl, {
+                'id': 'formats',
+                'title': 'formats',
+                'ext': 'mp4',
+                'extractor': 'test',
+                'webpage_url': 'http://localhost/formats',
+                'requested_formats': [
+                    {'format_id': format_id, 'url': TEST_URL, 'ext': 'mp4'}
+                    for format_id in format_ids],
+            })
+            return ydl.msgs, hooked
+
+        ydl_module = sys.modules[YoutubeDL.__module__]
+        get_suitable_downloader = ydl_module.get_suitable_downloader
+        ydl_module.get_suitable_downloader = lambda *args: FormatFD
+        try:
+            msgs, hooked = run(['video', 'audio'])
+            # both formats are downloaded at the same time, then merged
+            self.assertEqual(sorted(events[:2]), [('start', 'audio'), ('start', 'video')])
+            self.assertEqual(events[-1], ('post_process', [
+                'test_formats.fvideo.mp4', 'test_formats.faudio.mp4']))
+            # user hooks get the progress of each format, the screen the combined one
+            self.assertIn(('finished', 'test_formats.fvideo.mp4'), hooked)
+            self.assertIn(('finished', 'test_formats.faudio.mp4'), hooked)
+            progress = [msg for msg in msgs if msg.startswith('[download] ') and ' of ' in msg]
+            self.assertTrue(progress[-1].startswith('[download] 100% of 200.00B'))
+            self.assertFalse([msg for msg in progress[:-1] if '100%' in msg])
+
+            # a failed download cancels the other one and prevents the merge
+            run(['fail', 'audio'])
+            self.assertIn(('fail', 'fail'), events)
+            self.assertNotIn(('end', 'audio'), events)
+            self.assertNotIn('post_process', [event[0] for event in events])
+
+            msgs, _ = run(['video', 'raise'])
+            self.assertNotIn(('end', 'video'), events)
+            self.assertIn('ERROR: unable to download video data: <urlopen error connection reset>', msgs)
+        finally:
+            ydl_module.get_suitable_downloader = get_suitable_downloader
+            try_rm('test_formats.info.json')
+
+    @unittest.skipUnless(hasattr(os, 'mkfifo'), 'named pipes are not available')
+    def test_stream_merge(self):
+        # concatenates its inputs instead of merging them
+        MERGE_SCRIPT = """import sys
+with open(sys.argv[1], 'wb') as out:
+    for fn in sys.argv[2:]:
+        with open(fn, 'rb') as f:
+            data = f.read()
+        if not data:
+            sys.exit('empty input')
+        out.write(data)
+"""
+
+        class Merger(object):
+            available = True
+
+            def __init__(self, downloader):
+                pass
+
+            def can_merge(self):
+                return True
+
+            def start_merge(self, input_paths, out_path):
+                return subprocess.Popen(
+                    [sys.executable, '-c', MERGE_SCRIPT, out_path] + input_paths,
+                    stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+            def check_ffmpeg_result(self, p, stderr):
+                if p.returncode != 0:
+                    raise PostProcessingError(stderr.decode('utf-8').strip())
+
+        class FormatFD(HttpFD):
+            def real_download(self, filename, info_dict):
+                format_id = info_dict['format_id']
+                if format_id == 'fail':
+                    return False
+                with open(filename, 'wb') as f:
+                    for i in range(1, 11):
+                        if format_id != 'empty':
+                            f.write(format_id.encode('ascii') * 100)
+                        self._hook_progress({
+                            'status': 'downloading',
+                            'filename': filename,
+                            'downloaded_bytes': i * 100,
+                            'total_bytes': 1000,
+                        })
+                self._hook_progress({
+                    'status': 'finished',
+                    'filename': filename,
+                    'downloaded_bytes': 1000,
+                    'total_bytes': 1000,
+                })
+                return True
+
+        class StreamYDL(YDL):
+            def to_screen(self, msg, skip_eol=False):
+                self.msgs.append(msg)
+
+            def report_warning(self, message):
+                self.msgs.append('WARNING: ' + message)
+
+            def report_error(self, message):
+                self.msgs.append('ERROR: ' + message)
+
+            def post_process(self, filename, info_dict):
+                self.msgs.append(('post_process', filename, info_dict.get('__files_to_merge')))
+
+        def run(format_ids):
+            ydl = StreamYDL({
+                'outtmpl': 'test_stream.%(ext)s',
+                'stream_merge': True,
+            })
+            YoutubeDL.process_info(ydl, {
+                'id': 'stream',
+                'title': 'stream',
+                'ext': 'mp4',
+                'extractor': 'test',
+                'webpage_url': 'http://localhost/stream',
+                'requested_formats': [
+                    {'format_id': format_id, 'url': TEST_URL, 'ext': 'mp4'}
+                    for format_id in format_ids],
+            })
+            self.assertFalse(os.path.exists('test_stream.temp.mp4'))
+            return ydl.msgs
+
+        ydl_module = sys.modules[YoutubeDL.__module__]
+        get_suitable_downloader = ydl_module.get_suitable_downloader
+        merger_class = ydl_module.FFmpegMergerPP
+        ydl_module.get_suitable_downloader = lambda *args: FormatFD
+        ydl_module.FFmpegMergerPP = Merger
+        try:
+            msgs = run(['video', 'audio'])
+            with open('test_stream.mp4', 'rb') as f:
+                self.assertEqual(f.read(), b'video' * 1000 + b'audio' * 1000)
+            # the formats were only written to the pipes
+            self.assertFalse(os.path.exists('test_stream.fvideo.mp4'))
+            self.assertFalse(os.path.exists('test_stream.faudio.mp4'))
+            self.assertEqual(msgs[-1], ('post_process', 'test_stream.mp4', None))
+            try_rm('test_stream.mp4')
+
+            # the merge is stopped when a download fails
+            msgs = run(['video', 'fail'])
+            self.assertFalse(os.path.exists('test_stream.mp4'))
+            self.assertNotIn('post_process', [msg[0] for msg in msgs])
+
+            msgs = run(['video', 'empty'])
+            self.assertFalse(os.path.exists('test_stream.mp4'))
+            self.assertIn('ERROR: unable to merge the formats: empty input', msgs)
+        finally:
+            ydl_module.get_suitable_downloader = get_suitable_downloader
+            ydl_module.FFmpegMergerPP = merger_class
+            for fn in ('test_stream.mp4', 'test_stream.info.json'):
+                try_rm(fn)
+
     def test_default_times(self):
         """Test addition of missing upload/release/_date from /release_/timestamp"""
         info = {
@@ -1031,6 +1483,46 @@ class TestYoutubeDL(unittest.TestCase):
         self.assertTrue(isinstance(out_info['release_date'], compat_str))
         self.assertEqual(out_info['release_date'], '20210930')
 
+    def test_download_archive(self):
+        archive_fn = 'test_download_archive.txt'
+        try_rm(archive_fn)
+        info = lambda vid: {'id': vid, 'extractor_key': 'TestEx'}
+        try:
+            with open(archive_fn, 'w', encoding='utf-8') as f:
+                f.write('testex 1\r\ntestex 2\n\n')
+            ydl = FakeYDL({'download_archive': archive_fn})
+            self.assertTrue(ydl.in_download_archive(info('1')))
+            self.assertTrue(ydl.in_download_archive(info('2')))
+            self.assertFalse(ydl.in_download_archive(info('3')))
+
+            ydl.record_download_archive(info('3'))
+            self.assertTrue(ydl.in_download_archive(info('3')))
+
+            # entries appended by another process, the last one partially
+            other_ydl = FakeYDL({'download_archive': archive_fn})
+            other_ydl.record_download_archive(info('4'))
+            with open(archive_fn, 'a', encoding='utf-8') as f:
+                f.write('testex 5')
+            self.assertTrue(ydl.in_download_archive(info('4')))
+            self.assertFalse(ydl.in_download_archive(info('5')))
+            with open(archive_fn, 'a', encoding='utf-8') as f:
+                f.write('6\n')
+            self.assertTrue(ydl.in_download_archive(info('56')))
+            self.assertFalse(ydl.in_download_archive(info('5')))
+
+            with open(archive_fn, 'r', encoding='utf-8') as f:
+                self.assertEqual(
+                    f.read().split(),
+                    ['testex', '1', 'testex', '2', 'testex', '3', 'testex', '4', 'testex', '56'])
+
+            # archive replaced by a shorter file
+            with open(archive_fn, 'w', encoding='utf-8') as f:
+                f.write('testex 7\n')
+            self.assertTrue(ydl.in_download_archive(info('7')))
+            self.assertFalse(ydl.in_download_archive(info('1')))
+        finally:
+            try_rm(archive_fn)
+
 
 class TestYoutubeDLCookies(unittest.TestCase):
 
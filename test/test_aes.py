@@ -8,9 +8,19 @@ import sys
 import unittest
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from youtube_dl.aes import aes_decrypt, aes_encrypt, aes_cbc_decrypt, aes_cbc_encrypt, aes_decrypt_text, aes_ecb_encrypt
+from youtube_dl.aes import (
+    aes_cbc_decrypt,
+    aes_cbc_decrypt_bytes,
+    aes_cbc_encrypt,
+    aes_decrypt,
+    aes_decrypt_text,
+    aes_ecb_encrypt,
+    aes_encrypt,
+    key_expansion,
+)
 from youtube_dl.utils import bytes_to_intlist, intlist_to_bytes
 import base64
+import random
 
 # the encrypted data can be generate with 'devscripts/generate_aes_testdata.py'
 
@@ -34,6 +44,29 @@ class TestAES(unittest.TestCase):
         decrypted = intlist_to_bytes(aes_cbc_decrypt(data, self.key, self.iv))
         self.assertEqual(decrypted.rstrip(b'\x08'), self.secret_msg)
 
+    def test_cbc_decrypt_bytes(self):
+        data = b"\x97\x92+\xe5\x0b\xc3\x18\x91ky9m&\xb3\xb5@\xe6'\xc2\x96.\xc8u\x88\xab9-[\x9e|\xf1\xcd"
+        decrypted = aes_cbc_decrypt_bytes(data, intlist_to_bytes(self.key), intlist_to_bytes(self.iv))
+        self.assertEqual(decrypted.rstrip(b'\x08'), self.secret_msg)
+
+    def test_cbc_decrypt_matches_block_cipher(self):
+        rng = random.Random(2015)
+        for key_size in (16, 24, 32):
+            key = [rng.randrange(256) for _ in range(key_size)]
+            iv = [rng.randrange(256) for _ in range(16)]
+            data = [rng.randrange(256) for _ in range(80)]
+            expanded_key = key_expansion(key)
+            expected = []
+            previous_block = iv
+            for i in range(0, len(data), 16):
+                block = data[i:i + 16]
+                expected += [x ^ y for x, y in zip(aes_decrypt(block, expanded_key), previous_block)]
+                previous_block = block
+            self.assertEqual(aes_cbc_decrypt(data, key, iv), expected)
+            self.assertEqual(
+                aes_cbc_decrypt_bytes(intlist_to_bytes(data), intlist_to_bytes(key), intlist_to_bytes(iv)),
+                intlist_to_bytes(expected))
+
     def test_cbc_encrypt(self):
         data = bytes_to_intlist(self.secret_msg)
         encrypted = intlist_to_bytes(aes_cbc_encrypt(data, self.key, self.iv))
@@ -17,6 +17,7 @@ from youtube_dl.extractor import (
     gen_extractors,
     YoutubeIE,
 )
+from youtube_dl.extractor.dispatch import URLDispatchIndex
 
 
 class TestAllURLsMatching(unittest.TestCase):
@@ -112,6 +113,19 @@ class TestAllURLsMatching(unittest.TestCase):
         self.assertMatch('http://video.pbs.org/viralplayer/2365173446/', ['pbs'])
         self.assertMatch('http://video.pbs.org/widget/partnerplayer/980042464/', ['pbs'])
 
+    def test_dispatch_index(self):
+        index = URLDispatchIndex(self.ies)
+        urls = [tc['url'] for tc in gettestcases(include_onlymatching=True)]
+        urls.extend((
+            'PL63F0C78739B09958', 'BaW_jenozKc', 'ytsearch5:youtube-dl',
+            'https://example.com/video.mp4', 'HTTPS://WWW.YOUTUBE.COM/watch?v=BaW_jenozKc',
+            'https://www.youtube.com/watch?v=BaW_jenozKc&title=d\xe9j\xe0'))
+        for url in urls:
+            expected = next(ie for ie in self.ies if ie.suitable(url))
+            self.assertIs(
+                next(ie for ie in index.candidates(url) if ie.suitable(url)), expected,
+                'Dispatch index disagrees with the linear scan for %s' % url)
+
     def test_no_duplicated_ie_names(self):
         name_accu = collections.defaultdict(list)
         for ie in self.ies:
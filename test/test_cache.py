@@ -10,10 +10,28 @@ import unittest
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import shutil
+import threading
+import time
 
-from test.helper import FakeYDL
+from test.helper import (
+    FakeLogger,
+    FakeYDL,
+    http_server_port,
+)
+from youtube_dl import YoutubeDL
 from youtube_dl.cache import Cache
-from youtube_dl.utils import version_tuple
+from youtube_dl.compat import (
+    compat_http_server,
+    compat_urllib_error,
+)
+from youtube_dl.extractor.common import InfoExtractor
+from youtube_dl.utils import (
+    ExtractorError,
+    sanitized_Request,
+    std_headers,
+    version_tuple,
+    write_json_file,
+)
 from youtube_dl.version import __version__
 
 
@@ -78,6 +96,206 @@ class TestCache(unittest.TestCase):
         self.assertEqual(c.load('test_cache', 'k.'), None)
         self.assertEqual(c.load('test_cache', 'l.'), 'ell')
 
+    def test_cache_ttl(self):
+        ydl = FakeYDL({
+            'cachedir': self.test_dir,
+        })
+        c = Cache(ydl)
+        c.store('test_cache', 'fresh', 'data', ttl=60)
+        c.store('test_cache', 'stale', 'data', ttl=-1)
+        self.assertEqual(c.load('test_cache', 'fresh'), 'data')
+        self.assertEqual(c.load('test_cache', 'stale', default='default'), None)
+        c.prune()
+        self.assertTrue(os.path.exists(c._get_cache_fn('test_cache', 'fresh', 'json')))
+        self.assertFalse(os.path.exists(c._get_cache_fn('test_cache', 'stale', 'json')))
+
+    def test_cache_memory(self):
+        ydl = FakeYDL({
+            'cachedir': self.test_dir,
+        })
+        c = Cache(ydl)
+        c.store('test_cache', 'k', {'x': 1})
+        data = c.load('test_cache', 'k')
+        # the data loaded are a copy
+        data['x'] = 2
+        self.assertEqual(c.load('test_cache', 'k'), {'x': 1})
+        # entries stored by another process are seen
+        write_json_file({Cache._VERSION_KEY: __version__, 'data': 'other'}, c._get_cache_fn('test_cache', 'k', 'json'))
+        self.assertEqual(c.load('test_cache', 'k'), 'other')
+        shutil.rmtree(self.test_dir)
+        self.assertEqual(c.load('test_cache', 'k'), None)
+
+    def test_cache_memory_size(self):
+        c = Cache(FakeYDL({'cachedir': self.test_dir}))
+        self.assertEqual(c._memory.maxsize, 64)
+        c.store('test_cache', 'k', 'data')
+        # the memory cache of each instance is independent
+        other = Cache(FakeYDL({'cachedir': self.test_dir, 'cache_memory_size': 0}))
+        self.assertEqual(other._memory.maxsize, 0)
+        self.assertEqual(len(c._memory), 1)
+        self.assertEqual(other.load('test_cache', 'k'), 'data')
+        self.assertEqual(len(other._memory), 0)
+
+    def test_cache_prune(self):
+        ydl = FakeYDL({
+            'cachedir': self.test_dir,
+            'cache_max_size': 200,
+        })
+        c = Cache(ydl)
+        for i, key in enumerate(('a', 'b', 'c', 'd')):
+            c.store('test_cache', key, 'x' * 50)
+            fn = c._get_cache_fn('test_cache', key, 'json')
+            os.utime(fn, (time.time() - 10 + i, time.time() - 10 + i))
+        c.store('test_cache', 'e', 'x' * 50)
+        stale_tmp = c._get_cache_fn('test_cache', 'e', 'json') + '.abc.tmp'
+        with open(stale_tmp, 'w') as f:
+            f.write('{')
+        os.utime(stale_tmp, (0, 0))
+        c.prune()
+        self.assertFalse(os.path.exists(stale_tmp))
+        self.assertEqual(
+            [c.load('test_cache', key) is not None for key in ('a', 'b', 'c', 'd', 'e')],
+            [False, False, False, True, True])
+
+
+class HTTPTestRequestHandler(compat_http_server.BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get('If-None-Match')))
+        headers = {
+            '/fresh': {'Cache-Control': 'max-age=3600'},
+            '/etag': {'Cache-Control': 'no-cache', 'ETag': '"v1"'},
+            '/no-store': {'Cache-Control': 'no-store'},
+            '/cookie': {'Set-Cookie': 'session=1; path=/'},
+            '/vary': {'Cache-Control': 'max-age=3600', 'Vary': 'Accept-Language'},
+            '/vary-any': {'Cache-Control': 'max-age=3600', 'Vary': '*'},
+        }.get(self.path, {})
+        if headers.get('ETag') and self.headers.get('If-None-Match') == headers['ETag']:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = ('%s %d' % (self.path, len(self.server.requests))).encode('utf-8')
+        self.send_response(200)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', '%d' % len(body))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.requests.append((self.path, body))
+        self.send_response(200)
+        self.send_header('Content-Length', '%d' % len(body))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testdata', 'response_cache_test')
+        self.tearDown()
+        self.httpd = compat_http_server.HTTPServer(('127.0.0.1', 0), HTTPTestRequestHandler)
+        self.httpd.requests = []
+        self.port = http_server_port(self.httpd)
+        self.server_thread = threading.Thread(target=self.httpd.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+
+    def tearDown(self):
+        if getattr(self, 'httpd', None):
+            self.httpd.shutdown()
+            self.httpd.server_close()
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+
+    def url(self, path):
+        return 'http://127.0.0.1:%d%s' % (self.port, path)
+
+    def download(self, path, cookie=None, **params):
+        ydl_params = {'cachedir': self.test_dir, 'http_cache': True, 'logger': FakeLogger()}
+        ydl_params.update(params)
+        ydl = YoutubeDL(ydl_params)
+        ie = InfoExtractor(ydl)
+        if cookie:
+            ie._set_cookie('127.0.0.1', 'session', cookie)
+        data = None
+        if isinstance(path, tuple):
+            path, data = path
+        return ie._download_webpage(self.url(path), None, note=False, data=data), ydl
+
+    def test_fresh(self):
+        self.assertEqual(self.download('/fresh')[0], '/fresh 1')
+        self.assertEqual(self.download('/fresh')[0], '/fresh 1')
+        self.assertEqual(len(self.httpd.requests), 1)
+
+    def test_revalidation(self):
+        self.assertEqual(self.download('/etag')[0], '/etag 1')
+        self.assertEqual(self.download('/etag')[0], '/etag 1')
+        self.assertEqual(self.httpd.requests, [('/etag', None), ('/etag', '"v1"')])
+
+    def test_uncacheable(self):
+        self.assertEqual(self.download('/no-store')[0], '/no-store 1')
+        self.assertEqual(self.download('/no-store')[0], '/no-store 2')
+        # without caching headers, responses are stored but not reused
+        self.assertEqual(self.download('/plain')[0], '/plain 3')
+        self.assertEqual(self.download('/plain')[0], '/plain 4')
+        # unless disabled
+        self.assertEqual(self.download('/fresh', http_cache=False)[0], '/fresh 5')
+        self.assertEqual(self.download('/fresh', http_cache=False)[0], '/fresh 6')
+
+    def test_post(self):
+        self.assertEqual(self.download(('/fresh', b'a'))[0], 'a')
+        self.assertEqual(self.download(('/fresh', b'b'))[0], 'b')
+        self.assertEqual(self.download(('/fresh', b'a'), offline_replay=True)[0], 'a')
+        self.assertEqual(len(self.httpd.requests), 2)
+
+    def test_offline_replay(self):
+        self.download('/plain')
+        self.download('/cookie')
+        self.assertEqual(self.download('/plain', offline_replay=True)[0], '/plain 1')
+        _, ydl = self.download('/cookie', offline_replay=True)
+        self.assertEqual([c.name for c in ydl.cookiejar], ['session'])
+        self.assertRaises(ExtractorError, self.download, '/other', offline_replay=True)
+        self.assertEqual(len(self.httpd.requests), 2)
+
+    def test_cookies(self):
+        self.assertEqual(self.download('/fresh', cookie='a')[0], '/fresh 1')
+        self.assertEqual(self.download('/fresh', cookie='b')[0], '/fresh 2')
+        self.assertEqual(self.download('/fresh', cookie='a')[0], '/fresh 1')
+        self.assertEqual(self.download('/fresh', cookie='b', offline_replay=True)[0], '/fresh 2')
+        self.assertRaises(ExtractorError, self.download, '/fresh', cookie='c', offline_replay=True)
+        self.assertEqual(len(self.httpd.requests), 2)
+
+    def test_vary(self):
+        self.assertEqual(self.download('/vary')[0], '/vary 1')
+        self.assertEqual(self.download('/vary')[0], '/vary 1')
+        # as with --add-header
+        accept_language = std_headers['Accept-Language']
+        std_headers['Accept-Language'] = 'fr'
+        try:
+            self.assertRaises(ExtractorError, self.download, '/vary', offline_replay=True)
+            self.assertEqual(self.download('/vary')[0], '/vary 2')
+            self.assertEqual(self.download('/vary')[0], '/vary 2')
+        finally:
+            std_headers['Accept-Language'] = accept_language
+        self.assertEqual(self.download('/vary')[0], '/vary 3')
+        # not stored
+        self.assertEqual(self.download('/vary-any')[0], '/vary-any 4')
+        self.assertEqual(self.download('/vary-any')[0], '/vary-any 5')
+
+    def test_partial_read(self):
+        ydl = YoutubeDL({'cachedir': self.test_dir, 'http_cache': True, 'logger': FakeLogger()})
+        resp = ydl.response_cache.urlopen(sanitized_Request(self.url('/plain')))
+        self.assertEqual(resp.read(3), b'/pl')
+        resp.close()
+        # only responses read to the end are stored
+        ydl.params['offline_replay'] = True
+        self.assertRaises(compat_urllib_error.URLError, ydl.response_cache.urlopen, self.url('/plain'))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+# coding: utf-8
+from __future__ import unicode_literals
+
+# Allow direct execution
+import os
+import re
+import sys
+import unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import io
+import json
+import random
+import threading
+import time
+
+from test.helper import (
+    FakeLogger,
+    http_server_port,
+    try_rm,
+)
+from youtube_dl import YoutubeDL
+from youtube_dl.aes import aes_cbc_encrypt
+from youtube_dl.compat import (
+    compat_http_server,
+    compat_open as open,
+    compat_struct_pack,
+)
+from youtube_dl.downloader.dash import DashSegmentsFD
+from youtube_dl.downloader.external import FFmpegFD
+from youtube_dl.downloader.fragment import _FragmentBuffer
+from youtube_dl.downloader import hls
+from youtube_dl.downloader.hls import HlsFD, _AES128DecryptingBuffer
+from youtube_dl.utils import (
+    bytes_to_intlist,
+    encodeFilename,
+    intlist_to_bytes,
+)
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+
+FRAGMENT_COUNT = 12
+UNAVAILABLE_FRAGMENTS = (5, )
+KEY = b'youtube-dl key!!'
+LIVE_WINDOW = 4
+
+
+def fragment_content(index):
+    return ('<fragment %d>' % index).encode('ascii') * (index + 1)
+
+
+def encrypted_fragment_content(index):
+    # the IV defaults to the media sequence number
+    return intlist_to_bytes(aes_cbc_encrypt(
+        bytes_to_intlist(fragment_content(index)), bytes_to_intlist(KEY),
+        bytes_to_intlist(compat_struct_pack('>8xq', index))))
+
+
+def live_playlist(first, last, ended):
+    return ('#EXTM3U\n#EXT-X-TARGETDURATION:0.01\n#EXT-X-MEDIA-SEQUENCE:%d\n%s%s' % (
+        100 + first,
+        ''.join('#EXTINF:0.01,\nfrag/%d\n' % i for i in range(first, last)),
+        '#EXT-X-ENDLIST\n' if ended else '')).encode('utf-8')
+
+
+def FakeFFmpegPostProcessor(available):
+    class FakeFFmpegPostProcessor(object):
+        def __init__(self, downloader=None):
+            self.available = available
+
+    return FakeFFmpegPostProcessor
+
+
+class HTTPTestRequestHandler(compat_http_server.BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, body, content_type='video/mp4'):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', len(body))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        mobj = re.match(r'^/(?P<missing>missing/)?(?P<encrypted>encrypted/)?frag/(?P<index>\d+)$', self.path)
+        if mobj:
+            index = int(mobj.group('index'))
+            if mobj.group('missing') and index in UNAVAILABLE_FRAGMENTS:
+                self.send_response(404)
+                self.end_headers()
+                return
+            # Make later fragments likely to complete before earlier ones
+            time.sleep(random.uniform(0, 0.02))
+            self.send_body(
+                encrypted_fragment_content(index) if mobj.group('encrypted')
+                else fragment_content(index))
+        elif self.path in ('/index.m3u8', '/encrypted.m3u8'):
+            encrypted = self.path == '/encrypted.m3u8'
+            self.send_body(('#EXTM3U\n#EXT-X-TARGETDURATION:10\n%s%s#EXT-X-ENDLIST\n' % (
+                '#EXT-X-KEY:METHOD=AES-128,URI="key"\n' if encrypted else '',
+                ''.join('#EXTINF:10,\n%sfrag/%d\n' % ('encrypted/' if encrypted else '', i)
+                        for i in range(FRAGMENT_COUNT)))).encode('utf-8'),
+                'application/vnd.apple.mpegurl')
+        elif self.path == '/live.m3u8':
+            # a sliding window advancing by one fragment per reload
+            first = self.server.live_requests
+            self.server.live_requests += 1
+            last = min(first + LIVE_WINDOW, FRAGMENT_COUNT)
+            self.send_body(live_playlist(first, last, last == FRAGMENT_COUNT), 'application/vnd.apple.mpegurl')
+        elif self.path == '/scripted.m3u8':
+            # the next of the scripted responses, the last one being repeated
+            self.server.live_requests += 1
+            responses = self.server.live_responses
+            response = responses.pop(0) if len(responses) > 1 else responses[0]
+            if response is None:
+                self.send_response(500)
+                self.end_headers()
+                return
+            self.send_body(live_playlist(*response), 'application/vnd.apple.mpegurl')
+        elif self.path == '/key':
+            self.server.key_requests += 1
+            self.send_body(KEY, 'application/octet-stream')
+        else:
+            assert False
+
+
+class TestFragmentFD(unittest.TestCase):
+    def setUp(self):
+        self.httpd = compat_http_server.HTTPServer(
+            ('127.0.0.1', 0), HTTPTestRequestHandler)
+        self.httpd.key_requests = 0
+        self.httpd.live_requests = 0
+        self.port = http_server_port(self.httpd)
+        self.server_thread = threading.Thread(target=self.httpd.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+        self.filename = 'testfile.mp4'
+        self.hls_attrs = {}
+        self.cleanup()
+
+    def tearDown(self):
+        for name, value in self.hls_attrs.items():
+            setattr(hls, name, value)
+        self.cleanup()
+        self.httpd.shutdown()
+
+    def fragment_files(self):
+        return ['%s.part-Frag%d' % (self.filename, i) for i in range(FRAGMENT_COUNT)]
+
+    def cleanup(self):
+        for fn in [self.filename, self.filename + '.part', self.filename + '.ytdl'] + self.fragment_files():
+            try_rm(encodeFilename(fn))
+
+    def dash_info(self, path='frag'):
+        return {
+            'url': 'http://127.0.0.1:%d/' % self.port,
+            'fragment_base_url': 'http://127.0.0.1:%d/' % self.port,
+            'fragments': [{'path': '%s/%d' % (path, i)} for i in range(FRAGMENT_COUNT)],
+        }
+
+    def download(self, fd_class, info_dict, params):
+        params.setdefault('logger', FakeLogger())
+        ydl = YoutubeDL(params)
+        downloader = fd_class(ydl, params)
+        self.assertTrue(downloader.real_download(self.filename, info_dict))
+        with open(encodeFilename(self.filename), 'rb') as f:
+            return f.read()
+
+    def expected(self, skip=()):
+        return b''.join(fragment_content(i) for i in range(FRAGMENT_COUNT) if i not in skip)
+
+    def test_dash_sequential(self):
+        self.assertEqual(self.download(DashSegmentsFD, self.dash_info(), {}), self.expected())
+
+    def test_dash_concurrent(self):
+        self.assertEqual(self.download(DashSegmentsFD, self.dash_info(), {
+            'concurrent_fragment_downloads': 4,
+        }), self.expected())
+
+    def test_hls_concurrent(self):
+        self.assertEqual(self.download(HlsFD, {
+            'url': 'http://127.0.0.1:%d/index.m3u8' % self.port,
+        }, {
+            'concurrent_fragment_downloads': 4,
+        }), self.expected())
+
+    def patch_hls(self, **attrs):
+        # restored in tearDown
+        for name, value in attrs.items():
+            self.hls_attrs.setdefault(name, getattr(hls, name))
+            setattr(hls, name, value)
+
+    def test_hls_aes128(self):
+        # decrypted natively if ffmpeg is not available
+        self.patch_hls(FFmpegPostProcessor=FakeFFmpegPostProcessor(False))
+        for params in ({'concurrent_fragment_downloads': 4}, {'keep_fragments': True}):
+            self.assertEqual(self.download(HlsFD, {
+                'url': 'http://127.0.0.1:%d/encrypted.m3u8' % self.port,
+            }, params), self.expected())
+            self.cleanup()
+        # the key is only downloaded once by each download
+        self.assertEqual(self.httpd.key_requests, 2)
+
+    def test_hls_aes128_delegated(self):
+        downloads = []
+
+        class FakeFFmpegFD(FFmpegFD):
+            def real_download(self, filename, info_dict):
+                downloads.append(info_dict['url'])
+                return True
+
+        # without pycryptodome, ffmpeg is faster than the Python decryption
+        self.patch_hls(
+            AES=None, FFmpegFD=FakeFFmpegFD,
+            FFmpegPostProcessor=FakeFFmpegPostProcessor(True))
+        params = {'logger': FakeLogger()}
+        for path in ('index', 'encrypted'):
+            HlsFD(YoutubeDL(params), params).real_download(self.filename, {
+                'url': 'http://127.0.0.1:%d/%s.m3u8' % (self.port, path),
+            })
+        self.assertEqual(downloads, ['http://127.0.0.1:%d/encrypted.m3u8' % self.port])
+
+    def test_hls_live(self):
+        for params in ({}, {'concurrent_fragment_downloads': 4}):
+            self.httpd.live_requests = 0
+            self.assertEqual(self.download(HlsFD, {
+                'url': 'http://127.0.0.1:%d/live.m3u8' % self.port,
+                'is_live': True,
+            }, params), self.expected())
+            self.assertEqual(self.httpd.live_requests, FRAGMENT_COUNT - LIVE_WINDOW + 1)
+            self.assertFalse(os.path.exists(encodeFilename(self.filename + '.ytdl')))
+            self.cleanup()
+
+    def download_live(self, responses):
+        warnings = []
+
+        class Logger(FakeLogger):
+            def warning(self, msg):
+                warnings.append(msg)
+
+        self.httpd.live_responses = responses
+        return self.download(HlsFD, {
+            'url': 'http://127.0.0.1:%d/scripted.m3u8' % self.port,
+            'is_live': True,
+        }, {'logger': Logger()}), warnings
+
+    def test_hls_live_stalled(self):
+        content, warnings = self.download_live([(0, 4, False)])
+        self.assertEqual(content, b''.join(fragment_content(i) for i in range(4)))
+        self.assertEqual(self.httpd.live_requests, HlsFD._LIVE_MAX_STALLED_RELOADS + 2)
+        self.assertEqual(len(warnings), 1)
+        self.assertIn('has not been updated', warnings[0])
+
+    def test_hls_live_reload_errors(self):
+        content, warnings = self.download_live([
+            (0, 4, False), None, None, (2, 8, False), (8, FRAGMENT_COUNT, True)])
+        self.assertEqual(content, self.expected())
+        self.assertEqual(len(warnings), 2)
+        self.assertIn('unable to reload the live playlist', warnings[0])
+
+    def test_hls_live_missed_fragments(self):
+        content, warnings = self.download_live([(0, 4, False), (6, FRAGMENT_COUNT, True)])
+        self.assertEqual(content, self.expected(skip=(4, 5)))
+        self.assertEqual(len(warnings), 1)
+        self.assertIn('missed 2 fragments', warnings[0])
+
+    def test_aes128_decrypting_buffer(self):
+        encrypted = encrypted_fragment_content(3)
+        buf = _AES128DecryptingBuffer(KEY, compat_struct_pack('>8xq', 3))
+        buf.write(b'garbage')
+        buf.seek(0)
+        buf.truncate()
+        for i in range(0, len(encrypted), 7):
+            buf.write(encrypted[i:i + 7])
+        self.assertEqual(buf.getvalue(), fragment_content(3))
+
+    def test_skip_unavailable_concurrent(self):
+        self.assertEqual(self.download(DashSegmentsFD, self.dash_info('missing/frag'), {
+            'concurrent_fragment_downloads': 4,
+            'fragment_retries': 1,
+        }), self.expected(skip=UNAVAILABLE_FRAGMENTS))
+
+    def test_keep_fragments(self):
+        self.assertEqual(self.download(DashSegmentsFD, self.dash_info(), {
+            'concurrent_fragment_downloads': 4,
+            'keep_fragments': True,
+        }), self.expected())
+        for i, fn in enumerate(self.fragment_files()):
+            with open(encodeFilename(fn), 'rb') as f:
+                self.assertEqual(f.read(), fragment_content(i))
+
+    def test_in_memory_fragments(self):
+        self.assertEqual(self.download(DashSegmentsFD, self.dash_info(), {}), self.expected())
+        for fn in self.fragment_files():
+            self.assertFalse(os.path.exists(encodeFilename(fn)))
+
+    def test_spilled_fragments(self):
+        max_in_memory = _FragmentBuffer._MAX_IN_MEMORY
+        _FragmentBuffer._MAX_IN_MEMORY = 20
+        try:
+            buf = _FragmentBuffer()
+            buf.write(fragment_content(0))
+            self.assertIsInstance(buf._stream, io.BytesIO)
+            buf.write(fragment_content(0))
+            self.assertNotIsInstance(buf._stream, io.BytesIO)
+            self.assertEqual(buf.getvalue(), fragment_content(0) * 2)
+            self.assertEqual(self.download(DashSegmentsFD, self.dash_info(), {}), self.expected())
+            self.cleanup()
+            self.patch_hls(FFmpegPostProcessor=FakeFFmpegPostProcessor(False))
+            self.assertEqual(self.download(HlsFD, {
+                'url': 'http://127.0.0.1:%d/encrypted.m3u8' % self.port,
+            }, {'concurrent_fragment_downloads': 4}), self.expected())
+        finally:
+            _FragmentBuffer._MAX_IN_MEMORY = max_in_memory
+        for fn in self.fragment_files():
+            self.assertFalse(os.path.exists(encodeFilename(fn)))
+
+    def test_resume_partial_fragment(self):
+        with open(encodeFilename(self.filename + '.part-Frag0.part'), 'wb') as f:
+            f.write(fragment_content(0)[:5])
+        self.assertEqual(self.download(DashSegmentsFD, self.dash_info(), {}), self.expected())
+        self.assertFalse(os.path.exists(encodeFilename(self.filename + '.part-Frag0')))
+
+    def test_resume_concurrent(self):
+        written = 7
+        with open(encodeFilename(self.filename + '.part'), 'wb') as f:
+            f.write(b''.join(fragment_content(i) for i in range(written)))
+        with open(encodeFilename(self.filename + '.ytdl'), 'w') as f:
+            f.write(json.dumps({'downloader': {'current_fragment': {'index': written}}}))
+        self.assertEqual(self.download(DashSegmentsFD, self.dash_info(), {
+            'concurrent_fragment_downloads': 3,
+        }), self.expected())
+        self.assertFalse(os.path.exists(encodeFilename(self.filename + '.ytdl')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,9 +3,14 @@
 from __future__ import unicode_literals
 
 # Allow direct execution
+import io
+import json
 import os
 import re
+import shutil
 import sys
+import tempfile
+import time
 import unittest
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -17,13 +22,21 @@ from test.helper import (
 from youtube_dl import YoutubeDL
 from youtube_dl.compat import compat_http_server
 from youtube_dl.downloader.http import HttpFD
-from youtube_dl.utils import encodeFilename
+from youtube_dl.utils import (
+    DownloadError,
+    encodeFilename,
+)
 import threading
 
 TEST_DIR = os.path.dirname(os.path.abspath(__file__))
 
 
 TEST_SIZE = 10 * 1024
+PATTERN_SIZE = 100 * 1000
+
+
+def pattern_content():
+    return b''.join(b'%05d' % (i // 5) for i in range(0, PATTERN_SIZE, 5))
 
 
 class HTTPTestRequestHandler(compat_http_server.BaseHTTPRequestHandler):
@@ -57,8 +70,24 @@ class HTTPTestRequestHandler(compat_http_server.BaseHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(b'#' * size)
 
+    def serve_pattern(self):
+        # the content depends on the position, and ranges may be open-ended
+        mobj = re.search(r'^bytes=(\d+)-(\d+)?', self.headers.get('Range') or '')
+        start = int(mobj.group(1)) if mobj else 0
+        end = min(int(mobj.group(2) or PATTERN_SIZE - 1), PATTERN_SIZE - 1) if mobj else PATTERN_SIZE - 1
+        self.server.ranges.append((start, end))
+        self.send_response(206 if mobj else 200)
+        self.send_header('Content-Type', 'video/mp4')
+        if mobj:
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, end, PATTERN_SIZE))
+        self.send_header('Content-Length', end - start + 1)
+        self.end_headers()
+        self.wfile.write(pattern_content()[start:end + 1])
+
     def do_GET(self):
-        if self.path == '/regular':
+        if self.path == '/pattern':
+            self.serve_pattern()
+        elif self.path == '/regular':
             self.serve()
         elif self.path == '/no-content-length':
             self.serve(content_length=False)
@@ -66,15 +95,44 @@ class HTTPTestRequestHandler(compat_http_server.BaseHTTPRequestHandler):
             self.serve(range=False)
         elif self.path == '/no-range-no-content-length':
             self.serve(range=False, content_length=False)
+        elif self.path == '/stalled-no-range':
+            # the first response stalls halfway
+            self.server.stalled_requests += 1
+            self.send_response(200)
+            self.send_header('Content-Type', 'video/mp4')
+            self.send_header('Content-Length', TEST_SIZE)
+            self.end_headers()
+            if self.server.stalled_requests == 1:
+                self.wfile.write(b'#' * (TEST_SIZE // 2))
+                self.wfile.flush()
+                time.sleep(1)
+            self.wfile.write(b'#' * TEST_SIZE)
+        elif self.path == '/missing':
+            self.send_response(404)
+            self.end_headers()
         else:
             assert False
 
 
 class TestHttpFD(unittest.TestCase):
     def setUp(self):
-        self.httpd = compat_http_server.HTTPServer(
+        try:
+            from http.server import ThreadingHTTPServer
+        except ImportError:
+            try:
+                from socketserver import ThreadingMixIn
+            except ImportError:
+                from SocketServer import ThreadingMixIn
+
+            class ThreadingHTTPServer(ThreadingMixIn, compat_http_server.HTTPServer):
+                daemon_threads = True
+
+        # threading, since a stalled response must not delay the next request
+        self.httpd = ThreadingHTTPServer(
             ('127.0.0.1', 0), HTTPTestRequestHandler)
         self.port = http_server_port(self.httpd)
+        self.httpd.ranges = []
+        self.httpd.stalled_requests = 0
         self.server_thread = threading.Thread(target=self.httpd.serve_forever)
         self.server_thread.daemon = True
         self.server_thread.start()
@@ -103,6 +161,193 @@ class TestHttpFD(unittest.TestCase):
             'http_chunk_size': 1000,
         })
 
+    def download_to_stream(self, params, ep):
+        params['logger'] = FakeLogger()
+        ydl = YoutubeDL(params)
+        downloader = HttpFD(ydl, params)
+        stream = io.BytesIO()
+        self.assertTrue(downloader.download(stream, {
+            'url': 'http://127.0.0.1:%d/%s' % (self.port, ep),
+        }))
+        self.assertEqual(stream.getvalue(), b'#' * TEST_SIZE, ep)
+
+    def test_stream(self):
+        for params in ({}, {'http_chunk_size': 1000}):
+            for ep in ('regular', 'no-content-length', 'no-range', 'no-range-no-content-length'):
+                self.download_to_stream(dict(params), ep)
+
+    def test_progress_hooks(self):
+        params = {'logger': FakeLogger(), 'buffersize': 16, 'noresizebuffer': True}
+        downloader = HttpFD(YoutubeDL(params), params)
+        statuses = []
+        downloader.add_progress_hook(lambda s: statuses.append(s['status']))
+        stream = io.BytesIO()
+        self.assertTrue(downloader.download(stream, {
+            'url': 'http://127.0.0.1:%d/regular' % self.port,
+        }))
+        self.assertEqual(stream.getvalue(), b'#' * TEST_SIZE)
+        # rate limited, rather than called for each of the 640 blocks
+        self.assertLess(len(statuses), 20)
+        self.assertEqual(statuses[0], 'downloading')
+        self.assertEqual(statuses[-1], 'finished')
+
+    def test_interrupted(self):
+        params = {'logger': FakeLogger()}
+        downloader = HttpFD(YoutubeDL(params), params)
+        statuses = []
+
+        def hook(s):
+            statuses.append(s['status'])
+            if s['status'] == 'downloading':
+                raise KeyboardInterrupt()
+
+        downloader.add_progress_hook(hook)
+        self.assertRaises(KeyboardInterrupt, downloader.download, io.BytesIO(), {
+            'url': 'http://127.0.0.1:%d/regular' % self.port,
+        })
+        self.assertEqual(statuses, ['downloading', 'error'])
+
+    def test_progress_interval(self):
+        params = {
+            'logger': FakeLogger(),
+            'buffersize': 16,
+            'noresizebuffer': True,
+            'progress_interval': 60,
+        }
+        downloader = HttpFD(YoutubeDL(params), params)
+        statuses = []
+        downloader.add_progress_hook(lambda s: statuses.append(s['status']))
+        for _ in range(2):
+            self.assertTrue(downloader.download(io.BytesIO(), {
+                'url': 'http://127.0.0.1:%d/regular' % self.port,
+            }))
+        # the final status is always delivered, and resets the interval
+        self.assertEqual(statuses, ['downloading', 'finished'] * 2)
+
+        del statuses[:]
+        self.assertRaises(Exception, downloader.download, io.BytesIO(), {
+            'url': 'http://127.0.0.1:%d/missing' % self.port,
+        })
+        self.assertEqual(statuses, ['error'])
+
+        # 0 disables the default rate limiting
+        params.update({'progress_interval': 0})
+        downloader = HttpFD(YoutubeDL(params), params)
+        statuses = []
+        downloader.add_progress_hook(lambda s: statuses.append(s['status']))
+        self.assertTrue(downloader.download(io.BytesIO(), {
+            'url': 'http://127.0.0.1:%d/regular' % self.port,
+        }))
+        self.assertEqual(statuses, ['downloading'] * (TEST_SIZE // 16) + ['finished'])
+
+    def download_ranges(self, params):
+        params.update({'logger': FakeLogger(), 'http_connections': 4})
+        downloader = HttpFD(YoutubeDL(params), params)
+        downloader._MIN_RANGE_SIZE = 1000
+        self.httpd.ranges = []
+        self.assertTrue(downloader.real_download('testfile.mp4', {
+            'url': 'http://127.0.0.1:%d/pattern' % self.port,
+        }))
+        with open(encodeFilename('testfile.mp4'), 'rb') as f:
+            self.assertEqual(f.read(), pattern_content())
+        self.assertFalse(os.path.exists(encodeFilename('testfile.mp4.ytdl')))
+
+    def test_ranges(self):
+        try_rm(encodeFilename('testfile.mp4'))
+        try:
+            self.download_ranges({})
+            # the probe request, then one request per range
+            self.assertEqual(sorted(self.httpd.ranges), [
+                (0, 0), (0, 24999), (25000, 49999), (50000, 74999), (75000, 99999)])
+        finally:
+            try_rm(encodeFilename('testfile.mp4'))
+
+    def test_ranges_resume(self):
+        content = pattern_content()
+        part = bytearray(PATTERN_SIZE)
+        for start, downloaded in ((0, 25000), (25000, 1000), (50000, 0), (75000, 24000)):
+            part[start:start + downloaded] = content[start:start + downloaded]
+        with open(encodeFilename('testfile.mp4.part'), 'wb') as f:
+            f.write(bytes(part))
+        with open(encodeFilename('testfile.mp4.ytdl'), 'w') as f:
+            f.write(json.dumps({'downloader': {'size': PATTERN_SIZE, 'ranges': [
+                [0, 24999, 25000], [25000, 49999, 1000], [50000, 74999, 0], [75000, 99999, 24000]]}}))
+        try:
+            self.download_ranges({})
+            self.assertEqual(sorted(self.httpd.ranges), [
+                (0, 0), (26000, 49999), (50000, 74999), (99000, 99999)])
+        finally:
+            for fn in ('testfile.mp4', 'testfile.mp4.part', 'testfile.mp4.ytdl'):
+                try_rm(encodeFilename(fn))
+
+    def test_ranges_small_file(self):
+        # not worth splitting
+        params = {'logger': FakeLogger(), 'http_connections': 4}
+        self.download(params, 'regular')
+
+    @unittest.skipUnless(hasattr(os, 'mkfifo'), 'named pipes are not available')
+    def test_fifo(self):
+        # e.g. for ffmpeg to merge formats while they are downloaded
+        pipe_dir = tempfile.mkdtemp()
+        try:
+            pipe = os.path.join(pipe_dir, 'testfile.mp4')
+            os.mkfifo(pipe)
+            received = []
+
+            def read():
+                with open(pipe, 'rb') as f:
+                    received.append(f.read())
+
+            reader = threading.Thread(target=read)
+            reader.start()
+            params = {'logger': FakeLogger(), 'http_chunk_size': 1000, 'http_connections': 4}
+            downloader = HttpFD(YoutubeDL(params), params)
+            downloader._MIN_RANGE_SIZE = 1000
+            self.assertTrue(downloader.download(pipe, {
+                'url': 'http://127.0.0.1:%d/pattern' % self.port,
+            }))
+            reader.join()
+            # written sequentially, without any temporary file
+            self.assertEqual(received, [pattern_content()])
+            self.assertEqual(os.listdir(pipe_dir), ['testfile.mp4'])
+        finally:
+            shutil.rmtree(pipe_dir)
+
+    def test_fifo_not_resumed(self):
+        pipe_dir = tempfile.mkdtemp()
+        try:
+            pipe = os.path.join(pipe_dir, 'testfile.mp4')
+            os.mkfifo(pipe)
+            received = []
+
+            def read():
+                with open(pipe, 'rb') as f:
+                    received.append(f.read())
+
+            reader = threading.Thread(target=read)
+            reader.daemon = True
+            reader.start()
+            params = {
+                'logger': FakeLogger(),
+                'socket_timeout': 0.2,
+                'retries': 1,
+                'buffersize': 1024,
+                'noresizebuffer': True,
+            }
+            downloader = HttpFD(YoutubeDL(params), params)
+            statuses = []
+            downloader.add_progress_hook(lambda s: statuses.append(s['status']))
+            # rather than starting over in the pipe
+            self.assertRaises(DownloadError, downloader.download, pipe, {
+                'url': 'http://127.0.0.1:%d/stalled-no-range' % self.port,
+            })
+            self.assertEqual(statuses[-1], 'error')
+            self.assertEqual(self.httpd.stalled_requests, 2)
+            reader.join(5)
+            self.assertEqual(received, [b'#' * (TEST_SIZE // 2)])
+        finally:
+            shutil.rmtree(pipe_dir)
+
 
 if __name__ == '__main__':
     unittest.main()
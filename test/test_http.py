@@ -103,6 +103,11 @@ class HTTPTestRequestHandler(compat_http_server.BaseHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(payload)
 
+    def _no_response(self):
+        # process the request but drop the connection without responding
+        self.server.unanswered_requests = getattr(self.server, 'unanswered_requests', 0) + 1
+        self.close_connection = True
+
     def _read_data(self):
         if 'Content-Length' in self.headers:
             return self.rfile.read(int(self.headers['Content-Length']))
@@ -119,6 +124,8 @@ class HTTPTestRequestHandler(compat_http_server.BaseHTTPRequestHandler):
             self._redirect()
         elif self.path.startswith('/method'):
             self._method('POST', data)
+        elif self.path == '/no_response':
+            self._no_response()
         elif self.path.startswith('/headers'):
             self._headers()
         else:
@@ -138,6 +145,8 @@ class HTTPTestRequestHandler(compat_http_server.BaseHTTPRequestHandler):
             self._redirect()
         elif self.path.startswith('/method'):
             self._method('PUT', data)
+        elif self.path == '/no_response':
+            self._no_response()
         else:
             self._status(404)
 
@@ -226,6 +235,13 @@ class HTTPTestRequestHandler(compat_http_server.BaseHTTPRequestHandler):
                     return
             respond(payload, payload_encoding=encodings)
 
+        elif self.path == '/client_port':
+            respond(str(self.client_address[1]).encode('utf-8'), 'text/plain')
+        elif self.path == '/client_port_then_close':
+            # drop the connection without announcing it, as on idle timeout
+            respond(str(self.client_address[1]).encode('utf-8'), 'text/plain')
+            self.close_connection = True
+
         else:
             self._status(404)
 
@@ -257,15 +273,6 @@ class TestHTTP(unittest.TestCase):
         or (sys.version_info[0] == 2 and sys.version_info[1:] >= (7, 19)))
 
     def setUp(self):
-        # HTTP server
-        self.http_httpd = compat_http_server.HTTPServer(
-            ('127.0.0.1', 0), HTTPTestRequestHandler)
-        self.http_port = http_server_port(self.http_httpd)
-
-        self.http_server_thread = threading.Thread(target=self.http_httpd.serve_forever)
-        self.http_server_thread.daemon = True
-        self.http_server_thread.start()
-
         try:
             from http.server import ThreadingHTTPServer
         except ImportError:
@@ -277,6 +284,16 @@ class TestHTTP(unittest.TestCase):
             class ThreadingHTTPServer(ThreadingMixIn, compat_http_server.HTTPServer):
                 pass
 
+        # HTTP server
+        # (threading, since persistent connections may be kept open by clients)
+        self.http_httpd = ThreadingHTTPServer(
+            ('127.0.0.1', 0), HTTPTestRequestHandler)
+        self.http_port = http_server_port(self.http_httpd)
+
+        self.http_server_thread = threading.Thread(target=self.http_httpd.serve_forever)
+        self.http_server_thread.daemon = True
+        self.http_server_thread.start()
+
         # HTTPS server
         certfn = os.path.join(TEST_DIR, 'testcert.pem')
         self.https_httpd = ThreadingHTTPServer(
@@ -495,6 +512,39 @@ class TestHTTP(unittest.TestCase):
             self.assertEqual(res.headers.get('Content-Encoding'), 'unsupported')
             self.assertEqual(res.read(), b'raw')
 
+    def _client_ports(self, params, paths, scheme='http'):
+        params['nocheckcertificate'] = True
+        with FakeYDL(params) as ydl:
+            return [
+                ydl.urlopen(sanitized_Request(self._test_url(path, scheme=scheme))).read().decode('utf-8')
+                for path in paths]
+
+    @unittest.skipUnless(sys.version_info >= (3, 6), 'persistent connections need Python 3.6+')
+    def test_connection_reuse(self):
+        for scheme in ('http', 'https'):
+            self.assertEqual(len(set(self._client_ports({}, ['client_port'] * 3, scheme))), 1)
+            self.assertEqual(len(set(self._client_ports(
+                {'connection_pool_size': 0}, ['client_port'] * 3, scheme))), 3)
+
+    @unittest.skipUnless(sys.version_info >= (3, 6), 'persistent connections need Python 3.6+')
+    def test_connection_dropped_by_server(self):
+        ports = self._client_ports({}, ['client_port_then_close', 'client_port', 'client_port'])
+        self.assertEqual(len(set(ports)), 2)
+        self.assertEqual(ports[1], ports[2])
+
+    @unittest.skipUnless(sys.version_info >= (3, 6), 'persistent connections need Python 3.6+')
+    def test_connection_dropped_after_request(self):
+        # a request that the server may have processed is only sent again
+        # on a new connection if it is idempotent
+        for method, requests in (('POST', 1), ('PUT', 2)):
+            self.http_httpd.unanswered_requests = 0
+            with FakeYDL() as ydl:
+                ydl.urlopen(sanitized_Request(self._test_url('client_port'))).read()
+                self.assertRaises(
+                    Exception, ydl.urlopen,
+                    sanitized_Request(self._test_url('no_response'), data=b'data', method=method))
+            self.assertEqual(self.http_httpd.unanswered_requests, requests, method)
+
     def test_remove_dot_segments(self):
         with FakeYDL() as ydl:
             res = ydl.urlopen(sanitized_Request(self._test_url('a/b/./../../headers')))
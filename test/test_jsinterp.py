@@ -652,6 +652,16 @@ class TestJSInterpreter(unittest.TestCase):
         func = jsi.extract_function('c', {'e': 10}, {'f': 100, 'g': 1000})
         self.assertEqual(func([1]), 1111)
 
+    def test_parse_cache(self):
+        code = 'function f(a){var b = a.split(""); b.reverse(); return b.join("") + [1, 2][1];}'
+        JSInterpreter._PARSE_CACHE.clear()
+        self._test(code, 'cba2', args=('abc',))
+        parsed = len(JSInterpreter._PARSE_CACHE)
+        self.assertGreater(parsed, 0)
+        # the same code parsed again by another instance hits the cache
+        self._test(code, 'zyx2', args=('xyz',))
+        self.assertEqual(len(JSInterpreter._PARSE_CACHE), parsed)
+
 
 if __name__ == '__main__':
     unittest.main()
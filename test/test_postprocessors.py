@@ -8,10 +8,256 @@ import sys
 import unittest
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from youtube_dl.postprocessor import MetadataFromTitlePP
+from test.helper import FakeYDL, try_rm
+from youtube_dl.compat import compat_open as open
+from youtube_dl.downloader.ism import box, full_box, s32, u32, u64
+from youtube_dl.postprocessor import (
+    FFmpegEmbedSubtitlePP,
+    FFmpegFixupStretchedPP,
+    FFmpegMergerPP,
+    FFmpegMetadataPP,
+    FFmpegPostProcessor,
+    MetadataFromTitlePP,
+    NativeMergerPP,
+)
+from youtube_dl.postprocessor.common import PostProcessor
+from youtube_dl.postprocessor.nativemerger import (
+    _ebml_element,
+    _ebml_uint,
+    _iter_boxes,
+    _iter_elements,
+    _parse_vint,
+    _read_uint,
+    merge_files,
+    NativeMergerError,
+)
 
 
 class TestMetadataFromTitle(unittest.TestCase):
     def test_format_to_regex(self):
         pp = MetadataFromTitlePP(None, '%(title)s - %(artist)s')
         self.assertEqual(pp._titleregex, r'(?P<title>.+)\ \-\ (?P<artist>.+)')
+
+
+class TestFFmpegPasses(unittest.TestCase):
+    FILES = ['test_pp.fvideo.mp4', 'test_pp.faudio.m4a', 'test_pp.en.vtt', 'test_pp.mp4']
+
+    def setUp(self):
+        self.runs = []
+
+        def run_ffmpeg_multiple_files(pp, input_paths, out_path, opts):
+            self.runs.append((input_paths, opts))
+            with open(out_path, 'w') as f:
+                f.write('merged')
+
+        self._run_ffmpeg_multiple_files = FFmpegPostProcessor.run_ffmpeg_multiple_files
+        FFmpegPostProcessor.run_ffmpeg_multiple_files = run_ffmpeg_multiple_files
+        for fn in self.FILES[:3]:
+            with open(fn, 'w') as f:
+                f.write(fn)
+
+    def tearDown(self):
+        FFmpegPostProcessor.run_ffmpeg_multiple_files = self._run_ffmpeg_multiple_files
+        for fn in self.FILES:
+            try_rm(fn)
+
+    def post_process(self, params, pps):
+        ydl = FakeYDL(params)
+        ydl.to_screen = lambda *args, **kwargs: None
+        for pp in pps:
+            ydl.add_post_processor(pp)
+        ydl.post_process('test_pp.mp4', {
+            'title': 'Title',
+            'ext': 'mp4',
+            'stretched_ratio': 2,
+            'requested_subtitles': {'en': {'ext': 'vtt'}},
+            '__files_to_merge': self.FILES[:2],
+            '__postprocessors': [FFmpegMergerPP(ydl), FFmpegFixupStretchedPP(ydl)],
+        })
+        self.assertTrue(os.path.exists('test_pp.mp4'))
+        # the merged and embedded files are deleted
+        self.assertEqual([fn for fn in self.FILES[:3] if os.path.exists(fn)], [])
+
+    def test_single_pass(self):
+        self.post_process({}, [FFmpegMetadataPP(), FFmpegEmbedSubtitlePP()])
+        self.assertEqual(self.runs, [(self.FILES[:3], [
+            '-map', '0:v:0', '-map', '1:a:0', '-map', '2:0', '-c', 'copy',
+            '-aspect', '2.000000', '-metadata', 'title=Title', '-c:s', 'mov_text',
+            '-metadata:s:s:0', 'language=eng'])])
+
+    def test_separate_passes(self):
+        processed = []
+
+        class OtherPP(PostProcessor):
+            def run(self, info):
+                processed.append(len(runs))
+                return [], info
+
+        runs = self.runs
+        self.post_process({}, [FFmpegMetadataPP(), OtherPP(), FFmpegEmbedSubtitlePP()])
+        # the other postprocessor runs between the passes
+        self.assertEqual(processed, [1])
+        self.assertEqual([inputs for inputs, _ in self.runs], [
+            self.FILES[:2], ['test_pp.mp4', 'test_pp.en.vtt']])
+
+        del self.runs[:]
+        self.post_process({'fuse_ffmpeg_passes': False}, [FFmpegMetadataPP(), FFmpegEmbedSubtitlePP()])
+        self.assertEqual(self.runs, [
+            (self.FILES[:2], ['-map', '0:v:0', '-map', '1:a:0', '-c', 'copy']),
+            (['test_pp.mp4'], ['-c', 'copy', '-aspect', '2.000000']),
+            (['test_pp.mp4'], ['-c', 'copy', '-metadata', 'title=Title']),
+            (['test_pp.mp4', 'test_pp.en.vtt'], [
+                '-map', '0', '-map', '-0:s', '-map', '-0:d', '-map', '1:0', '-c', 'copy',
+                '-c:s', 'mov_text', '-metadata:s:s:0', 'language=eng'])])
+
+
+def mp4_file(handler, timescale, fragments):
+    """ A fragmented MP4 file whose track has id 1 and the given fragments, (decode time, data) """
+    mvhd = u32.pack(0) * 2 + u32.pack(1000) + u32.pack(0) + b'\0' * 76 + u32.pack(2)
+    tkhd = u32.pack(0) * 2 + u32.pack(1) + u32.pack(0) * 2 + b'\0' * 60
+    mdhd = u32.pack(0) * 2 + u32.pack(timescale) + u32.pack(0) * 2
+    hdlr = u32.pack(0) + handler + b'\0' * 12 + b'track\0'
+    trex = u32.pack(1) * 2 + u32.pack(0) * 3
+    data = box(b'ftyp', b'iso6' + u32.pack(0) + b'iso6dash')
+    data += box(b'moov', full_box(b'mvhd', 0, 0, mvhd) + box(b'trak', (
+        full_box(b'tkhd', 0, 3, tkhd) + box(b'mdia', full_box(b'mdhd', 0, 0, mdhd) + full_box(b'hdlr', 0, 0, hdlr))))
+        + box(b'mvex', full_box(b'trex', 0, 0, trex)))
+    data += box(b'sidx', b'\0' * 24)
+    for i, (decode_time, payload) in enumerate(fragments, 1):
+        traf = box(b'traf', (
+            full_box(b'tfhd', 0, 0x20000, u32.pack(1))
+            + full_box(b'tfdt', 1, 0, u64.pack(decode_time))
+            + full_box(b'trun', 0, 0x201, u32.pack(1) + s32.pack(0) + u32.pack(len(payload)))))
+        moof = box(b'moof', full_box(b'mfhd', 0, 0, u32.pack(i)) + traf)
+        data += moof + box(b'mdat', payload)
+    return data
+
+
+def webm_file(track_type, clusters):
+    """ A WebM file whose track has number 1 and the given clusters, (timecode, [(timecode, keyframe, data)]) """
+    segment = _ebml_element(0x1549A966, _ebml_uint(0x2AD7B1, 1000000))
+    segment += _ebml_element(0x1654AE6B, _ebml_element(0xAE, (
+        _ebml_uint(0xD7, 1) + _ebml_uint(0x73C5, 7) + _ebml_uint(0x83, track_type)
+        + _ebml_element(0x86, b'V_VP9' if track_type == 1 else b'A_OPUS'))))
+    for cluster_timecode, blocks in clusters:
+        segment += _ebml_element(0x1F43B675, _ebml_uint(0xE7, cluster_timecode) + b''.join(
+            _ebml_element(0xA3, b'\x81' + s32.pack(timecode - cluster_timecode)[2:] + (b'\x80' if keyframe else b'\0') + data)
+            for timecode, keyframe, data in blocks))
+    segment += _ebml_element(0x1C53BB6B, b'')
+    return _ebml_element(0x1A45DFA3, _ebml_element(0x4282, b'webm')) + _ebml_element(0x18538067, segment)
+
+
+class TestNativeMerger(unittest.TestCase):
+    FILES = ['test_native.fvideo.%s', 'test_native.faudio.%s', 'test_native.%s', 'test_native.temp.%s']
+
+    def tearDown(self):
+        for fn in self.FILES:
+            for ext in ('mp4', 'webm'):
+                try_rm(fn % ext)
+
+    def merge(self, ext, video, audio):
+        files = [fn % ext for fn in self.FILES]
+        for fn, data in zip(files, (video, audio)):
+            with open(fn, 'wb') as f:
+                f.write(data)
+        ydl = FakeYDL()
+        ydl.to_screen = lambda *args, **kwargs: None
+        files_to_delete, _ = NativeMergerPP(ydl).run({
+            'filepath': files[2],
+            '__files_to_merge': files[:2],
+        })
+        self.assertEqual(files_to_delete, files[:2])
+        self.assertFalse(os.path.exists(files[3]))
+        with open(files[2], 'rb') as f:
+            return bytearray(f.read())
+
+    def test_mp4(self):
+        data = self.merge('mp4', mp4_file(b'vide', 1000, [(0, b'v0'), (2000, b'v2'), (4000, b'v4')]),
+                          mp4_file(b'soun', 48000, [(0, b'a0'), (48000, b'a1'), (144000, b'a3')]))
+        boxes = list(_iter_boxes(data, 0))
+        # the segment index is dropped
+        self.assertEqual([b[0] for b in boxes], [b'ftyp', b'moov'] + [b'moof', b'mdat'] * 6)
+
+        def uint(pos):
+            return u32.unpack(bytes(data[pos:pos + 4]))[0]
+
+        moov = list(_iter_boxes(data, boxes[1][2], boxes[1][3]))
+        self.assertEqual([b[0] for b in moov], [b'mvhd', b'trak', b'trak', b'mvex'])
+        self.assertEqual(uint(moov[0][3] - 4), 3)  # next track id
+        self.assertEqual([uint(trak[2] + 20) for trak in moov[1:3]], [1, 2])
+        self.assertEqual([uint(trex[2] + 4) for trex in _iter_boxes(data, moov[3][2], moov[3][3])], [1, 2])
+
+        # interleaved by decode time and renumbered
+        fragments = []
+        for moof, mdat in zip(boxes[2::2], boxes[3::2]):
+            mfhd, traf = _iter_boxes(data, moof[2], moof[3])
+            tfhd = next(_iter_boxes(data, traf[2], traf[3]))
+            fragments.append((uint(mfhd[2] + 4), uint(tfhd[2] + 4), bytes(data[mdat[2]:mdat[3]])))
+        self.assertEqual(fragments, [
+            (1, 1, b'v0'), (2, 2, b'a0'), (3, 2, b'a1'), (4, 1, b'v2'), (5, 2, b'a3'), (6, 1, b'v4')])
+
+    def test_webm(self):
+        data = self.merge('webm', webm_file(1, [
+            (0, [(0, True, b'v0'), (40, False, b'v1')]),
+            (80, [(80, True, b'v2'), (120, False, b'v3')]),
+        ]), webm_file(2, [
+            (0, [(0, True, b'a0'), (20, True, b'a1'), (60, True, b'a2'), (100, True, b'a3')]),
+        ]))
+        ebml, segment = _iter_elements(data)
+        self.assertEqual(segment[3], len(data))
+        self.assertIn(b'webm', bytes(data[ebml[2]:ebml[3]]))
+        elements = list(_iter_elements(data, segment[2], segment[3]))
+        self.assertEqual([element[0] for element in elements], [
+            0x114D9B74, 0x1549A966, 0x1654AE6B, 0x1F43B675, 0x1F43B675, 0x1C53BB6B])
+
+        def children(element, element_id=None):
+            return [child for child in _iter_elements(data, element[2], element[3])
+                    if element_id is None or child[0] == element_id]
+
+        def uint(element):
+            return _read_uint(data, element[2], element[3])
+
+        # renumbered, with the duplicate track UIDs replaced
+        self.assertEqual([
+            [uint(child) for child in children(entry) if child[0] in (0xD7, 0x73C5)]
+            for entry in children(elements[2])], [[1, 1], [2, 2]])
+
+        # a cluster per video keyframe, with the interleaved blocks
+        clusters = []
+        for cluster in elements[3:5]:
+            timecode = uint(children(cluster, 0xE7)[0])
+            blocks = []
+            for block in children(cluster, 0xA3):
+                track, pos = _parse_vint(data, block[2])
+                relative = s32.unpack(b'\0\0' + bytes(data[pos:pos + 2]))[0]
+                blocks.append((track, timecode + relative, bytes(data[pos + 3:block[3]])))
+            clusters.append((timecode, blocks))
+        self.assertEqual(clusters, [
+            (0, [(1, 0, b'v0'), (2, 0, b'a0'), (2, 20, b'a1'), (1, 40, b'v1'), (2, 60, b'a2')]),
+            (80, [(1, 80, b'v2'), (2, 100, b'a3'), (1, 120, b'v3')]),
+        ])
+
+        # the seek head and the cues point to the elements
+        positions = [element[1] - segment[2] for element in elements]
+        self.assertEqual([
+            (uint(children(seek, 0x53AB)[0]), uint(children(seek, 0x53AC)[0]))
+            for seek in children(elements[0])],
+            [(0x1549A966, positions[1]), (0x1654AE6B, positions[2]), (0x1C53BB6B, positions[5])])
+        self.assertEqual([
+            uint(children(children(cue_point, 0xB7)[0], 0xF1)[0])
+            for cue_point in children(elements[5])], positions[3:5])
+
+    def test_unsupported(self):
+        files = ['test_native.fvideo.mp4', 'test_native.faudio.webm']
+        with open(files[0], 'wb') as f:
+            f.write(mp4_file(b'vide', 1000, [(0, b'v0')]))
+        with open(files[1], 'wb') as f:
+            f.write(webm_file(2, [(0, [(0, True, b'a0')])]))
+        self.assertRaises(NativeMergerError, merge_files, files, 'test_native.mp4')
+        self.assertFalse(os.path.exists('test_native.mp4'))
+
+        # the video must come first
+        with open(files[1], 'wb') as f:
+            f.write(mp4_file(b'vide', 1000, [(0, b'v0')]))
+        self.assertRaises(NativeMergerError, merge_files, files, 'test_native.mp4')
+        try_rm(files[1])
@@ -14,6 +14,8 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import io
 import itertools
 import json
+import threading
+import time
 import types
 import xml.etree.ElementTree
 
@@ -53,6 +55,7 @@ from youtube_dl.utils import (
     LazyList,
     limit_length,
     lowercase_escape,
+    LRUCache,
     merge_dicts,
     mimetype2ext,
     month_by_name,
@@ -719,6 +722,14 @@ class TestUtil(unittest.TestCase):
             got = iapl.getslice(*sliceargs)
             self.assertEqual(got, expected)
 
+            for paged_list in (pl, iapl):
+                self.assertEqual(list(paged_list.iterslice(*sliceargs)), expected)
+
+            for paged_list in (
+                    OnDemandPagedList(get_page, pagesize, prefetch=2),
+                    InAdvancePagedList(get_page, size // pagesize + 1, pagesize, prefetch=2)):
+                self.assertEqual(paged_list.getslice(*sliceargs), expected)
+
         testPL(5, 2, (), [0, 1, 2, 3, 4])
         testPL(5, 2, (1,), [1, 2, 3, 4])
         testPL(5, 2, (2,), [2, 3, 4])
@@ -728,6 +739,74 @@ class TestUtil(unittest.TestCase):
         testPL(5, 2, (2, 99), [2, 3, 4])
         testPL(5, 2, (20, 99), [])
 
+    def test_paged_list_prefetch(self):
+        fetched = []
+        page_1_fetched = threading.Event()
+
+        def get_page(pagenum):
+            fetched.append(pagenum)
+            if pagenum == 1:
+                page_1_fetched.set()
+            if pagenum >= 3:
+                raise ExtractorError('No such page')
+            return range(pagenum * 2, min(pagenum * 2 + 2, 5))
+
+        items = OnDemandPagedList(get_page, 2, prefetch=3).iterslice()
+        self.assertEqual(next(items), 0)
+        # the next pages are fetched while the first one is consumed
+        self.assertTrue(page_1_fetched.wait(5))
+        # the short last page ends the list: the errors of the pages
+        # fetched beyond it are ignored, and at most prefetch pages are
+        # fetched after it
+        self.assertEqual(list(items), [1, 2, 3, 4])
+        self.assertLessEqual(set(fetched), set(range(6)))
+
+        # pages after the end of the slice are not fetched
+        del fetched[:]
+        self.assertEqual(OnDemandPagedList(get_page, 2, prefetch=3).getslice(1, 3), [1, 2])
+        self.assertEqual(sorted(fetched), [0, 1])
+
+        # errors of the pages of the slice are raised
+        pl = InAdvancePagedList(get_page, 5, 2, prefetch=2)
+        self.assertRaises(ExtractorError, pl.getslice)
+
+        # the pages being fetched are waited for when the iteration stops
+        finished = []
+
+        def slow_page(pagenum):
+            time.sleep(0.1 if pagenum else 0)
+            finished.append(pagenum)
+            return range(pagenum * 2, pagenum * 2 + 2)
+
+        items = OnDemandPagedList(slow_page, 2, prefetch=2).iterslice()
+        self.assertEqual(next(items), 0)
+        items.close()
+        self.assertEqual(sorted(finished), [0, 1, 2])
+
+        # lists whose pagefunc is not known to be thread-safe are fetched
+        # in the calling thread
+        threads = set()
+
+        def page_thread(pagenum):
+            threads.add(threading.current_thread())
+            return range(pagenum * 2, min(pagenum * 2 + 2, 5))
+
+        for pl in (OnDemandPagedList(page_thread, 2), InAdvancePagedList(page_thread, 3, 2)):
+            self.assertEqual(pl.getslice(prefetch=3), [0, 1, 2, 3, 4])
+        self.assertEqual(threads, set([threading.current_thread()]))
+
+    def test_lru_cache(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+        self.assertEqual(cache.get('b', 'evicted'), 'evicted')
+        self.assertEqual((cache.get('a'), cache.get('c')), (1, 3))
+        self.assertEqual(len(cache), 2)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
     def test_read_batch_urls(self):
         f = io.StringIO('''\xef\xbb\xbf foo
             bar\r
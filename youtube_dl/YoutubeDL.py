@@ -20,11 +20,17 @@ import shutil
 import subprocess
 import socket
 import sys
+import tempfile
 import time
 import tokenize
 import traceback
 import random
 
+try:
+    import threading
+except ImportError:
+    threading = None
+
 try:
     from ssl import OPENSSL_VERSION
 except ImportError:
@@ -64,6 +70,7 @@ from .utils import (
     DEFAULT_OUTTMPL,
     determine_ext,
     determine_protocol,
+    DownloadCancelled,
     DownloadError,
     encode_compat_str,
     encodeFilename,
@@ -112,18 +119,27 @@ from .utils import (
     YoutubeDLRedirectHandler,
     ytdl_is_updateable,
 )
-from .cache import Cache
+from .cache import (
+    Cache,
+    ResponseCache,
+)
 from .extractor import get_info_extractor, gen_extractor_classes, _LAZY_LOADER
+from .extractor.dispatch import URLDispatchIndex
 from .extractor.openload import PhantomJSwrapper
 from .downloader import get_suitable_downloader
+from .downloader.common import FileDownloader
+from .downloader.fragment import FragmentFD
+from .downloader.http import HttpFD
 from .downloader.rtmp import rtmpdump_version
 from .postprocessor import (
+    FFmpegCommand,
     FFmpegFixupM3u8PP,
     FFmpegFixupM4aPP,
     FFmpegFixupStretchedPP,
     FFmpegMergerPP,
     FFmpegPostProcessor,
     get_postprocessor,
+    NativeMergerPP,
 )
 from .version import __version__
 
@@ -145,6 +161,208 @@ def _catch_unsafe_file_extension(func):
     return wrapper
 
 
+class _TemplateDict(dict):
+    """
+    Output template fields, sanitized when they are first looked up
+
+    Fields that are missing, None or a list, tuple or dict are replaced
+    with na_placeholder.
+    """
+
+    def __init__(self, fields, sanitize, na_placeholder):
+        super(_TemplateDict, self).__init__()
+        self._fields = fields
+        self._sanitize = sanitize
+        self._na_placeholder = na_placeholder
+
+    def has_field(self, key):
+        v = self._fields.get(key)
+        return v is not None and not isinstance(v, (list, tuple, dict))
+
+    def __missing__(self, key):
+        if not self.has_field(key):
+            v = self._na_placeholder
+        else:
+            v = self._fields[key]
+            if not isinstance(v, compat_numeric_types):
+                v = self._sanitize(key, v)
+        self[key] = v
+        return v
+
+
+class _OutputTemplate(object):
+    """
+    An output template compiled for YoutubeDL.prepare_filename
+
+    The template only depends on the fields through the width of the
+    playlist_index/autonumber compatibility fields and the numeric fields
+    that are missing, so the expanded template is cached for each of
+    their combinations.
+    """
+
+    # For fields playlist_index and autonumber convert all occurrences
+    # of %(field)s to %(field)0Nd for backward compatibility
+    _FIELD_SIZE_COMPAT_RE = re.compile(r'(?<!%)%\((?P<field>autonumber|playlist_index)\)s')
+
+    # As of [1] format syntax is:
+    #  %[mapping_key][conversion_flags][minimum_width][.precision][length_modifier]type
+    # 1. https://docs.python.org/2/library/stdtypes.html#string-formatting
+    _FORMAT_RE = r'''(?x)
+        (?<!%)
+        %
+        \({0}\)  # mapping key
+        (?:[#0\-+ ]+)?  # conversion flags (optional)
+        (?:\d+)?  # minimum field width (optional)
+        (?:\.\d+)?  # precision (optional)
+        [hlL]?  # length modifier (optional)
+        [diouxXeEfFgGcrs%]  # conversion type
+    '''
+
+    def __init__(self, outtmpl, numeric_fields):
+        self.outtmpl = outtmpl
+        mobj = self._FIELD_SIZE_COMPAT_RE.search(outtmpl)
+        self.size_compat_field = mobj.group('field') if mobj else None
+        compat_outtmpl = self._FIELD_SIZE_COMPAT_RE.sub(r'%(\1)0d', outtmpl)
+        # Only the numeric fields the template references need patching
+        self.numeric_fields = []
+        for numeric_field in numeric_fields:
+            format_re = re.compile(self._FORMAT_RE.format(numeric_field))
+            if format_re.search(compat_outtmpl):
+                self.numeric_fields.append((numeric_field, format_re))
+        self._expanded = {}
+
+    def expand(self, field_size, missing_numeric_fields):
+        key = (field_size, missing_numeric_fields)
+        outtmpl = self._expanded.get(key)
+        if outtmpl is not None:
+            return outtmpl
+
+        outtmpl = self.outtmpl
+        if self.size_compat_field:
+            outtmpl = self._FIELD_SIZE_COMPAT_RE.sub(
+                r'%%(\1)0%dd' % field_size, outtmpl)
+
+        # Missing numeric fields used together with integer presentation types
+        # in format specification will break the argument substitution since
+        # string NA placeholder is returned for missing fields. We will patch
+        # output template for missing fields to meet string presentation type.
+        for numeric_field, format_re in missing_numeric_fields:
+            outtmpl = format_re.sub(r'%({0})s'.format(numeric_field), outtmpl)
+
+        # expand_path translates '%%' into '%' and '$$' into '$'
+        # correspondingly that is not what we want since we need to keep
+        # '%%' intact for template dict substitution step. Working around
+        # with boundary-alike separator hack.
+        sep = ''.join([random.choice(ascii_letters) for _ in range(32)])
+        outtmpl = outtmpl.replace('%%', '%{0}%'.format(sep)).replace('$$', '${0}$'.format(sep))
+
+        # outtmpl should be expand_path'ed before template dict substitution
+        # because meta fields may contain env variables we don't want to
+        # be expanded. For example, for outtmpl "%(title)s.%(ext)s" and
+        # title "Hello $PATH", we don't want `$PATH` to be expanded.
+        outtmpl = self._expanded[key] = expand_path(outtmpl).replace(sep, '')
+        return outtmpl
+
+
+class _SidecarDownloads(object):
+    """
+    Downloads of the files written along with a video (subtitles and
+    thumbnails) run by up to max_workers background threads
+
+    finish() waits for them and reports their results in the order they
+    were started.
+    """
+
+    def __init__(self, max_workers):
+        self._max_workers = max_workers
+        self._workers = 0
+        self._queue = collections.deque()
+        self._lock = threading.Lock()
+        self._jobs = []
+
+    def start(self, download, report):
+        job = {'download': download, 'report': report, 'done': threading.Event()}
+        self._jobs.append(job)
+        with self._lock:
+            self._queue.append(job)
+            if self._workers >= self._max_workers:
+                return
+            self._workers += 1
+        thread = threading.Thread(target=self._work)
+        thread.daemon = True
+        thread.start()
+
+    def _work(self):
+        while True:
+            with self._lock:
+                if not self._queue:
+                    self._workers -= 1
+                    return
+                job = self._queue.popleft()
+            try:
+                job['download']()
+            except Exception as err:
+                job['error'] = err
+            finally:
+                job['done'].set()
+
+    def finish(self):
+        jobs, self._jobs = self._jobs, []
+        for job in jobs:
+            job['done'].wait()
+            job['report'](job.get('error'))
+
+
+class _CombinedProgress(object):
+    """
+    Progress of concurrent downloads, shown by reporter (a FileDownloader)
+    as the progress of a single download
+
+    hook(index) returns the progress hook of the index-th download.
+    """
+
+    def __init__(self, reporter, count):
+        self._reporter = reporter
+        self._statuses = [None] * count
+        self._lock = threading.Lock()
+
+    def hook(self, index):
+        def progress_hook(status):
+            if status['status'] not in ('downloading', 'finished'):
+                return
+            with self._lock:
+                self._statuses[index] = dict(status)
+                self._reporter.report_progress(self._combine())
+        return progress_hook
+
+    def _combine(self):
+        statuses = [s for s in self._statuses if s is not None]
+        downloaded = sum(s.get('downloaded_bytes') or 0 for s in statuses)
+        combined = {
+            'status': 'downloading',
+            'downloaded_bytes': downloaded,
+            'elapsed': max(s.get('elapsed') or 0 for s in statuses),
+        }
+        if len(statuses) == len(self._statuses):
+            if all(s['status'] == 'finished' for s in statuses):
+                combined.update({'status': 'finished', 'total_bytes': downloaded})
+                return combined
+            if all(s.get('total_bytes') is not None for s in statuses):
+                total = combined['total_bytes'] = sum(s['total_bytes'] for s in statuses)
+            elif all(s.get('total_bytes') or s.get('total_bytes_estimate') for s in statuses):
+                total = combined['total_bytes_estimate'] = sum(
+                    s.get('total_bytes') or s['total_bytes_estimate'] for s in statuses)
+            else:
+                total = None
+            speed = sum(
+                s.get('speed') or 0 for s in statuses if s['status'] == 'downloading')
+            if speed:
+                combined['speed'] = speed
+                if total is not None:
+                    combined['eta'] = FileDownloader.calc_eta(speed, max(total - downloaded, 0))
+        return combined
+
+
 class YoutubeDL(object):
     """YoutubeDL class.
 
@@ -205,6 +423,19 @@ class YoutubeDL(object):
     playlist_items:    Specific indices of playlist to download.
     playlistreverse:   Download playlist items in reverse order.
     playlistrandom:    Download playlist items in random order.
+    lazy_playlist:     Process playlist items as they are fetched from a
+                       paged or generated playlist, rather than after
+                       fetching all of them; n_entries is then None and
+                       the processed entries are not kept in the returned
+                       playlist, unless with dump_single_json.
+                       Ignored with playlistreverse and playlistrandom.
+    prefetch_pages:    Number of pages of a paged playlist to fetch in the
+                       background while the current one is processed, for
+                       the extractors that support it (default: chosen by
+                       the extractor).
+    concurrent_entries: Number of playlist entries to extract concurrently
+                       (default 1). Downloads still happen one at a time,
+                       in playlist order.
     matchtitle:        Download only matching titles.
     rejecttitle:       Reject downloads for matching titles.
     logger:            Log messages to a logging.Logger instance.
@@ -214,6 +445,24 @@ class YoutubeDL(object):
     writeannotations:  Write the video annotations to a .annotations.xml file
     writethumbnail:    Write the thumbnail image to a file
     write_all_thumbnails:  Write all thumbnail formats to files
+    concurrent_sidecar_downloads: Number of subtitles and thumbnails to
+                       download concurrently, along with the video
+                       (default 1). Their results are still reported in
+                       order.
+    concurrent_format_downloads: Download the requested formats of a merged
+                       format at the same time, and report their combined
+                       progress on screen. When one of them fails, the
+                       others are cancelled.
+    native_merge:      Merge the requested formats of a merged format without
+                       ffmpeg when they are a fragmented MP4 or a Matroska/WebM
+                       video and audio, falling back to ffmpeg otherwise.
+    stream_merge:      Download the requested formats of a merged format
+                       into named pipes read by ffmpeg, which merges them
+                       while they are downloaded, instead of merging the
+                       downloaded files afterwards. Only for the native
+                       HTTP and fragment downloaders and where named pipes
+                       are available; the formats must not need seeking
+                       (e.g. MP4 files with the index at the end).
     writesubtitles:    Write the video subtitles to a file
     writeautomaticsub: Write the automatically generated subtitles to a file
     allsubtitles:      Downloads all the subtitles of the video
@@ -226,6 +475,13 @@ class YoutubeDL(object):
     skip_download:     Skip the actual download of the video file
     cachedir:          Location of the cache files in the filesystem.
                        False to disable filesystem cache.
+    cache_max_size:    Size in bytes that the cache files should not exceed,
+                       enforced by cache.prune().
+    cache_memory_size: Number of cache entries kept in memory (default 64).
+    http_cache:        Cache the responses to the requests of extractors in
+                       the cache dir, as HTTP caching headers allow.
+    offline_replay:    Only use cached responses for the requests of
+                       extractors (see http_cache).
     noplaylist:        Download single video instead of a playlist if in doubt.
     age_limit:         An integer representing the user's age in years.
                        Unsuitable videos for the given age are skipped.
@@ -249,6 +505,11 @@ class YoutubeDL(object):
     geo_verification_proxy:  URL of the proxy to use for IP address verification
                        on geo-restricted sites.
     socket_timeout:    Time to wait for unresponsive hosts, in seconds
+    connection_pool_size: Maximum number of idle persistent HTTP(S)
+                       connections kept open per host (default 8),
+                       0 to open a new connection for every request
+    connection_idle_timeout: Number of seconds after which an idle
+                       persistent connection is not reused (default 30)
     bidi_workaround:   Work around buggy terminals without bidirectional text
                        support, using fridibi
     debug_printtraffic:Print out sent and received HTTP traffic
@@ -287,7 +548,11 @@ class YoutubeDL(object):
                                          files that will be merged)
 
                        Progress hooks are guaranteed to be called at least once
-                       (with status "finished") if the download is successful.
+                       (with status "finished") if the download is successful,
+                       or (with status "error" and filename) if it fails.
+                       "downloading" statuses are passed at most once every
+                       progress_interval seconds (0.1 by default, 0 to pass
+                       all of them).
     merge_output_format: Extension to use when merging formats.
     fixup:             Automatically correct known faults of the file.
                        One of:
@@ -338,7 +603,8 @@ class YoutubeDL(object):
     nopart, updatetime, buffersize, ratelimit, min_filesize, max_filesize, test,
     noresizebuffer, retries, continuedl, noprogress, consoletitle,
     xattr_set_filesize, external_downloader_args, hls_use_mpegts,
-    http_chunk_size.
+    http_chunk_size, concurrent_fragment_downloads, http_connections,
+    progress_interval.
 
     The following options are used by the post processors:
     prefer_ffmpeg:     If False, use avconv instead of ffmpeg if both are available,
@@ -347,6 +613,9 @@ class YoutubeDL(object):
                        to the binary or its containing directory.
     postprocessor_args: A list of additional command-line arguments for the
                         postprocessor.
+    fuse_ffmpeg_passes: If False, run ffmpeg once for each postprocessor
+                       rather than once for consecutive postprocessors
+                       that only copy streams (default True).
 
     The following options are used by the Youtube extractor:
     youtube_include_dash_manifest: If True (default), DASH manifests and related
@@ -368,12 +637,17 @@ class YoutubeDL(object):
 
     params = None
     _ies = []
+    _ies_dispatch = None
     _pps = []
     _download_retcode = None
     _num_downloads = None
     _playlist_level = 0
     _playlist_urls = set()
     _screen_file = None
+    _archive = None
+    _outtmpl = None
+    _archive_pos = 0
+    _archive_tail = b''
 
     def __init__(self, params=None, auto_init=True):
         """Create a FileDownloader object with the given options."""
@@ -385,6 +659,12 @@ class YoutubeDL(object):
         self._progress_hooks = []
         self._download_retcode = 0
         self._num_downloads = 0
+        self._archive = set()
+        self._archive_pos = 0
+        self._archive_tail = b''
+        self._prefetched_extractions = {}
+        self._output_capture = threading.local() if threading else None
+        self._ie_init_lock = threading.Lock() if threading else None
         self._screen_file = [sys.stdout, sys.stderr][params.get('logtostderr', False)]
         self._err_file = sys.stderr
         self.params = {
@@ -393,6 +673,7 @@ class YoutubeDL(object):
         }
         self.params.update(params)
         self.cache = Cache(self)
+        self.response_cache = ResponseCache(self)
 
         self._header_cookies = []
         self._load_cookies_from_headers(self.params.get('http_headers'))
@@ -495,6 +776,15 @@ class YoutubeDL(object):
             self._ies_instances[ie.ie_key()] = ie
             ie.set_downloader(self)
 
+    def _suitable_ie_candidates(self, url):
+        """
+        Yield the extractors of the _ies list that may be suitable for url,
+        in order, skipping those whose _VALID_URL can't match it
+        """
+        if self._ies_dispatch is None or self._ies_dispatch.ies is not self._ies:
+            self._ies_dispatch = URLDispatchIndex(self._ies)
+        return self._ies_dispatch.candidates(url)
+
     def get_info_extractor(self, ie_key):
         """
         Get an instance of an IE with name ie_key, it will try to get one from
@@ -547,8 +837,19 @@ class YoutubeDL(object):
         if only_once:
             _cache.add(s)
 
+    def _capture_output(self, func, *args):
+        # Messages of playlist entries extracted in the background are
+        # replayed when the entry is processed, see __prefetch_extraction
+        messages = getattr(self._output_capture, 'messages', None)
+        if messages is None:
+            return False
+        messages.append((func, args))
+        return True
+
     def to_stdout(self, message, skip_eol=False, check_quiet=False, only_once=False):
         """Print message to stdout if not in quiet mode."""
+        if self._capture_output(self.to_stdout, message, skip_eol, check_quiet, only_once):
+            return
         if self.params.get('logger'):
             self.params['logger'].debug(message)
         elif not check_quiet or not self.params.get('quiet', False):
@@ -561,6 +862,8 @@ class YoutubeDL(object):
     def to_stderr(self, message, only_once=False):
         """Print message to stderr."""
         assert isinstance(message, compat_str)
+        if self._capture_output(self.to_stderr, message, only_once):
+            return
         if self.params.get('logger'):
             self.params['logger'].error(message)
         else:
@@ -607,6 +910,8 @@ class YoutubeDL(object):
         if self.params.get('cookiefile') is not None:
             self.cookiejar.save(ignore_discard=True, ignore_expires=True)
 
+        self.close_connections()
+
     def trouble(self, *args, **kwargs):
         """Determine action to take when a download problem appears.
 
@@ -704,81 +1009,41 @@ class YoutubeDL(object):
     def prepare_filename(self, info_dict):
         """Generate the output filename."""
         try:
-            template_dict = dict(info_dict)
+            template_fields = dict(info_dict)
 
-            template_dict['epoch'] = int(time.time())
+            template_fields['epoch'] = int(time.time())
             autonumber_size = self.params.get('autonumber_size')
             if autonumber_size is None:
                 autonumber_size = 5
-            template_dict['autonumber'] = self.params.get('autonumber_start', 1) - 1 + self._num_downloads
-            if template_dict.get('resolution') is None:
-                if template_dict.get('width') and template_dict.get('height'):
-                    template_dict['resolution'] = '%dx%d' % (template_dict['width'], template_dict['height'])
-                elif template_dict.get('height'):
-                    template_dict['resolution'] = '%sp' % template_dict['height']
-                elif template_dict.get('width'):
-                    template_dict['resolution'] = '%dx?' % template_dict['width']
+            template_fields['autonumber'] = self.params.get('autonumber_start', 1) - 1 + self._num_downloads
+            if template_fields.get('resolution') is None:
+                if template_fields.get('width') and template_fields.get('height'):
+                    template_fields['resolution'] = '%dx%d' % (template_fields['width'], template_fields['height'])
+                elif template_fields.get('height'):
+                    template_fields['resolution'] = '%sp' % template_fields['height']
+                elif template_fields.get('width'):
+                    template_fields['resolution'] = '%dx?' % template_fields['width']
 
             sanitize = lambda k, v: sanitize_filename(
                 compat_str(v),
                 restricted=self.params.get('restrictfilenames'),
                 is_id=(k == 'id' or k.endswith('_id')))
-            template_dict = dict((k, v if isinstance(v, compat_numeric_types) else sanitize(k, v))
-                                 for k, v in template_dict.items()
-                                 if v is not None and not isinstance(v, (list, tuple, dict)))
-            template_dict = collections.defaultdict(lambda: self.params.get('outtmpl_na_placeholder', 'NA'), template_dict)
+            template_dict = _TemplateDict(
+                template_fields, sanitize, self.params.get('outtmpl_na_placeholder', 'NA'))
 
             outtmpl = self.params.get('outtmpl', DEFAULT_OUTTMPL)
-
-            # For fields playlist_index and autonumber convert all occurrences
-            # of %(field)s to %(field)0Nd for backward compatibility
-            field_size_compat_map = {
-                'playlist_index': len(str(template_dict['n_entries'])),
-                'autonumber': autonumber_size,
-            }
-            FIELD_SIZE_COMPAT_RE = r'(?<!%)%\((?P<field>autonumber|playlist_index)\)s'
-            mobj = re.search(FIELD_SIZE_COMPAT_RE, outtmpl)
-            if mobj:
-                outtmpl = re.sub(
-                    FIELD_SIZE_COMPAT_RE,
-                    r'%%(\1)0%dd' % field_size_compat_map[mobj.group('field')],
-                    outtmpl)
-
-            # Missing numeric fields used together with integer presentation types
-            # in format specification will break the argument substitution since
-            # string NA placeholder is returned for missing fields. We will patch
-            # output template for missing fields to meet string presentation type.
-            for numeric_field in self._NUMERIC_FIELDS:
-                if numeric_field not in template_dict:
-                    # As of [1] format syntax is:
-                    #  %[mapping_key][conversion_flags][minimum_width][.precision][length_modifier]type
-                    # 1. https://docs.python.org/2/library/stdtypes.html#string-formatting
-                    FORMAT_RE = r'''(?x)
-                        (?<!%)
-                        %
-                        \({0}\)  # mapping key
-                        (?:[#0\-+ ]+)?  # conversion flags (optional)
-                        (?:\d+)?  # minimum field width (optional)
-                        (?:\.\d+)?  # precision (optional)
-                        [hlL]?  # length modifier (optional)
-                        [diouxXeEfFgGcrs%]  # conversion type
-                    '''
-                    outtmpl = re.sub(
-                        FORMAT_RE.format(numeric_field),
-                        r'%({0})s'.format(numeric_field), outtmpl)
-
-            # expand_path translates '%%' into '%' and '$$' into '$'
-            # correspondingly that is not what we want since we need to keep
-            # '%%' intact for template dict substitution step. Working around
-            # with boundary-alike separator hack.
-            sep = ''.join([random.choice(ascii_letters) for _ in range(32)])
-            outtmpl = outtmpl.replace('%%', '%{0}%'.format(sep)).replace('$$', '${0}$'.format(sep))
-
-            # outtmpl should be expand_path'ed before template dict substitution
-            # because meta fields may contain env variables we don't want to
-            # be expanded. For example, for outtmpl "%(title)s.%(ext)s" and
-            # title "Hello $PATH", we don't want `$PATH` to be expanded.
-            filename = expand_path(outtmpl).replace(sep, '') % template_dict
+            if self._outtmpl is None or self._outtmpl.outtmpl != outtmpl:
+                self._outtmpl = _OutputTemplate(outtmpl, self._NUMERIC_FIELDS)
+
+            field_size = None
+            if self._outtmpl.size_compat_field == 'playlist_index':
+                field_size = len(str(template_dict['n_entries']))
+            elif self._outtmpl.size_compat_field == 'autonumber':
+                field_size = autonumber_size
+            filename = self._outtmpl.expand(field_size, tuple(
+                (numeric_field, format_re)
+                for numeric_field, format_re in self._outtmpl.numeric_fields
+                if not template_dict.has_field(numeric_field))) % template_dict
 
             # Temporary fix for #4787
             # 'Treat' all problem characters by passing filename through preferredencoding
@@ -858,23 +1123,27 @@ class YoutubeDL(object):
         if not ie_key and force_generic_extractor:
             ie_key = 'Generic'
 
+        ie = self._suitable_info_extractor(url, ie_key)
+        if ie is None:
+            self.report_error('no suitable InfoExtractor for URL %s' % url)
+            return
+
+        if not ie.working():
+            self.report_warning('The program functionality for this site has been marked as broken, '
+                                'and will probably not work.')
+
+        return self.__extract_info(url, ie, download, extra_info, process)
+
+    def _suitable_info_extractor(self, url, ie_key=None):
+        """Return an instance of the IE that handles url, or None"""
         if ie_key:
             ies = [self.get_info_extractor(ie_key)]
         else:
-            ies = self._ies
+            ies = self._suitable_ie_candidates(url)
 
         for ie in ies:
-            if not ie.suitable(url):
-                continue
-
-            ie = self.get_info_extractor(ie.ie_key())
-            if not ie.working():
-                self.report_warning('The program functionality for this site has been marked as broken, '
-                                    'and will probably not work.')
-
-            return self.__extract_info(url, ie, download, extra_info, process)
-        else:
-            self.report_error('no suitable InfoExtractor for URL %s' % url)
+            if ie.suitable(url):
+                return self.get_info_extractor(ie.ie_key())
 
     def __handle_extraction_exceptions(func):
         def wrapper(self, *args, **kwargs):
@@ -975,7 +1244,9 @@ class YoutubeDL(object):
         # Compat with passing cookies in http headers
         self._apply_header_cookies(url)
 
-        ie_result = ie.extract(url)
+        ie_result = self.__prefetched_extraction(url, ie)
+        if ie_result is False:
+            ie_result = ie.extract(url)
         if ie_result is None:  # Finished already (backwards compatibility; listformats and friends should be moved here)
             return
         if isinstance(ie_result, list):
@@ -1145,6 +1416,15 @@ class YoutubeDL(object):
                 '[%s] playlist %s: Downloading %d videos' %
                 (ie_result['extractor'], playlist, num_entries))
 
+        # Entries can only be pulled as they are processed if their order
+        # doesn't depend on the whole playlist
+        lazy = (
+            self.params.get('lazy_playlist', False)
+            and not self.params.get('playlistreverse', False)
+            and not self.params.get('playlistrandom', False))
+        # and then their results are only kept to be printed
+        keep_results = not lazy or self.params.get('dump_single_json', False)
+
         if isinstance(ie_entries, list):
             n_all_entries = len(ie_entries)
             if playlistitems:
@@ -1155,6 +1435,31 @@ class YoutubeDL(object):
             self.to_screen(
                 '[%s] playlist %s: Collected %d video ids (downloading %d of them)' %
                 (ie_result['extractor'], playlist, n_all_entries, n_entries))
+        elif lazy:
+            if isinstance(ie_entries, PagedList):
+                if playlistitems:
+                    entries = itertools.chain.from_iterable(
+                        ie_entries.iterslice(item - 1, item) for item in playlistitems)
+                else:
+                    entries = ie_entries.iterslice(
+                        playliststart, playlistend, self.params.get('prefetch_pages'))
+            elif playlistitems:
+                # only the entries up to the last requested item are kept
+                cached_entries = LazyList(ie_entries)
+
+                def iter_playlistitems_entries():
+                    for item in playlistitems:
+                        try:
+                            yield cached_entries[item - 1]
+                        except LazyList.IndexError:
+                            pass
+                entries = iter_playlistitems_entries()
+            else:
+                entries = itertools.islice(ie_entries, playliststart, playlistend)
+            n_entries = None
+            self.to_screen(
+                '[%s] playlist %s: Downloading videos as they are listed' %
+                (ie_result['extractor'], playlist))
         elif isinstance(ie_entries, PagedList):
             if playlistitems:
                 entries = []
@@ -1164,7 +1469,7 @@ class YoutubeDL(object):
                     ))
             else:
                 entries = ie_entries.getslice(
-                    playliststart, playlistend)
+                    playliststart, playlistend, self.params.get('prefetch_pages'))
             n_entries = len(entries)
             report_download(n_entries)
         else:  # iterable
@@ -1185,38 +1490,130 @@ class YoutubeDL(object):
 
         x_forwarded_for = ie_result.get('__x_forwarded_for_ip')
 
-        for i, entry in enumerate(entries, 1):
-            self.to_screen('[download] Downloading video %s of %s' % (i, n_entries))
-            # This __x_forwarded_for_ip thing is a bit ugly but requires
-            # minimal changes
-            if x_forwarded_for:
-                entry['__x_forwarded_for_ip'] = x_forwarded_for
-            extra = {
-                'n_entries': n_entries,
-                'playlist': playlist,
-                'playlist_id': ie_result.get('id'),
-                'playlist_title': ie_result.get('title'),
-                'playlist_uploader': ie_result.get('uploader'),
-                'playlist_uploader_id': ie_result.get('uploader_id'),
-                'playlist_index': playlistitems[i - 1] if playlistitems else i + playliststart,
-                'extractor': ie_result['extractor'],
-                'webpage_url': ie_result['webpage_url'],
-                'webpage_url_basename': url_basename(ie_result['webpage_url']),
-                'extractor_key': ie_result['extractor_key'],
-            }
-
-            reason = self._match_entry(entry, incomplete=True)
-            if reason is not None:
-                self.to_screen('[download] ' + reason)
-                continue
+        concurrent_entries = self.params.get('concurrent_entries') or 1
+        if not threading:
+            concurrent_entries = 1
+        entries = iter(entries)
+        # The next entries, with their background extraction if any
+        pending = collections.deque()
+        job = None
+        try:
+            for i in itertools.count(1):
+                # Keep up to concurrent_entries entries being extracted
+                for next_entry in itertools.islice(entries, concurrent_entries - len(pending)):
+                    pending.append((next_entry, (
+                        self.__prefetch_extraction(next_entry) if concurrent_entries > 1 else None)))
+                if not pending:
+                    break
+                entry, job = pending.popleft()
+                if n_entries is None:
+                    self.to_screen('[download] Downloading video %s' % i)
+                else:
+                    self.to_screen('[download] Downloading video %s of %s' % (i, n_entries))
+                # This __x_forwarded_for_ip thing is a bit ugly but requires
+                # minimal changes
+                if x_forwarded_for:
+                    entry['__x_forwarded_for_ip'] = x_forwarded_for
+                extra = {
+                    'n_entries': n_entries,
+                    'playlist': playlist,
+                    'playlist_id': ie_result.get('id'),
+                    'playlist_title': ie_result.get('title'),
+                    'playlist_uploader': ie_result.get('uploader'),
+                    'playlist_uploader_id': ie_result.get('uploader_id'),
+                    'playlist_index': playlistitems[i - 1] if playlistitems else i + playliststart,
+                    'extractor': ie_result['extractor'],
+                    'webpage_url': ie_result['webpage_url'],
+                    'webpage_url_basename': url_basename(ie_result['webpage_url']),
+                    'extractor_key': ie_result['extractor_key'],
+                }
+
+                reason = self._match_entry(entry, incomplete=True)
+                if reason is not None:
+                    self.to_screen('[download] ' + reason)
+                    continue
 
-            entry_result = self.__process_iterable_entry(entry, download, extra)
-            # TODO: skip failed (empty) entries?
-            playlist_results.append(entry_result)
+                entry_result = self.__process_iterable_entry(entry, download, extra)
+                # TODO: skip failed (empty) entries?
+                if keep_results:
+                    playlist_results.append(entry_result)
+        finally:
+            # Forget the background extractions of entries not processed
+            for job in filter(None, [job] + [j for _, j in pending]):
+                jobs = collections.deque(
+                    j for j in self._prefetched_extractions.pop(job['key'], ()) if j is not job)
+                if jobs:
+                    self._prefetched_extractions[job['key']] = jobs
         ie_result['entries'] = playlist_results
         self.to_screen('[download] Finished downloading playlist: %s' % playlist)
         return ie_result
 
+    def __prefetch_extraction(self, entry):
+        """
+        Start extracting a playlist entry that is a URL reference in a
+        background thread, or return None if it is not worth it.
+
+        The extractor's output is captured and the result is used by
+        __extract_info when the entry is processed, so that messages,
+        downloads and errors happen in the same order as without it.
+        """
+        if entry.get('_type') not in ('url', 'url_transparent') or not entry.get('url'):
+            return None
+        if self.params.get('extract_flat', False):
+            return None
+        if self._match_entry(entry, incomplete=True) is not None:
+            return None
+        url = sanitize_url(entry['url'])
+        ie = self._suitable_info_extractor(url, entry.get('ie_key'))
+        if ie is None:
+            return None
+        # Extractors keep per-extraction state (e.g. the IP faked to bypass
+        # geo restrictions), so each background extraction gets its own
+        # instance rather than sharing the registered one
+        ie = type(ie)(self)
+
+        job = {'key': (url, ie.ie_key()), 'messages': []}
+
+        def run():
+            self._output_capture.messages = job['messages']
+            try:
+                with self._ie_init_lock:
+                    ie.initialize()
+                self._apply_header_cookies(url)
+                job['result'] = ie.extract(url)
+            except Exception:
+                job['exc_info'] = sys.exc_info()
+            finally:
+                self._output_capture.messages = None
+
+        job['thread'] = threading.Thread(target=run)
+        job['thread'].daemon = True
+        job['thread'].start()
+        self._prefetched_extractions.setdefault(job['key'], collections.deque()).append(job)
+        return job
+
+    def __prefetched_extraction(self, url, ie):
+        """
+        Return the result of the background extraction of url by ie, after
+        replaying its messages, or False if there is none
+        """
+        if getattr(self._output_capture, 'messages', None) is not None:
+            # extract_info() called by a background extraction
+            return False
+        key = (url, ie.ie_key())
+        jobs = self._prefetched_extractions.get(key)
+        if not jobs:
+            return False
+        job = jobs.popleft()
+        if not jobs:
+            del self._prefetched_extractions[key]
+        job['thread'].join()
+        for func, args in job['messages']:
+            func(*args)
+        if 'exc_info' in job:
+            raise job['exc_info'][1]
+        return job['result']
+
     @__handle_extraction_exceptions
     def __process_iterable_entry(self, entry, download, extra_info):
         return self.process_ie_result(
@@ -2033,6 +2430,11 @@ class YoutubeDL(object):
         subtitles_are_requested = any([self.params.get('writesubtitles', False),
                                        self.params.get('writeautomaticsub')])
 
+        sidecars = None
+        max_sidecar_workers = self.params.get('concurrent_sidecar_downloads') or 1
+        if max_sidecar_workers > 1 and threading:
+            sidecars = _SidecarDownloads(max_sidecar_workers)
+
         if subtitles_are_requested and info_dict.get('requested_subtitles'):
             # subtitles download errors are already managed as troubles in relevant IE
             # that way it will silently go on when used with unsupporting IE
@@ -2052,24 +2454,27 @@ class YoutubeDL(object):
                             with open(encodeFilename(sub_filename), 'w', encoding='utf-8', newline='') as subfile:
                                 subfile.write(sub_info['data'])
                         except (OSError, IOError):
+                            self._finish_sidecar_downloads(sidecars)
                             self.report_error('Cannot write subtitles file ' + sub_filename)
                             return
                     else:
-                        try:
-                            sub_data = ie._request_webpage(
-                                sub_info['url'], info_dict['id'], note=False).read()
-                            with open(encodeFilename(sub_filename), 'wb') as subfile:
-                                subfile.write(sub_data)
-                        except (ExtractorError, IOError, OSError, ValueError) as err:
+                        def report_sub_error(err, sub_lang=sub_lang):
                             self.report_warning('Unable to download subtitle for "%s": %s' %
                                                 (sub_lang, error_to_compat_str(err)))
-                            continue
+
+                        self._download_sidecar(
+                            sidecars, sub_filename,
+                            functools.partial(ie._request_webpage, sub_info['url'], info_dict['id'], note=False),
+                            (ExtractorError, IOError, OSError, ValueError), report_sub_error)
 
         self._write_info_json(
             'video description', info_dict,
             replace_extension(filename, 'info.json', info_dict.get('ext')))
 
-        self._write_thumbnails(info_dict, filename)
+        self._write_thumbnails(info_dict, filename, sidecars)
+
+        if self.params.get('skip_download', False):
+            self._finish_sidecar_downloads(sidecars)
 
         if not self.params.get('skip_download', False):
             try:
@@ -2082,10 +2487,15 @@ class YoutubeDL(object):
                                             'ignoring --external-downloader-args.')
                     return dler
 
-                def dl(name, info):
+                def get_fd(info):
                     fd = checked_get_suitable_downloader(info, self.params)(self, self.params)
                     for ph in self._progress_hooks:
                         fd.add_progress_hook(ph)
+                    return fd
+
+                def dl(name, info, fd=None):
+                    if fd is None:
+                        fd = get_fd(info)
                     if self.params.get('verbose'):
                         self.to_screen('[debug] Invoking downloader on %r' % info.get('url'))
 
@@ -2098,7 +2508,9 @@ class YoutubeDL(object):
                     downloaded = []
                     success = True
                     merger = FFmpegMergerPP(self)
-                    if not merger.available:
+                    if self.params.get('native_merge'):
+                        postprocessors = [NativeMergerPP(self)]
+                    elif not merger.available:
                         postprocessors = []
                         self.report_warning('You have requested multiple '
                                             'formats but ffmpeg or avconv are not installed.'
@@ -2146,6 +2558,7 @@ class YoutubeDL(object):
                             '[download] %s has already been downloaded and '
                             'merged' % filename)
                     else:
+                        format_downloads = []
                         for f in requested_formats:
                             new_info = dict(info_dict)
                             new_info.update(f)
@@ -2156,10 +2569,34 @@ class YoutubeDL(object):
                             if not ensure_dir_exists(fname):
                                 return
                             downloaded.append(fname)
-                            partial_success = dl(fname, new_info)
-                            success = success and partial_success
-                        info_dict['__postprocessors'] = postprocessors
-                        info_dict['__files_to_merge'] = downloaded
+                            format_downloads.append((fname, new_info))
+                        merged = None
+                        if (threading and self.params.get('stream_merge')
+                                and merger.available and filename != '-'):
+                            merged = self._merge_while_downloading(
+                                merger, filename, format_downloads, get_fd, dl)
+                        if merged is not None:
+                            success = merged
+                        elif (threading and self.params.get('concurrent_format_downloads')
+                                and filename != '-'):
+                            # Download all the formats at once, showing their
+                            # combined progress instead of their own
+                            progress = _CombinedProgress(
+                                FileDownloader(self, self.params), len(format_downloads))
+                            fds = []
+                            for i, (fname, new_info) in enumerate(format_downloads):
+                                fd = get_fd(new_info)
+                                fd.remove_progress_hook(fd.report_progress)
+                                fd.add_progress_hook(progress.hook(i))
+                                fds.append((fd, functools.partial(dl, fname, new_info, fd)))
+                            success = self._download_concurrently(fds)
+                        else:
+                            for fname, new_info in format_downloads:
+                                partial_success = dl(fname, new_info)
+                                success = success and partial_success
+                        if merged is None:
+                            info_dict['__postprocessors'] = postprocessors
+                            info_dict['__files_to_merge'] = downloaded
                 else:
                     # Just a single file
                     success = dl(filename, info_dict)
@@ -2171,6 +2608,9 @@ class YoutubeDL(object):
             except (ContentTooShortError, ) as err:
                 self.report_error('content too short (expected %s bytes and served %s)' % (err.expected, err.downloaded))
                 return
+            finally:
+                # Subtitles and thumbnails are downloaded along with the video
+                self._finish_sidecar_downloads(sidecars)
 
             if success and filename != '-':
                 # Fixup content
@@ -2324,12 +2764,8 @@ class YoutubeDL(object):
         if ie_info.get('__postprocessors') is not None:
             pps_chain.extend(ie_info['__postprocessors'])
         pps_chain.extend(self._pps)
-        for pp in pps_chain:
-            files_to_delete = []
-            try:
-                files_to_delete, info = pp.run(info)
-            except PostProcessingError as e:
-                self.report_error(e.msg)
+
+        def delete_files(files_to_delete):
             if files_to_delete and not self.params.get('keepvideo', False):
                 for old_filename in files_to_delete:
                     self.to_screen('Deleting original file %s (pass -k to keep)' % old_filename)
@@ -2338,6 +2774,50 @@ class YoutubeDL(object):
                     except (IOError, OSError):
                         self.report_warning('Unable to remove downloaded original file')
 
+        # Consecutive ffmpeg postprocessors that only copy streams add their
+        # work to a single ffmpeg pass, run before the next postprocessor
+        fuse = self.params.get('fuse_ffmpeg_passes', True)
+        command, planned_files_to_delete = None, []
+
+        def run_command():
+            try:
+                command.run()
+            except PostProcessingError as e:
+                self.report_error(e.msg)
+            else:
+                delete_files(planned_files_to_delete)
+            return None, []
+
+        for pp in pps_chain:
+            if fuse and isinstance(pp, FFmpegPostProcessor):
+                planned = None
+                try:
+                    for _ in range(2):
+                        if command is None:
+                            command = FFmpegCommand(pp, info['filepath'])
+                        planned = pp.plan(command, info)
+                        if planned is not None or not command.has_steps():
+                            break
+                        # it may fit in a new pass
+                        command, planned_files_to_delete = run_command()
+                except PostProcessingError as e:
+                    self.report_error(e.msg)
+                    continue
+                if planned is not None:
+                    files_to_delete, info = planned
+                    planned_files_to_delete.extend(files_to_delete)
+                    continue
+            if command is not None:
+                command, planned_files_to_delete = run_command()
+            files_to_delete = []
+            try:
+                files_to_delete, info = pp.run(info)
+            except PostProcessingError as e:
+                self.report_error(e.msg)
+            delete_files(files_to_delete)
+        if command is not None:
+            run_command()
+
     def _make_archive_id(self, info_dict):
         video_id = info_dict.get('id')
         if not video_id:
@@ -2350,7 +2830,7 @@ class YoutubeDL(object):
             if not url:
                 return
             # Try to find matching extractor for the URL and take its ie_key
-            for ie in self._ies:
+            for ie in self._suitable_ie_candidates(url):
                 if ie.suitable(url):
                     extractor = ie.ie_key()
                     break
@@ -2358,6 +2838,35 @@ class YoutubeDL(object):
                 return
         return extractor.lower() + ' ' + video_id
 
+    def _update_download_archive(self, fn):
+        """Add the entries appended to the archive file since the last call"""
+        try:
+            size = os.path.getsize(encodeFilename(fn))
+        except OSError as ose:
+            if ose.errno != errno.ENOENT:
+                raise
+            size = 0
+        if size < self._archive_pos:
+            # The file has been replaced or truncated: read it again
+            self._archive = set()
+            self._archive_pos = 0
+            self._archive_tail = b''
+        if size == self._archive_pos:
+            return
+        with locked_file(fn, 'rb') as archive_file:
+            archive_file.seek(self._archive_pos)
+            data = archive_file.read()
+        self._archive_pos += len(data)
+        # A trailing partial line may still be being written by another
+        # process: it is only added once it is complete
+        data = self._archive_tail + data
+        end = data.rfind(b'\n') + 1
+        self._archive_tail = data[end:]
+        for line in data[:end].decode('utf-8').splitlines():
+            line = line.strip()
+            if line:
+                self._archive.add(line)
+
     def in_download_archive(self, info_dict):
         fn = self.params.get('download_archive')
         if fn is None:
@@ -2367,15 +2876,10 @@ class YoutubeDL(object):
         if not vid_id:
             return False  # Incomplete video information
 
-        try:
-            with locked_file(fn, 'r', encoding='utf-8') as archive_file:
-                for line in archive_file:
-                    if line.strip() == vid_id:
-                        return True
-        except IOError as ioe:
-            if ioe.errno != errno.ENOENT:
-                raise
-        return False
+        # The archive is read once and then only the entries appended
+        # since, possibly by other processes, are read in
+        self._update_download_archive(fn)
+        return vid_id in self._archive
 
     def record_download_archive(self, info_dict):
         fn = self.params.get('download_archive')
@@ -2385,6 +2889,7 @@ class YoutubeDL(object):
         assert vid_id
         with locked_file(fn, 'a', encoding='utf-8') as archive_file:
             archive_file.write(vid_id + '\n')
+        self._archive.add(vid_id)
 
     @staticmethod
     def format_resolution(format, default='unknown'):
@@ -2494,6 +2999,13 @@ class YoutubeDL(object):
             req = sanitized_Request(req)
         return self._opener.open(req, timeout=self._socket_timeout)
 
+    def close_connections(self):
+        """Close idle persistent connections kept by the HTTP(S) handlers"""
+        for handler in self._opener.handlers:
+            pool = getattr(handler, '_conn_pool', None)
+            if pool:
+                pool.clear()
+
     def print_debug_header(self):
         if not self.params.get('verbose'):
             return
@@ -2677,7 +3189,7 @@ class YoutubeDL(object):
                 self.report_error(msg('Cannot write %s to JSON file ', label) + infofn)
                 return
 
-    def _write_thumbnails(self, info_dict, filename):
+    def _write_thumbnails(self, info_dict, filename, sidecars=None):
         if self.params.get('writethumbnail', False):
             thumbnails = info_dict.get('thumbnails')
             if thumbnails:
@@ -2703,12 +3215,188 @@ class YoutubeDL(object):
             else:
                 self.to_screen('[%s] %s: Downloading thumbnail %s...' %
                                (info_dict['extractor'], info_dict['id'], thumb_display_id))
-                try:
-                    uf = self.urlopen(t['url'])
-                    with open(encodeFilename(thumb_filename), 'wb') as thumbf:
-                        shutil.copyfileobj(uf, thumbf)
+
+                def report_thumb_error(err, url=t['url']):
+                    self.report_warning('Unable to download thumbnail "%s": %s' %
+                                        (url, error_to_compat_str(err)))
+
+                def report_thumb_written(thumb_display_id=thumb_display_id, thumb_filename=thumb_filename):
                     self.to_screen('[%s] %s: Writing thumbnail %sto: %s' %
                                    (info_dict['extractor'], info_dict['id'], thumb_display_id, thumb_filename))
-                except (compat_urllib_error.URLError, compat_http_client.HTTPException, socket.error) as err:
-                    self.report_warning('Unable to download thumbnail "%s": %s' %
-                                        (t['url'], error_to_compat_str(err)))
+
+                self._download_sidecar(
+                    sidecars, thumb_filename, functools.partial(self.urlopen, t['url']),
+                    (compat_urllib_error.URLError, compat_http_client.HTTPException, socket.error),
+                    report_thumb_error, report_thumb_written)
+
+    def _download_sidecar(self, sidecars, filename, urlopen, expected_errors, report_error, report_success=None):
+        """
+        Write the response of urlopen() to filename, in the background if
+        sidecars is a _SidecarDownloads. Expected errors are reported with
+        report_error(err), others are raised.
+
+        The response is written to a .part file first, so that an
+        interrupted download does not leave a truncated file behind.
+        """
+        def download():
+            uf = urlopen()
+            part_filename = filename + '.part'
+            try:
+                with open(encodeFilename(part_filename), 'wb') as f:
+                    shutil.copyfileobj(uf, f)
+                if sys.platform == 'win32' and os.path.exists(encodeFilename(filename)):
+                    # os.rename() does not replace an existing file on Windows
+                    os.remove(encodeFilename(filename))
+                os.rename(encodeFilename(part_filename), encodeFilename(filename))
+            finally:
+                if os.path.exists(encodeFilename(part_filename)):
+                    os.remove(encodeFilename(part_filename))
+
+        def report(err):
+            if err is None:
+                if report_success:
+                    report_success()
+            elif isinstance(err, expected_errors):
+                report_error(err)
+            else:
+                raise err
+
+        if sidecars is not None:
+            sidecars.start(download, report)
+            return
+        try:
+            download()
+        except expected_errors as err:
+            report(err)
+        else:
+            report(None)
+
+    @staticmethod
+    def _finish_sidecar_downloads(sidecars):
+        if sidecars is not None:
+            sidecars.finish()
+
+    def _merge_while_downloading(self, merger, filename, format_downloads, get_fd, dl):
+        """
+        Download the formats of format_downloads, a list of (filename,
+        info_dict), into named pipes that merger reads to merge them into
+        filename. Return whether it succeeded, or None if the formats
+        can't be downloaded into pipes.
+        """
+        if not hasattr(os, 'mkfifo'):
+            self.report_warning('Named pipes are not available, the formats will be merged after downloading them')
+            return None
+        fds = [get_fd(new_info) for _, new_info in format_downloads]
+        if not all(isinstance(fd, (HttpFD, FragmentFD)) for fd in fds):
+            return None
+
+        pipe_dir = tempfile.mkdtemp(prefix='youtube-dl-')
+        pipes = [
+            os.path.join(pipe_dir, 'f%d.%s' % (i, new_info['ext']))
+            for i, (_, new_info) in enumerate(format_downloads)]
+        temp_filename = prepend_extension(filename, 'temp')
+        try:
+            for pipe in pipes:
+                os.mkfifo(pipe)
+            self.to_screen('[ffmpeg] Merging formats into "%s" while downloading them' % filename)
+            proc = merger.start_merge(pipes, temp_filename)
+            result = {}
+
+            def wait_merge():
+                result['stderr'] = proc.communicate()[1]
+                # Downloads waiting for ffmpeg to open their pipe must not
+                # block forever: wake them up so that they fail to write, and
+                # remove the pipes so that later downloads write to a file
+                # until they are cancelled
+                for pipe in pipes:
+                    try:
+                        fd = os.open(pipe, os.O_RDONLY | os.O_NONBLOCK)
+                    except OSError:
+                        continue
+                    os.remove(pipe)
+                    os.close(fd)
+
+            def stop_merge():
+                if proc.poll() is None:
+                    try:
+                        proc.kill()
+                    except OSError:
+                        pass
+
+            def progress_hook(status):
+                # ffmpeg may be blocked opening the pipe of a failed download
+                if status['status'] == 'error':
+                    stop_merge()
+
+            merge_thread = threading.Thread(target=wait_merge)
+            merge_thread.daemon = True
+            merge_thread.start()
+
+            progress = _CombinedProgress(FileDownloader(self, self.params), len(fds))
+            downloads = []
+            for i, (fd, pipe, (_, new_info)) in enumerate(zip(fds, pipes, format_downloads)):
+                fd.remove_progress_hook(fd.report_progress)
+                fd.add_progress_hook(progress.hook(i))
+                fd.add_progress_hook(progress_hook)
+                downloads.append((fd, functools.partial(dl, pipe, new_info, fd)))
+            success = False
+            try:
+                success = self._download_concurrently(downloads)
+            finally:
+                if not success:
+                    stop_merge()
+                merge_thread.join()
+            if success:
+                try:
+                    merger.check_ffmpeg_result(proc, result['stderr'])
+                except PostProcessingError as err:
+                    self.report_error('unable to merge the formats: %s' % error_to_compat_str(err))
+                    success = False
+            if success:
+                os.rename(encodeFilename(temp_filename), encodeFilename(filename))
+            return success
+        finally:
+            if os.path.exists(encodeFilename(temp_filename)):
+                os.remove(encodeFilename(temp_filename))
+            shutil.rmtree(pipe_dir, ignore_errors=True)
+
+    def _download_concurrently(self, downloads):
+        """
+        Run downloads, a list of (fd, download) where download() makes the
+        FileDownloader fd download a file, in parallel threads and return
+        whether they all succeeded.
+
+        When a download fails, the others are cancelled; the exception of
+        the first failure, if any, is then raised.
+        """
+        failures = []
+        lock = threading.Lock()
+
+        def run(download):
+            try:
+                success, exc_info = download(), None
+            except Exception:
+                success, exc_info = False, sys.exc_info()
+            if success:
+                return
+            with lock:
+                if exc_info is None or not isinstance(exc_info[1], DownloadCancelled):
+                    failures.append(exc_info)
+                for fd, _ in downloads:
+                    fd.cancel()
+
+        threads = [threading.Thread(target=run, args=(download, )) for _, download in downloads]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        except BaseException:
+            # e.g. KeyboardInterrupt: stop the downloads before leaving
+            for fd, _ in downloads:
+                fd.cancel()
+            raise
+        if failures and failures[0] is not None:
+            raise failures[0][1]
+        return not failures
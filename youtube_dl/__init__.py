@@ -190,11 +190,36 @@ def _real_main(argv=None):
         opts.retries = parse_retries(opts.retries)
     if opts.fragment_retries is not None:
         opts.fragment_retries = parse_retries(opts.fragment_retries)
+    if opts.concurrent_fragment_downloads <= 0:
+        parser.error('concurrent fragments must be positive')
+    if opts.http_connections <= 0:
+        parser.error('http connections must be positive')
+    if opts.prefetch_pages is not None and opts.prefetch_pages < 0:
+        parser.error('prefetched pages must be positive or 0')
+    if opts.progress_interval is not None and opts.progress_interval < 0:
+        parser.error('progress interval must be positive or 0')
+    if opts.concurrent_entries <= 0:
+        parser.error('concurrent entries must be positive')
+    if opts.concurrent_sidecar_downloads <= 0:
+        parser.error('concurrent sidecar downloads must be positive')
+    if opts.connection_pool_size is not None and opts.connection_pool_size < 0:
+        parser.error('connection pool size must be positive or 0')
     if opts.buffersize is not None:
         numeric_buffersize = FileDownloader.parse_bytes(opts.buffersize)
         if numeric_buffersize is None:
             parser.error('invalid buffer size specified')
         opts.buffersize = numeric_buffersize
+    if opts.cache_max_size is not None:
+        numeric_cache_max_size = FileDownloader.parse_bytes(opts.cache_max_size)
+        if numeric_cache_max_size is None:
+            parser.error('invalid cache max size specified')
+        opts.cache_max_size = numeric_cache_max_size
+    if opts.http_cache and opts.cache_max_size is None:
+        opts.cache_max_size = 256 * 1024 * 1024
+    if opts.offline_replay and opts.cachedir is False:
+        parser.error('--offline-replay needs the cache dir')
+    if opts.cache_memory_size is not None and opts.cache_memory_size < 0:
+        parser.error('cache memory size must be positive or 0')
     if opts.http_chunk_size is not None:
         numeric_chunksize = FileDownloader.parse_bytes(opts.http_chunk_size)
         if not numeric_chunksize:
@@ -354,16 +379,26 @@ def _real_main(argv=None):
         'fragment_retries': opts.fragment_retries,
         'skip_unavailable_fragments': opts.skip_unavailable_fragments,
         'keep_fragments': opts.keep_fragments,
+        'concurrent_fragment_downloads': opts.concurrent_fragment_downloads,
+        'http_connections': opts.http_connections,
         'buffersize': opts.buffersize,
         'noresizebuffer': opts.noresizebuffer,
         'http_chunk_size': opts.http_chunk_size,
         'continuedl': opts.continue_dl,
         'noprogress': opts.noprogress,
         'progress_with_newline': opts.progress_with_newline,
+        'progress_interval': opts.progress_interval,
         'playliststart': opts.playliststart,
         'playlistend': opts.playlistend,
         'playlistreverse': opts.playlist_reverse,
         'playlistrandom': opts.playlist_random,
+        'lazy_playlist': opts.lazy_playlist,
+        'concurrent_format_downloads': opts.concurrent_format_downloads,
+        'native_merge': opts.native_merge,
+        'stream_merge': opts.stream_merge,
+        'prefetch_pages': opts.prefetch_pages,
+        'concurrent_entries': opts.concurrent_entries,
+        'concurrent_sidecar_downloads': opts.concurrent_sidecar_downloads,
         'noplaylist': opts.noplaylist,
         'logtostderr': opts.outtmpl == '-',
         'consoletitle': opts.consoletitle,
@@ -395,6 +430,10 @@ def _real_main(argv=None):
         'max_views': opts.max_views,
         'daterange': date,
         'cachedir': opts.cachedir,
+        'cache_max_size': opts.cache_max_size,
+        'cache_memory_size': opts.cache_memory_size,
+        'http_cache': opts.http_cache,
+        'offline_replay': opts.offline_replay,
         'youtube_print_sig_code': opts.youtube_print_sig_code,
         'age_limit': opts.age_limit,
         'download_archive': download_archive_fn,
@@ -403,9 +442,12 @@ def _real_main(argv=None):
         'prefer_insecure': opts.prefer_insecure,
         'proxy': opts.proxy,
         'socket_timeout': opts.socket_timeout,
+        'connection_pool_size': opts.connection_pool_size,
+        'connection_idle_timeout': opts.connection_idle_timeout,
         'bidi_workaround': opts.bidi_workaround,
         'debug_printtraffic': opts.debug_printtraffic,
         'prefer_ffmpeg': opts.prefer_ffmpeg,
+        'fuse_ffmpeg_passes': opts.fuse_ffmpeg_passes,
         'include_ads': opts.include_ads,
         'default_search': opts.default_search,
         'youtube_include_dash_manifest': opts.youtube_include_dash_manifest,
@@ -471,6 +513,9 @@ def _real_main(argv=None):
             ydl.to_screen('--max-download limit reached, aborting.')
             retcode = 101
 
+        if opts.cache_max_size is not None:
+            ydl.cache.prune()
+
     sys.exit(retcode)
 
 
@@ -2,7 +2,11 @@ from __future__ import unicode_literals
 
 from math import ceil
 
-from .compat import compat_b64decode
+from .compat import (
+    compat_b64decode,
+    compat_struct_pack,
+    compat_struct_unpack,
+)
 from .utils import bytes_to_intlist, intlist_to_bytes
 
 BLOCK_SIZE_BYTES = 16
@@ -30,20 +34,15 @@ def aes_ctr_decrypt(data, key, counter):
                                returns the next counter block
     @returns {int[]}           decrypted data
     """
-    expanded_key = key_expansion(key)
+    round_keys = _round_key_words(key_expansion(key))
     block_count = int(ceil(float(len(data)) / BLOCK_SIZE_BYTES))
 
-    decrypted_data = []
-    for i in range(block_count):
-        counter_block = counter.next_value()
-        block = data[i * BLOCK_SIZE_BYTES: (i + 1) * BLOCK_SIZE_BYTES]
-        block += [0] * (BLOCK_SIZE_BYTES - len(block))
-
-        cipher_counter_block = aes_encrypt(counter_block, expanded_key)
-        decrypted_data += xor(block, cipher_counter_block)
-    decrypted_data = decrypted_data[:len(data)]
+    keystream = []
+    for _ in range(block_count):
+        keystream.extend(_encrypt_block_words(
+            _block_words(intlist_to_bytes(counter.next_value())), round_keys))
 
-    return decrypted_data
+    return xor(data, bytes_to_intlist(_words_to_bytes(keystream)))
 
 
 def aes_cbc_decrypt(data, key, iv):
@@ -55,21 +54,75 @@ def aes_cbc_decrypt(data, key, iv):
     @param {int[]} iv          16-Byte IV
     @returns {int[]}           decrypted data
     """
-    expanded_key = key_expansion(key)
-    block_count = int(ceil(float(len(data)) / BLOCK_SIZE_BYTES))
+    return bytes_to_intlist(aes_cbc_decrypt_bytes(
+        intlist_to_bytes(data), intlist_to_bytes(key), intlist_to_bytes(iv)))
 
-    decrypted_data = []
-    previous_cipher_block = iv
-    for i in range(block_count):
-        block = data[i * BLOCK_SIZE_BYTES: (i + 1) * BLOCK_SIZE_BYTES]
-        block += [0] * (BLOCK_SIZE_BYTES - len(block))
 
-        decrypted_block = aes_decrypt(block, expanded_key)
-        decrypted_data += xor(decrypted_block, previous_cipher_block)
-        previous_cipher_block = block
-    decrypted_data = decrypted_data[:len(data)]
+def aes_cbc_decrypt_bytes(data, key, iv):
+    """
+    Decrypt with aes in CBC mode, working on whole 32-bit words
 
-    return decrypted_data
+    @param {bytes} data        cipher
+    @param {bytes} key         16/24/32-Byte cipher key
+    @param {bytes} iv          16-Byte IV
+    @returns {bytes}           decrypted data
+    """
+    data_len = len(data)
+    padding = -data_len % BLOCK_SIZE_BYTES
+    if padding:
+        data += b'\0' * padding
+    return AESCBCDecrypter(key, iv).decrypt(data)[:data_len]
+
+
+class AESCBCDecrypter(object):
+    """
+    Decrypt with aes in CBC mode, chunk by chunk
+
+    The chunks passed to decrypt() are consecutive parts of the cipher, their
+    lengths must be multiples of BLOCK_SIZE_BYTES.
+
+    @param {bytes} key         16/24/32-Byte cipher key
+    @param {bytes} iv          16-Byte IV
+    """
+
+    def __init__(self, key, iv):
+        self._round_keys = _decryption_round_key_words(_round_key_words(key_expansion(bytes_to_intlist(key))))
+        self._iv = _block_words(iv)
+
+    def decrypt(self, data):
+        """
+        @param {bytes} data        next chunk of the cipher
+        @returns {bytes}           decrypted chunk
+        """
+        words = compat_struct_unpack('>%dI' % (len(data) // 4), data)
+        round_keys = self._round_keys
+        first_key, middle_keys, last_key = round_keys[0], round_keys[1:-1], round_keys[-1]
+        # The rounds are inlined: this is the hot path of HLS decryption
+        td0, td1, td2, td3, sbox = TD0, TD1, TD2, TD3, SBOX_INV
+
+        decrypted = []
+        append = decrypted.extend
+        p0, p1, p2, p3 = self._iv
+        for i in range(0, len(words), 4):
+            c0, c1, c2, c3 = words[i:i + 4]
+            k0, k1, k2, k3 = first_key
+            s0, s1, s2, s3 = c0 ^ k0, c1 ^ k1, c2 ^ k2, c3 ^ k3
+            for k0, k1, k2, k3 in middle_keys:
+                s0, s1, s2, s3 = (
+                    td0[s0 >> 24] ^ td1[s3 >> 16 & 0xFF] ^ td2[s2 >> 8 & 0xFF] ^ td3[s1 & 0xFF] ^ k0,
+                    td0[s1 >> 24] ^ td1[s0 >> 16 & 0xFF] ^ td2[s3 >> 8 & 0xFF] ^ td3[s2 & 0xFF] ^ k1,
+                    td0[s2 >> 24] ^ td1[s1 >> 16 & 0xFF] ^ td2[s0 >> 8 & 0xFF] ^ td3[s3 & 0xFF] ^ k2,
+                    td0[s3 >> 24] ^ td1[s2 >> 16 & 0xFF] ^ td2[s1 >> 8 & 0xFF] ^ td3[s0 & 0xFF] ^ k3)
+            k0, k1, k2, k3 = last_key
+            append((
+                (sbox[s0 >> 24] << 24 | sbox[s3 >> 16 & 0xFF] << 16 | sbox[s2 >> 8 & 0xFF] << 8 | sbox[s1 & 0xFF]) ^ k0 ^ p0,
+                (sbox[s1 >> 24] << 24 | sbox[s0 >> 16 & 0xFF] << 16 | sbox[s3 >> 8 & 0xFF] << 8 | sbox[s2 & 0xFF]) ^ k1 ^ p1,
+                (sbox[s2 >> 24] << 24 | sbox[s1 >> 16 & 0xFF] << 16 | sbox[s0 >> 8 & 0xFF] << 8 | sbox[s3 & 0xFF]) ^ k2 ^ p2,
+                (sbox[s3 >> 24] << 24 | sbox[s2 >> 16 & 0xFF] << 16 | sbox[s1 >> 8 & 0xFF] << 8 | sbox[s0 & 0xFF]) ^ k3 ^ p3))
+            p0, p1, p2, p3 = c0, c1, c2, c3
+        self._iv = p0, p1, p2, p3
+
+        return _words_to_bytes(decrypted)
 
 
 def aes_cbc_encrypt(data, key, iv):
@@ -198,6 +251,63 @@ def aes_decrypt(data, expanded_key):
     return data
 
 
+def _block_words(block):
+    return compat_struct_unpack('>4I', block)
+
+
+def _words_to_bytes(words):
+    return compat_struct_pack('>%dI' % len(words), *words)
+
+
+def _round_key_words(expanded_key):
+    """
+    @param {int[]} expanded_key  176/208/240-Byte expanded key
+    @returns {int[][]}           4 32-bit words for each round
+    """
+    words = compat_struct_unpack('>%dI' % (len(expanded_key) // 4), intlist_to_bytes(expanded_key))
+    return [words[i:i + 4] for i in range(0, len(words), 4)]
+
+
+def _decryption_round_key_words(round_keys):
+    """
+    Round keys of the equivalent inverse cipher, in the order they are used
+
+    @param {int[][]} round_keys  encryption round keys from _round_key_words
+    @returns {int[][]}           decryption round keys
+    """
+    sbox, td0, td1, td2, td3 = SBOX, TD0, TD1, TD2, TD3
+    return [round_keys[-1]] + [
+        [td0[sbox[w >> 24]] ^ td1[sbox[w >> 16 & 0xFF]] ^ td2[sbox[w >> 8 & 0xFF]] ^ td3[sbox[w & 0xFF]]
+         for w in round_key]
+        for round_key in round_keys[-2:0:-1]] + [round_keys[0]]
+
+
+def _encrypt_block_words(state, round_keys):
+    """
+    Encrypt one block with aes, using the T-tables
+
+    @param {int[]} state         4 32-bit words
+    @param {int[][]} round_keys  round keys from _round_key_words
+    @returns {int[]}             4 32-bit words
+    """
+    te0, te1, te2, te3 = TE0, TE1, TE2, TE3
+    k0, k1, k2, k3 = round_keys[0]
+    s0, s1, s2, s3 = state[0] ^ k0, state[1] ^ k1, state[2] ^ k2, state[3] ^ k3
+    for k0, k1, k2, k3 in round_keys[1:-1]:
+        s0, s1, s2, s3 = (
+            te0[s0 >> 24] ^ te1[s1 >> 16 & 0xFF] ^ te2[s2 >> 8 & 0xFF] ^ te3[s3 & 0xFF] ^ k0,
+            te0[s1 >> 24] ^ te1[s2 >> 16 & 0xFF] ^ te2[s3 >> 8 & 0xFF] ^ te3[s0 & 0xFF] ^ k1,
+            te0[s2 >> 24] ^ te1[s3 >> 16 & 0xFF] ^ te2[s0 >> 8 & 0xFF] ^ te3[s1 & 0xFF] ^ k2,
+            te0[s3 >> 24] ^ te1[s0 >> 16 & 0xFF] ^ te2[s1 >> 8 & 0xFF] ^ te3[s2 & 0xFF] ^ k3)
+    sbox = SBOX
+    k0, k1, k2, k3 = round_keys[-1]
+    return (
+        (sbox[s0 >> 24] << 24 | sbox[s1 >> 16 & 0xFF] << 16 | sbox[s2 >> 8 & 0xFF] << 8 | sbox[s3 & 0xFF]) ^ k0,
+        (sbox[s1 >> 24] << 24 | sbox[s2 >> 16 & 0xFF] << 16 | sbox[s3 >> 8 & 0xFF] << 8 | sbox[s0 & 0xFF]) ^ k1,
+        (sbox[s2 >> 24] << 24 | sbox[s3 >> 16 & 0xFF] << 16 | sbox[s0 >> 8 & 0xFF] << 8 | sbox[s1 & 0xFF]) ^ k2,
+        (sbox[s3 >> 24] << 24 | sbox[s0 >> 16 & 0xFF] << 16 | sbox[s1 >> 8 & 0xFF] << 8 | sbox[s2 & 0xFF]) ^ k3)
+
+
 def aes_decrypt_text(data, password, key_size_bytes):
     """
     Decrypt text
@@ -380,6 +490,24 @@ def shift_rows_inv(data):
     return data_shifted
 
 
+def _t_tables(sbox, coefficients):
+    # Each T-table entry combines the S-box lookup and the (Inv)MixColumns
+    # multiplications of a byte; the 4 tables are rotations of each other
+    t0 = []
+    for x in range(256):
+        word = 0
+        for c in coefficients:
+            word = word << 8 | rijndael_mul(sbox[x], c)
+        t0.append(word)
+    return [tuple(t0)] + [
+        tuple((w >> 8 * r | w << 32 - 8 * r) & 0xFFFFFFFF for w in t0)
+        for r in range(1, 4)]
+
+
+TE0, TE1, TE2, TE3 = _t_tables(SBOX, (0x2, 0x1, 0x1, 0x3))
+TD0, TD1, TD2, TD3 = _t_tables(SBOX_INV, (0xE, 0x9, 0xD, 0xB))
+
+
 def inc(data):
     data = data[:]  # copy
     for i in range(len(data) - 1, -1, -1):
@@ -391,4 +519,5 @@ def inc(data):
     return data
 
 
-__all__ = ['aes_encrypt', 'key_expansion', 'aes_ctr_decrypt', 'aes_cbc_decrypt', 'aes_decrypt_text']
+__all__ = ['aes_encrypt', 'key_expansion', 'aes_ctr_decrypt', 'aes_cbc_decrypt', 'aes_cbc_decrypt_bytes', 'AESCBCDecrypter',
+           'aes_decrypt_text']
@@ -1,24 +1,37 @@
 # coding: utf-8
 from __future__ import unicode_literals
 
+import email.utils
 import errno
+import hashlib
+import io
 import json
 import os
 import re
 import shutil
+import sys
+import tempfile
+import time
 import traceback
 
 from .compat import (
+    compat_basestring,
     compat_getenv,
+    compat_http_client,
     compat_open as open,
     compat_os_makedirs,
+    compat_urllib_error,
+    compat_urllib_response,
 )
 from .utils import (
     error_to_compat_str,
     escape_rfc3986,
     expand_path,
     is_outdated_version,
-    traverse_obj,
+    LRUCache,
+    sanitized_Request,
+    std_headers,
+    update_Request,
     write_json_file,
 )
 from .version import __version__
@@ -28,10 +41,20 @@ class Cache(object):
 
     _YTDL_DIR = 'youtube-dl'
     _VERSION_KEY = _YTDL_DIR + '_version'
+    _EXPIRES_KEY = 'expires'
     _DEFAULT_VERSION = '2021.12.17'
+    # Stale temporary files of interrupted writes are removed by prune()
+    _TMP_MAX_AGE = 24 * 60 * 60
+
+    _DEFAULT_MEMORY_SIZE = 64
 
     def __init__(self, ydl):
         self._ydl = ydl
+        memory_size = self._get_param('cache_memory_size')
+        # JSON of the entries loaded or stored, by (root dir, section, key,
+        # dtype), along with the state of their file
+        self._memory = LRUCache(
+            self._DEFAULT_MEMORY_SIZE if memory_size is None else memory_size)
 
     def _write_debug(self, *args, **kwargs):
         self._ydl.write_debug(*args, **kwargs)
@@ -59,31 +82,68 @@ class Cache(object):
         return os.path.join(
             self._get_root_dir(), section, '%s.%s' % (key, dtype))
 
+    @staticmethod
+    def _file_state(fn):
+        # Files are replaced rather than rewritten, so that a changed inode
+        # tells that another process has stored the entry
+        st = os.stat(fn)
+        return st.st_ino, st.st_size, st.st_mtime
+
+    def _memory_entry(self, section, key, dtype):
+        memory_key = (self._get_root_dir(), section, key, dtype)
+        entry = self._memory.get(memory_key)
+        if entry is None:
+            entry = {'fn': self._get_cache_fn(section, key, dtype)}
+        return memory_key, entry
+
     @property
     def enabled(self):
         return self._get_param('cachedir') is not False
 
-    def store(self, section, key, data, dtype='json'):
+    def store(self, section, key, data, dtype='json', ttl=None):
+        """
+        Store data in the cache
+
+        If ttl is not None, the entry expires after ttl seconds.
+        """
         assert dtype in ('json',)
 
         if not self.enabled:
             return
 
-        fn = self._get_cache_fn(section, key, dtype)
+        memory_key, entry = self._memory_entry(section, key, dtype)
+        fn = entry['fn']
+        content = {self._VERSION_KEY: __version__, 'data': data}
+        if ttl is not None:
+            content[self._EXPIRES_KEY] = time.time() + ttl
         try:
             compat_os_makedirs(os.path.dirname(fn), exist_ok=True)
             self._write_debug('Saving {section}.{key} to cache'.format(section=section, key=key))
-            write_json_file({self._VERSION_KEY: __version__, 'data': data}, fn)
+            # written to a temporary file first, so that concurrent readers
+            # never see a partial entry
+            write_json_file(content, fn)
         except Exception:
+            self._memory.set(memory_key, {'fn': fn})
             tb = traceback.format_exc()
             self._report_warning('Writing cache to {fn!r} failed: {tb}'.format(fn=fn, tb=tb))
+        else:
+            self._remember(memory_key, fn, json.dumps(content))
+
+    def _remember(self, memory_key, fn, text):
+        try:
+            state = self._file_state(fn)
+        except (OSError, IOError):
+            state = None
+        self._memory.set(memory_key, {'fn': fn, 'state': state, 'text': text})
 
     def clear(self, section, key, dtype='json'):
 
         if not self.enabled:
             return
 
-        fn = self._get_cache_fn(section, key, dtype)
+        memory_key, entry = self._memory_entry(section, key, dtype)
+        fn = entry['fn']
+        self._memory.set(memory_key, {'fn': fn})
         self._write_debug('Clearing {section}.{key} from cache'.format(section=section, key=key))
         try:
             os.remove(fn)
@@ -94,10 +154,17 @@ class Cache(object):
             tb = traceback.format_exc()
             self._report_warning('Clearing cache from {fn!r} failed: {tb}'.format(fn=fn, tb=tb))
 
+    def _is_expired(self, content):
+        expires = content.get(self._EXPIRES_KEY) if isinstance(content, dict) else None
+        return expires is not None and expires <= time.time()
+
     def _validate(self, data, min_ver):
-        version = traverse_obj(data, self._VERSION_KEY)
+        version = data.get(self._VERSION_KEY) if isinstance(data, dict) else None
         if not version:  # Backward compatibility
             data, version = {'data': data}, self._DEFAULT_VERSION
+        if self._is_expired(data):
+            self._write_debug('Discarding expired cache entry')
+            return
         if not is_outdated_version(version, min_ver or '0', assume_new=False):
             return data['data']
         self._write_debug('Discarding old cache from version {version} (needs {min_ver})'.format(version=version, min_ver=min_ver))
@@ -109,11 +176,19 @@ class Cache(object):
         if not self.enabled:
             return default
 
-        cache_fn = self._get_cache_fn(section, key, dtype)
+        memory_key, entry = self._memory_entry(section, key, dtype)
+        cache_fn = entry['fn']
         try:
-            with open(cache_fn, encoding='utf-8') as cachef:
-                self._write_debug('Loading {section}.{key} from cache'.format(section=section, key=key), only_once=True)
-                return self._validate(json.load(cachef), min_ver)
+            state = self._file_state(cache_fn)
+            if 'text' in entry and state == entry['state']:
+                text = entry['text']
+            else:
+                with open(cache_fn, encoding='utf-8') as cachef:
+                    self._write_debug('Loading {section}.{key} from cache'.format(section=section, key=key), only_once=True)
+                    text = cachef.read()
+                self._memory.set(memory_key, {'fn': cache_fn, 'state': state, 'text': text})
+            # decoded on each load: callers may modify the data they get
+            return self._validate(json.loads(text), min_ver)
         except (ValueError, KeyError):
             try:
                 file_size = 'size: %d' % os.path.getsize(cache_fn)
@@ -121,6 +196,7 @@ class Cache(object):
                 file_size = error_to_compat_str(oe)
             self._report_warning('Cache retrieval from %s failed (%s)' % (cache_fn, file_size))
         except Exception as e:
+            self._memory.set(memory_key, {'fn': cache_fn})
             if getattr(e, 'errno') == errno.ENOENT:
                 # no cache available
                 return
@@ -128,6 +204,64 @@ class Cache(object):
 
         return default
 
+    def prune(self, max_size=None):
+        """
+        Remove the expired entries, then the least recently stored ones
+        until the cache takes at most max_size bytes
+
+        max_size defaults to the cache_max_size parameter. Files that
+        disappear meanwhile, e.g. pruned by another process, are skipped.
+        """
+        if not self.enabled:
+            return
+        if max_size is None:
+            max_size = self._get_param('cache_max_size')
+
+        now = time.time()
+        entries = []
+        for dirpath, _, filenames in os.walk(self._get_root_dir()):
+            for filename in filenames:
+                fn = os.path.join(dirpath, filename)
+                try:
+                    st = os.stat(fn)
+                    mtime = st.st_mtime
+                    if filename.endswith('.tmp'):
+                        if st.st_mtime < now - self._TMP_MAX_AGE:
+                            os.remove(fn)
+                        continue
+                    if filename.endswith('.json'):
+                        with open(fn, encoding='utf-8') as cachef:
+                            expired = self._is_expired(json.load(cachef))
+                        if expired:
+                            self._write_debug('Removing expired cache file {fn!r}'.format(fn=fn))
+                            os.remove(fn)
+                            continue
+                except (OSError, IOError) as e:
+                    if getattr(e, 'errno') != errno.ENOENT:
+                        self._report_warning('Pruning cache file {fn!r} failed: {err}'.format(
+                            fn=fn, err=error_to_compat_str(e)))
+                    continue
+                except ValueError:
+                    # a corrupt entry: the first one to go
+                    mtime = 0
+                entries.append((mtime, st.st_size, fn))
+
+        if max_size is None:
+            return
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, fn in sorted(entries):
+            if total_size <= max_size:
+                break
+            self._write_debug('Removing cache file {fn!r}'.format(fn=fn))
+            try:
+                os.remove(fn)
+            except (OSError, IOError) as e:
+                if getattr(e, 'errno') != errno.ENOENT:
+                    self._report_warning('Pruning cache file {fn!r} failed: {err}'.format(
+                        fn=fn, err=error_to_compat_str(e)))
+                    continue
+            total_size -= size
+
     def remove(self):
         if not self.enabled:
             self._to_screen('Cache is disabled (Did you combine --no-cache-dir and --rm-cache-dir?)')
@@ -142,4 +276,275 @@ class Cache(object):
         if os.path.exists(cachedir):
             self._to_screen('.', skip_eol=True)
             shutil.rmtree(cachedir)
+        self._memory.clear()
         self._to_screen('.')
+
+
+def _parse_headers(header_pairs):
+    # the same kind of object as the headers of a urllib response
+    data = ''.join('%s: %s\r\n' % (k, v) for k, v in header_pairs).encode('iso-8859-1') + b'\r\n'
+    try:
+        return compat_http_client.parse_headers(io.BytesIO(data))
+    except AttributeError:  # Python 2
+        return compat_http_client.HTTPMessage(io.BytesIO(data))
+
+
+def _http_date(value):
+    parsed = email.utils.parsedate_tz(value) if value else None
+    return email.utils.mktime_tz(parsed) if parsed else None
+
+
+class _CachingReader(object):
+    """
+    Read a response, passing its body to on_complete once it has been read
+    to the end, unless it is larger than max_size
+    """
+
+    def __init__(self, fp, max_size, on_complete):
+        self._fp = fp
+        self._max_size = max_size
+        self._on_complete = on_complete
+        self._chunks = []
+        self._size = 0
+
+    def _consumed(self, data, complete):
+        if self._chunks is None:
+            return data
+        self._size += len(data)
+        if self._size > self._max_size:
+            self._chunks = None
+            return data
+        self._chunks.append(data)
+        if complete:
+            body, self._chunks = b''.join(self._chunks), None
+            self._on_complete(body)
+        return data
+
+    def read(self, *args):
+        data = self._fp.read(*args)
+        return self._consumed(data, not data or not args or args[0] is None or args[0] < 0)
+
+    def readline(self, *args):
+        line = self._fp.readline(*args)
+        return self._consumed(line, not line)
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+    def close(self):
+        self._fp.close()
+
+
+class ResponseCache(object):
+    """
+    Private HTTP cache of the responses to the requests of extractors
+
+    Responses are stored in the cache dir, keyed by the method, URL, body
+    and explicit headers of their request and by the cookies it is sent
+    with. Responses varying on other request headers are only reused for
+    requests sent with the same values, and responses with "Vary: *" are
+    not stored. A cached response is reused
+    while it is fresh according to its Cache-Control or Expires headers,
+    then revalidated with a conditional request if it has an ETag or a
+    Last-Modified date. With the offline_replay parameter, responses are
+    only ever served from the cache.
+    """
+
+    _SECTION = 'http'
+    # Headers that don't change the response, or that change on each run
+    _IGNORED_HEADERS = ('x-forwarded-for', 'if-none-match', 'if-modified-since')
+    # Larger bodies, or bodies that are not read to the end, are not stored
+    _MAX_BODY_SIZE = 16 * 1024 * 1024
+    # Heuristic freshness of responses that only have a Last-Modified date
+    _MAX_HEURISTIC_LIFETIME = 24 * 60 * 60
+
+    def __init__(self, ydl):
+        self._ydl = ydl
+
+    @property
+    def enabled(self):
+        params = self._ydl.params
+        return (
+            self._ydl.cache.enabled
+            and bool(params.get('http_cache') or params.get('offline_replay')))
+
+    def _cookie_header(self, req):
+        # the Cookie header that req will be sent with, if not explicit
+        if req.has_header('Cookie'):
+            return None
+        cookie_req = sanitized_Request(req.get_full_url())
+        self._ydl.cookiejar.add_cookie_header(cookie_req)
+        return cookie_req.get_header('Cookie')
+
+    def _request_header(self, req, cookie, name):
+        # the value of the header name (lowercase) that req will be sent with
+        for k, v in list(req.headers.items()) + list(req.unredirected_hdrs.items()):
+            if k.lower() == name:
+                return v
+        if name == 'cookie':
+            return cookie
+        for k, v in std_headers.items():
+            if k.lower() == name:
+                return v
+
+    def _key(self, req, cookie):
+        method = req.get_method()
+        headers = sorted(
+            (k.lower(), v) for k, v in list(req.headers.items()) + list(req.unredirected_hdrs.items())
+            if k.lower() not in self._IGNORED_HEADERS)
+        if cookie:
+            headers.append(('cookie', cookie))
+        key = hashlib.sha1(json.dumps([method, req.get_full_url(), headers]).encode('utf-8'))
+        key.update(req.data or b'')
+        return key.hexdigest()
+
+    def _get_fn(self, key):
+        return os.path.join(self._ydl.cache._get_root_dir(), self._SECTION, key + '.http')
+
+    @staticmethod
+    def _header(headers, name):
+        values = [v for k, v in headers if k.lower() == name]
+        return ', '.join(values) if values else None
+
+    def _cache_control(self, headers):
+        directives = {}
+        for directive in (self._header(headers, 'cache-control') or '').split(','):
+            name, _, value = directive.strip().partition('=')
+            if name:
+                directives[name.lower()] = value.strip('"')
+        return directives
+
+    def _is_fresh(self, meta):
+        headers = meta['headers']
+        cache_control = self._cache_control(headers)
+        if 'no-cache' in cache_control:
+            return False
+        date = _http_date(self._header(headers, 'date')) or meta['time']
+        try:
+            age = max(time.time() - meta['time'], 0) + int(self._header(headers, 'age') or 0)
+            lifetime = int(cache_control['max-age'])
+        except KeyError:
+            expires = self._header(headers, 'expires')
+            last_modified = _http_date(self._header(headers, 'last-modified'))
+            if expires is not None:
+                # an invalid date means that the response has already expired
+                lifetime = (_http_date(expires) or date) - date
+            elif last_modified is not None:
+                lifetime = min((date - last_modified) / 10, self._MAX_HEURISTIC_LIFETIME)
+            else:
+                lifetime = 0
+        except ValueError:
+            return False
+        return age < lifetime
+
+    def _load(self, fn):
+        try:
+            with open(fn, 'rb') as f:
+                meta = json.loads(f.readline().decode('utf-8'))
+                return meta, f.read()
+        except (IOError, OSError) as e:
+            if getattr(e, 'errno') != errno.ENOENT:
+                self._ydl.report_warning('Unable to read cached response from %s: %s' % (fn, error_to_compat_str(e)))
+        except ValueError:
+            self._ydl.report_warning('Ignoring corrupt cached response %s' % fn)
+
+    def _store(self, fn, meta, body):
+        try:
+            compat_os_makedirs(os.path.dirname(fn), exist_ok=True)
+            # written to a temporary file first, so that concurrent readers
+            # never see a partial response
+            tf = tempfile.NamedTemporaryFile(
+                suffix='.tmp', prefix=os.path.basename(fn) + '.',
+                dir=os.path.dirname(fn), delete=False)
+            try:
+                with tf:
+                    tf.write(json.dumps(meta).encode('utf-8') + b'\n')
+                    tf.write(body)
+                if sys.platform == 'win32' and os.path.exists(fn):
+                    os.unlink(fn)
+                os.rename(tf.name, fn)
+            except Exception:
+                os.remove(tf.name)
+                raise
+        except (IOError, OSError) as e:
+            self._ydl.report_warning('Unable to cache response in %s: %s' % (fn, error_to_compat_str(e)))
+
+    def _response(self, meta, body):
+        headers = _parse_headers(meta['headers'])
+        resp = compat_urllib_response.addinfourl(io.BytesIO(body), headers, meta['url'], meta['status'])
+        resp.msg = 'OK'
+        # cookies set by the response are needed by the next requests
+        self._ydl.cookiejar.extract_cookies(resp, sanitized_Request(meta['url']))
+        return resp
+
+    def urlopen(self, req):
+        """ Return the response to req, from the cache if possible """
+        if isinstance(req, compat_basestring):
+            req = sanitized_Request(req)
+        url = req.get_full_url()
+        cookie = self._cookie_header(req)
+        fn = self._get_fn(self._key(req, cookie))
+        offline = self._ydl.params.get('offline_replay')
+        if req.get_method() not in ('GET', 'POST') and not offline:
+            return self._ydl.urlopen(req)
+        cached = self._load(fn)
+        if cached is not None and any(
+                self._request_header(req, cookie, name) != value
+                for name, value in cached[0].get('vary', {}).items()):
+            cached = None
+
+        if offline:
+            if cached is None:
+                raise compat_urllib_error.URLError(
+                    'no cached response for %s %s (offline replay)' % (req.get_method(), url))
+            return self._response(*cached)
+
+        headers = {}
+        if cached is not None:
+            meta, body = cached
+            if self._is_fresh(meta):
+                self._ydl.write_debug('Using cached response for %s' % url)
+                return self._response(meta, body)
+            etag, last_modified = (self._header(meta['headers'], name) for name in ('etag', 'last-modified'))
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+
+        request_time = time.time()
+        try:
+            resp = self._ydl.urlopen(update_Request(req, headers=headers) if headers else req)
+        except compat_urllib_error.HTTPError as err:
+            if err.code != 304 or not headers:
+                raise
+            err.close()
+            self._ydl.write_debug('Revalidated cached response for %s' % url)
+            # the validated response is updated with the headers of the 304 one
+            updated = set(k.lower() for k in err.headers.keys())
+            updated.difference_update(('content-length', 'transfer-encoding', 'content-encoding'))
+            meta['headers'] = [(k, v) for k, v in meta['headers'] if k.lower() not in updated] + [
+                (k, v) for k, v in err.headers.items() if k.lower() in updated]
+            meta['time'] = request_time
+            self._store(fn, meta, body)
+            return self._response(meta, body)
+
+        if resp.getcode() != 200 or 'no-store' in self._cache_control(resp.headers.items()):
+            return resp
+        vary = set(
+            name.strip().lower()
+            for name in (self._header(resp.headers.items(), 'vary') or '').split(',')
+            if name.strip())
+        if '*' in vary:
+            return resp
+        meta = {
+            'method': req.get_method(),
+            'url': resp.geturl(),
+            'status': resp.getcode(),
+            'headers': resp.headers.items(),
+            'time': request_time,
+            'vary': dict((name, self._request_header(req, cookie, name)) for name in vary),
+        }
+        fp = _CachingReader(resp, self._MAX_BODY_SIZE, lambda body: self._store(fn, meta, body))
+        cached_resp = compat_urllib_response.addinfourl(fp, resp.headers, resp.geturl(), resp.getcode())
+        cached_resp.msg = resp.msg
+        return cached_resp
@@ -55,9 +55,6 @@ def _get_suitable_downloader(info_dict, params={}):
             params['external_downloader_args'] = None
 
     protocol = info_dict['protocol']
-    if protocol.startswith('m3u8') and info_dict.get('is_live'):
-        return FFmpegFD
-
     if protocol == 'm3u8' and params.get('hls_prefer_native') is True:
         return HlsFD
 
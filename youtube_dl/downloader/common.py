@@ -2,6 +2,7 @@ from __future__ import division, unicode_literals
 
 import os
 import re
+import stat
 import sys
 import time
 import random
@@ -9,6 +10,7 @@ import random
 from ..compat import compat_os_name
 from ..utils import (
     decodeArgument,
+    DownloadCancelled,
     encodeFilename,
     error_to_compat_str,
     float_or_none,
@@ -52,17 +54,28 @@ class FileDownloader(object):
     http_chunk_size:    Size of a chunk for chunk-based HTTP downloading. May be
                         useful for bypassing bandwidth throttling imposed by
                         a webserver (experimental)
+    http_connections:   Number of connections used to download a file over
+                        HTTP, each one fetching a range of the file.
+    progress_interval:  Minimum number of seconds between two "downloading"
+                        statuses passed to the progress hooks (including the
+                        progress bar and console title), 0.1 by default;
+                        "finished" and "error" statuses are always passed.
 
     Subclasses of this one must re-define the real_download method.
     """
 
     _TEST_FILE_SIZE = 10241
+    # Progress hooks are called at most this often unless progress_interval
+    # is set, rather than for every block received
+    _PROGRESS_INTERVAL = 0.1
     params = None
 
     def __init__(self, ydl, params):
         """Create a FileDownloader object with the given options."""
         self.ydl = ydl
         self._progress_hooks = []
+        self._progress_time = None
+        self._cancelled = False
         self.params = params
         self.add_progress_hook(self.report_progress)
 
@@ -134,6 +147,14 @@ class FileDownloader(object):
         if os.path.isfile(fn):
             return os.path.getsize(fn)
 
+    @staticmethod
+    def is_fifo(unencoded_filename):
+        """Whether the file is a named pipe, written to as a stream"""
+        try:
+            return stat.S_ISFIFO(os.stat(encodeFilename(unencoded_filename)).st_mode)
+        except (OSError, TypeError, ValueError):
+            return False
+
     @staticmethod
     def best_block_size(elapsed_time, bytes):
         new_min = max(bytes / 2.0, 1.0)
@@ -341,17 +362,20 @@ class FileDownloader(object):
         """Download to a filename using the info from info_dict
         Return True on success and False otherwise
 
+        filename may also be a writable file-like object if the downloader
+        supports it (HttpFD does).
+
         This method filters the `Cookie` header from the info_dict to prevent leaks.
         Downloaders have their own way of handling cookies.
         See: https://github.com/yt-dlp/yt-dlp/security/advisories/GHSA-v8mc-9377-rwjj
         """
 
-        nooverwrites_and_exists = (
-            self.params.get('nooverwrites', False)
-            and os.path.exists(encodeFilename(filename))
-        )
-
         if not hasattr(filename, 'write'):
+            nooverwrites_and_exists = (
+                self.params.get('nooverwrites', False)
+                and os.path.exists(encodeFilename(filename))
+            )
+
             continuedl_and_exists = (
                 self.params.get('continuedl', True)
                 and os.path.isfile(encodeFilename(filename))
@@ -359,7 +383,8 @@ class FileDownloader(object):
             )
 
             # Check file already present
-            if filename != '-' and (nooverwrites_and_exists or continuedl_and_exists):
+            if (filename != '-' and not self.is_fifo(filename)
+                    and (nooverwrites_and_exists or continuedl_and_exists)):
                 self.report_file_already_downloaded(filename)
                 self._hook_progress({
                     'filename': filename,
@@ -391,13 +416,36 @@ class FileDownloader(object):
                     sleep_interval, sleep_note))
             time.sleep(sleep_interval)
 
-        return self.real_download(filename, info_dict)
+        success = False
+        try:
+            success = self.real_download(filename, info_dict)
+        finally:
+            if not success:
+                self._hook_progress({
+                    'filename': filename,
+                    'status': 'error',
+                })
+        return success
 
     def real_download(self, filename, info_dict):
         """Real download process. Redefine in subclasses."""
         raise NotImplementedError('This method must be implemented by subclasses')
 
     def _hook_progress(self, status):
+        if self._cancelled and status['status'] == 'downloading':
+            raise DownloadCancelled('download of %s cancelled' % status.get('filename'))
+        interval = self.params.get('progress_interval')
+        if interval is None:
+            interval = self._PROGRESS_INTERVAL
+        if interval:
+            if status['status'] == 'downloading':
+                # statuses received meanwhile are superseded by this one
+                now = time.time()
+                if self._progress_time is not None and now - self._progress_time < interval:
+                    return
+                self._progress_time = now
+            else:
+                self._progress_time = None
         for ph in self._progress_hooks:
             ph(status)
 
@@ -406,6 +454,16 @@ class FileDownloader(object):
         # this interface
         self._progress_hooks.append(ph)
 
+    def remove_progress_hook(self, ph):
+        self._progress_hooks.remove(ph)
+
+    def cancel(self):
+        """
+        Stop the download in progress, possibly from another thread: it
+        raises DownloadCancelled when it next reports its progress
+        """
+        self._cancelled = True
+
     def _debug_cmd(self, args, exe=None):
         if not self.params.get('verbose', False):
             return
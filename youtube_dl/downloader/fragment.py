@@ -1,12 +1,24 @@
 from __future__ import division, unicode_literals
 
+import collections
+import io
 import os
+import shutil
+import sys
+import tempfile
 import time
 import json
 
+try:
+    import threading
+except ImportError:
+    threading = None
+
 from .common import FileDownloader
 from .http import HttpFD
+from ..compat import compat_urllib_error
 from ..utils import (
+    DownloadError,
     error_to_compat_str,
     encodeFilename,
     sanitize_open,
@@ -14,6 +26,49 @@ from ..utils import (
 )
 
 
+class _FragmentBuffer(object):
+    """
+    Writable buffer holding a fragment as it is downloaded
+
+    The fragment is kept in memory up to _MAX_IN_MEMORY bytes and spilled to
+    an anonymous temporary file beyond that, so that large fragments (e.g.
+    byte ranges of a single file) are not held in memory.
+    """
+
+    _MAX_IN_MEMORY = 4 * 1024 * 1024
+
+    def __init__(self):
+        self._stream = io.BytesIO()
+
+    def write(self, data):
+        if (isinstance(self._stream, io.BytesIO)
+                and self._stream.tell() + len(data) > self._MAX_IN_MEMORY):
+            spilled = tempfile.TemporaryFile()
+            spilled.write(self._stream.getvalue())
+            self._stream = spilled
+        self._stream.write(data)
+
+    def seek(self, offset):
+        # only used to start over (with truncate())
+        assert offset == 0
+        self._stream.seek(0)
+
+    def truncate(self):
+        self._stream.truncate()
+
+    def stream(self):
+        """Return a file object reading the fragment, to be closed by the caller"""
+        self._stream.seek(0)
+        return self._stream
+
+    def getvalue(self):
+        stream = self.stream()
+        try:
+            return stream.read()
+        finally:
+            stream.close()
+
+
 class HttpQuietDownloader(HttpFD):
     def to_screen(self, *args, **kargs):
         pass
@@ -31,6 +86,10 @@ class FragmentFD(FileDownloader):
                         Skip unavailable fragments (DASH and hlsnative only)
     keep_fragments:     Keep downloaded fragments on disk after downloading is
                         finished
+    concurrent_fragment_downloads:
+                        Number of fragments to download in parallel (DASH and
+                        hlsnative only, default is 1). Fragments are still
+                        appended to the destination file in order
 
     For each incomplete fragment download youtube-dl keeps on disk a special
     bookkeeping file with download state and metadata (in future such files will
@@ -71,7 +130,7 @@ class FragmentFD(FileDownloader):
 
     @staticmethod
     def __do_ytdl_file(ctx):
-        return ctx['live'] is not True and ctx['tmpfilename'] != '-'
+        return ctx['live'] is not True and ctx['tmpfilename'] != '-' and not ctx.get('is_fifo')
 
     def _read_ytdl_file(self, ctx):
         assert 'ytdl_corrupt' not in ctx
@@ -95,7 +154,14 @@ class FragmentFD(FileDownloader):
         frag_index_stream.write(json.dumps({'downloader': downloader}))
         frag_index_stream.close()
 
-    def _download_fragment(self, ctx, frag_url, info_dict, headers=None):
+    def _download_fragment(self, ctx, frag_url, info_dict, headers=None, decrypter=None, as_stream=False):
+        """
+        Download a single fragment.
+
+        Returns a (success, frag_content) tuple, frag_content being the
+        content of the fragment or, if as_stream is True, a file object
+        reading it that _append_fragment() accepts as well.
+        """
         fragment_filename = '%s-Frag%d' % (ctx['tmpfilename'], ctx['fragment_index'])
         fragment_info_dict = {
             'url': frag_url,
@@ -108,27 +174,242 @@ class FragmentFD(FileDownloader):
         fragment_info_dict['frag_resume_len'] = frag_resume_len
         ctx['frag_resume_len'] = frag_resume_len or 0
 
-        success = ctx['dl'].download(fragment_filename, fragment_info_dict)
+        # Unless fragments are to be kept, download them into a buffer to
+        # save creating, reading back and removing a file for every fragment.
+        # Partial or complete fragments left on disk by a previous run are
+        # resumed from disk as before.
+        in_memory = not (
+            self.params.get('keep_fragments', False) or frag_resume_len
+            or os.path.isfile(encodeFilename(fragment_filename)))
+        if in_memory:
+            # A buffered fragment is decrypted as it is downloaded
+            frag_buffer = decrypter() if decrypter else _FragmentBuffer()
+            success = ctx['dl'].download(frag_buffer, fragment_info_dict)
+        else:
+            success = ctx['dl'].download(fragment_filename, fragment_info_dict)
         if not success:
             return False, None
         if fragment_info_dict.get('filetime'):
             ctx['fragment_filetime'] = fragment_info_dict.get('filetime')
-        down, frag_sanitized = sanitize_open(fragment_filename, 'rb')
-        ctx['fragment_filename_sanitized'] = frag_sanitized
-        frag_content = down.read()
-        down.close()
-        return True, frag_content
+        if not in_memory:
+            down, frag_sanitized = sanitize_open(fragment_filename, 'rb')
+            ctx['fragment_filename_sanitized'] = frag_sanitized
+            if not decrypter:
+                if as_stream:
+                    return True, down
+                try:
+                    return True, down.read()
+                finally:
+                    down.close()
+            frag_buffer = decrypter()
+            try:
+                shutil.copyfileobj(down, frag_buffer)
+            finally:
+                down.close()
+        return True, frag_buffer.stream() if as_stream else frag_buffer.getvalue()
 
     def _append_fragment(self, ctx, frag_content):
         try:
-            ctx['dest_stream'].write(frag_content)
+            if hasattr(frag_content, 'read'):
+                try:
+                    shutil.copyfileobj(frag_content, ctx['dest_stream'])
+                finally:
+                    frag_content.close()
+            else:
+                ctx['dest_stream'].write(frag_content)
             ctx['dest_stream'].flush()
         finally:
             if self.__do_ytdl_file(ctx):
                 self._write_ytdl_file(ctx)
-            if not self.params.get('keep_fragments', False):
-                os.remove(encodeFilename(ctx['fragment_filename_sanitized']))
-            del ctx['fragment_filename_sanitized']
+            frag_filename = ctx.pop('fragment_filename_sanitized', None)
+            if frag_filename and not self.params.get('keep_fragments', False):
+                os.remove(encodeFilename(frag_filename))
+
+    def _create_fragment_downloader(self):
+        return HttpQuietDownloader(
+            self.ydl,
+            {
+                'continuedl': self.params.get('continuedl', True),
+                'quiet': True,
+                'noprogress': True,
+                'ratelimit': self.params.get('ratelimit'),
+                'retries': self.params.get('retries', 0),
+                'nopart': self.params.get('nopart', False),
+                'test': self.params.get('test', False),
+                'progress_interval': self.params.get('progress_interval'),
+            }
+        )
+
+    def _fetch_fragment(self, ctx, fragment, info_dict):
+        """
+        Download a single fragment retrying on HTTP errors.
+
+        Returns a (success, frag_content) tuple like _download_fragment does
+        with as_stream, frag_content being None if the fragment is still unavailable after
+        fragment_retries attempts.
+        """
+        fragment_retries = self.params.get('fragment_retries', 0)
+        count = 0
+        while count <= fragment_retries:
+            try:
+                return self._download_fragment(
+                    ctx, fragment['url'], info_dict, fragment.get('headers'),
+                    fragment.get('decrypter'), as_stream=True)
+            except compat_urllib_error.HTTPError as err:
+                # Unavailable (possibly temporary) fragments may be served.
+                # First we try to retry then either skip or abort.
+                # See https://github.com/ytdl-org/youtube-dl/issues/10165,
+                # https://github.com/ytdl-org/youtube-dl/issues/10448).
+                count += 1
+                if count <= fragment_retries:
+                    self.report_retry_fragment(err, fragment['frag_index'], count, fragment_retries)
+            except DownloadError:
+                # Don't retry fragment if error occurred during HTTP downloading
+                # itself since it has its own retry settings
+                if self._is_fatal_fragment(fragment):
+                    raise
+                break
+        return True, None
+
+    def _is_fatal_fragment(self, fragment):
+        return fragment.get('fatal') or not self.params.get('skip_unavailable_fragments', True)
+
+    def _fetch_fragments_sequentially(self, ctx, fragments, info_dict):
+        for fragment in fragments:
+            ctx['fragment_index'] = fragment['frag_index'] - 1
+            yield fragment, ctx, self._fetch_fragment(ctx, fragment, info_dict)
+
+    def _fetch_fragments_concurrently(self, ctx, fragments, info_dict, max_workers):
+        """
+        Download up to max_workers fragments at a time in background threads,
+        yielding results in fragment order as they become available.
+        """
+        lock = threading.Lock()
+        state = ctx['frag_progress_state']
+        in_flight = {}
+        resume_len = ctx['complete_frags_downloaded_bytes']
+        total_frags = ctx['total_frags']
+
+        def frag_progress_hook(frag_index, s):
+            if s['status'] not in ('downloading', 'finished'):
+                return
+            with lock:
+                if s['status'] == 'finished':
+                    in_flight.pop(frag_index, None)
+                    state['fragment_index'] += 1
+                    ctx['complete_frags_downloaded_bytes'] += s.get('total_bytes') or 0
+                else:
+                    in_flight[frag_index] = s['downloaded_bytes']
+                time_now = time.time()
+                downloaded_bytes = ctx['complete_frags_downloaded_bytes'] + sum(in_flight.values())
+                state.update({
+                    'downloaded_bytes': downloaded_bytes,
+                    'elapsed': time_now - ctx['started'],
+                })
+                ctx['speed'] = state['speed'] = self.calc_speed(
+                    ctx['started'], time_now, downloaded_bytes - resume_len)
+                if not ctx['live']:
+                    estimated_size = (
+                        (ctx['complete_frags_downloaded_bytes'] + (s.get('total_bytes') or 0))
+                        / (state['fragment_index'] + 1) * total_frags)
+                    state['total_bytes_estimate'] = estimated_size
+                    state['eta'] = self.calc_eta(state['speed'], estimated_size - downloaded_bytes)
+                self._hook_progress(state)
+
+        def run(job):
+            try:
+                job['result'] = self._fetch_fragment(job['ctx'], job['fragment'], info_dict)
+            except Exception:
+                job['exc_info'] = sys.exc_info()
+
+        pending = collections.deque()
+
+        def start_next():
+            for fragment in remaining:
+                frag_index = fragment['frag_index']
+                frag_ctx = dict(ctx, dl=self._create_fragment_downloader(), fragment_index=frag_index - 1)
+                frag_ctx['dl'].add_progress_hook(
+                    lambda s, frag_index=frag_index: frag_progress_hook(frag_index, s))
+                job = {'fragment': fragment, 'ctx': frag_ctx}
+                job['thread'] = threading.Thread(target=run, args=(job, ))
+                job['thread'].daemon = True
+                job['thread'].start()
+                pending.append(job)
+                break
+
+        remaining = iter(fragments)
+        for _ in range(max_workers):
+            start_next()
+        try:
+            while pending:
+                job = pending.popleft()
+                job['thread'].join()
+                start_next()
+                if 'exc_info' in job:
+                    raise job['exc_info'][1]
+                yield job['fragment'], job['ctx'], job['result']
+        finally:
+            # Outstanding fragments are left on disk for resuming
+            for job in pending:
+                job['thread'].join()
+
+    def _download_and_append_fragments(self, ctx, fragments, info_dict, decrypt_fragment=None):
+        """
+        Download fragments and append them to the destination file in order.
+
+        fragments is an iterable of dicts, consumed as the download goes
+        (e.g. a generator yielding the fragments of a live stream as they
+        appear), with the following fields:
+            frag_index: 1-based index of the fragment
+            url:        URL of the fragment
+            headers:    (optional) HTTP headers to send with the request
+            fatal:      (optional) abort the download if this fragment is
+                        unavailable even with skip_unavailable_fragments
+            decrypter:  (optional) callable returning a new _FragmentBuffer
+                        that decrypts the data written to it: the fragment
+                        is written to it as it is downloaded and what its
+                        stream() method returns is appended
+        Fragments already recorded as written in the .ytdl file are skipped.
+
+        If decrypt_fragment is given it is called as
+        decrypt_fragment(fragment, frag_content) in fragment order and its
+        return value is appended instead of the downloaded content.
+
+        Returns True on success and False otherwise.
+        """
+        fragments = (f for f in fragments if f['frag_index'] > ctx['fragment_index'])
+        max_workers = self.params.get('concurrent_fragment_downloads') or 1
+        if max_workers > 1 and threading:
+            results = self._fetch_fragments_concurrently(ctx, fragments, info_dict, max_workers)
+        else:
+            results = self._fetch_fragments_sequentially(ctx, fragments, info_dict)
+        try:
+            for fragment, frag_ctx, (success, frag_content) in results:
+                frag_index = fragment['frag_index']
+                if not success:
+                    return False
+                if frag_content is None:
+                    if self._is_fatal_fragment(fragment):
+                        self.report_error(
+                            'giving up after %s fragment retries' % self.params.get('fragment_retries', 0))
+                        return False
+                    self.report_skip_fragment(frag_index)
+                    continue
+                if frag_ctx is not ctx:
+                    if frag_ctx.get('fragment_filename_sanitized'):
+                        ctx['fragment_filename_sanitized'] = frag_ctx['fragment_filename_sanitized']
+                    if frag_ctx.get('fragment_filetime'):
+                        ctx['fragment_filetime'] = frag_ctx['fragment_filetime']
+                if decrypt_fragment:
+                    try:
+                        frag_content = decrypt_fragment(fragment, frag_content.read())
+                    finally:
+                        frag_content.close()
+                ctx['fragment_index'] = frag_index
+                self._append_fragment(ctx, frag_content)
+        finally:
+            results.close()
+        return True
 
     def _prepare_frag_download(self, ctx):
         if not ctx.setdefault('live', False):
@@ -142,18 +423,7 @@ class FragmentFD(FileDownloader):
             '[%s] Total fragments: %s' % (self.FD_NAME, total_frags_str))
         self.report_destination(ctx['filename'])
         continuedl = self.params.get('continuedl', True)
-        dl = HttpQuietDownloader(
-            self.ydl,
-            {
-                'continuedl': continuedl,
-                'quiet': True,
-                'noprogress': True,
-                'ratelimit': self.params.get('ratelimit'),
-                'retries': self.params.get('retries', 0),
-                'nopart': self.params.get('nopart', False),
-                'test': self.params.get('test', False),
-            }
-        )
+        dl = self._create_fragment_downloader()
         tmpfilename = self.temp_name(ctx['filename'])
         open_mode = 'wb'
 
@@ -165,6 +435,7 @@ class FragmentFD(FileDownloader):
         # Should be initialized before ytdl file check
         ctx.update({
             'tmpfilename': tmpfilename,
+            'is_fifo': self.is_fifo(tmpfilename),
             'fragment_index': 0,
         })
 
@@ -224,6 +495,7 @@ class FragmentFD(FileDownloader):
             # Amount of fragment's bytes downloaded by the time of the previous
             # frag progress hook invocation
             'prev_frag_downloaded_bytes': 0,
+            'frag_progress_state': state,
         })
 
         def frag_progress_hook(s):
@@ -273,7 +545,7 @@ class FragmentFD(FileDownloader):
                 os.remove(ytdl_filename)
         elapsed = time.time() - ctx['started']
 
-        if ctx['tmpfilename'] == '-':
+        if ctx['tmpfilename'] == '-' or ctx['is_fifo']:
             downloaded_bytes = ctx['complete_frags_downloaded_bytes']
         else:
             self.try_rename(ctx['tmpfilename'], ctx['filename'])
@@ -1,32 +1,97 @@
 from __future__ import unicode_literals
 
+import functools
 import re
 import binascii
+import socket
+import time
 try:
     from Crypto.Cipher import AES
-    can_decrypt_frag = True
 except ImportError:
-    can_decrypt_frag = False
+    # decrypt with the slower pure Python implementation
+    AES = None
 
-from .fragment import FragmentFD
-from .external import FFmpegFD
+from .fragment import (
+    FragmentFD,
+    _FragmentBuffer,
+)
+from .external import FFmpegFD, FFmpegPostProcessor
 
+from ..aes import AESCBCDecrypter
 from ..compat import (
+    compat_http_client,
+    compat_ord,
     compat_urllib_error,
     compat_urlparse,
     compat_struct_pack,
 )
 from ..utils import (
+    error_to_compat_str,
+    float_or_none,
+    LRUCache,
     parse_m3u8_attributes,
     update_url_query,
 )
 
 
+class _AES128DecryptingBuffer(_FragmentBuffer):
+    """
+    Fragment buffer decrypting the AES-128 encrypted data written to it
+
+    Complete blocks are decrypted as they are written, the IV being carried
+    across writes. The last block is kept until stream() since it holds
+    the PKCS#7 padding.
+    """
+
+    def __init__(self, key, iv):
+        super(_AES128DecryptingBuffer, self).__init__()
+        self._key = key
+        self._iv = iv
+        self._reset_cipher()
+
+    def _reset_cipher(self):
+        self._cipher = (
+            AES.new(self._key, AES.MODE_CBC, self._iv) if AES
+            else AESCBCDecrypter(self._key, self._iv))
+        self._pending = b''
+
+    def _decrypt(self, data):
+        return self._cipher.decrypt(data) if data else b''
+
+    def write(self, data):
+        data = self._pending + data
+        # keep at least one block
+        decrypt_len = max(len(data) - 1, 0) // 16 * 16
+        super(_AES128DecryptingBuffer, self).write(self._decrypt(data[:decrypt_len]))
+        self._pending = data[decrypt_len:]
+
+    def truncate(self):
+        super(_AES128DecryptingBuffer, self).truncate()
+        self._reset_cipher()
+
+    def stream(self):
+        last_block, self._pending = self._pending, b''
+        if len(last_block) % 16:
+            # truncated cipher: decrypt what can be, without unpadding
+            last_block = self._decrypt(last_block[:len(last_block) // 16 * 16])
+        else:
+            last_block = self._decrypt(last_block)
+            padding = compat_ord(last_block[-1]) if last_block else 0
+            if 0 < padding <= 16 and last_block.endswith(last_block[-1:] * padding):
+                last_block = last_block[:-padding]
+        super(_AES128DecryptingBuffer, self).write(last_block)
+        return super(_AES128DecryptingBuffer, self).stream()
+
+
 class HlsFD(FragmentFD):
     """ A limited implementation that does not require ffmpeg """
 
     FD_NAME = 'hlsnative'
 
+    # Number of decryption keys kept by URL during a download, since live
+    # streams may rotate them
+    _MAX_DECRYPTION_KEYS = 16
+
     @staticmethod
     def can_download(manifest, info_dict):
         UNSUPPORTED_FEATURES = (
@@ -52,140 +117,163 @@ class HlsFD(FragmentFD):
         )
         check_results = [not re.search(feature, manifest) for feature in UNSUPPORTED_FEATURES]
         is_aes128_enc = '#EXT-X-KEY:METHOD=AES-128' in manifest
-        check_results.append(can_decrypt_frag or not is_aes128_enc)
         check_results.append(not (is_aes128_enc and r'#EXT-X-BYTERANGE' in manifest))
-        check_results.append(not info_dict.get('is_live'))
         return all(check_results)
 
+    # A live playlist is reloaded at most this many times in a row without
+    # new fragments before the stream is considered over
+    _LIVE_MAX_STALLED_RELOADS = 10
+
+    def _download_manifest(self, info_dict, man_url):
+        urlh = self.ydl.urlopen(self._prepare_url(info_dict, man_url))
+        return urlh.geturl(), urlh.read().decode('utf-8', 'ignore')
+
     def real_download(self, filename, info_dict):
         man_url = info_dict['url']
         self.to_screen('[%s] Downloading m3u8 manifest' % self.FD_NAME)
 
-        urlh = self.ydl.urlopen(self._prepare_url(info_dict, man_url))
-        man_url = urlh.geturl()
-        s = urlh.read().decode('utf-8', 'ignore')
+        man_url, s = self._download_manifest(info_dict, man_url)
 
         if not self.can_download(s, info_dict):
             if info_dict.get('extra_param_to_segment_url') or info_dict.get('_decryption_key_url'):
-                self.report_error('pycrypto not found. Please install it.')
+                self.report_error('hlsnative does not support this stream and it can not be delegated to ffmpeg')
                 return False
             self.report_warning(
                 'hlsnative has detected features it does not support, '
                 'extraction will be delegated to ffmpeg')
-            fd = FFmpegFD(self.ydl, self.params)
-            for ph in self._progress_hooks:
-                fd.add_progress_hook(ph)
-            return fd.real_download(filename, info_dict)
+            return self._delegate_to_ffmpeg(filename, info_dict)
+
+        if self._should_delegate_decryption(s, info_dict):
+            self.to_screen(
+                '[%s] pycryptodome is not installed, decryption will be delegated to ffmpeg' % self.FD_NAME)
+            return self._delegate_to_ffmpeg(filename, info_dict)
+
+        test = self.params.get('test', False)
+        live = bool(info_dict.get('is_live')) and not self._is_ended(s) and not test
+
+        fragments = self._parse_fragments(s, man_url, info_dict)
+        ctx = {
+            'filename': filename,
+            'total_frags': len(fragments),
+            'ad_frags': self._count_ad_fragments(s),
+            'live': live,
+            'decryption_keys': LRUCache(self._MAX_DECRYPTION_KEYS),
+        }
+
+        self._prepare_and_start_frag_download(ctx)
+
+        if live:
+            fragments = self._live_fragments(ctx, man_url, s, info_dict)
+        else:
+            if test:
+                # We only download the first fragment during the test
+                fragments = fragments[:1]
+            for fragment in fragments:
+                decrypt_info = fragment.pop('decrypt_info')
+                if fragment['frag_index'] > ctx['fragment_index']:
+                    self._add_decrypter(ctx, fragment, decrypt_info, info_dict)
+
+        try:
+            if not self._download_and_append_fragments(ctx, fragments, info_dict):
+                return False
+        except KeyboardInterrupt:
+            if live:
+                # Keep what has been recorded so far
+                self._finish_frag_download(ctx)
+            raise
+
+        self._finish_frag_download(ctx)
+
+        return True
+
+    def _delegate_to_ffmpeg(self, filename, info_dict):
+        fd = FFmpegFD(self.ydl, self.params)
+        for ph in self._progress_hooks:
+            fd.add_progress_hook(ph)
+        return fd.real_download(filename, info_dict)
+
+    def _should_delegate_decryption(self, manifest, info_dict):
+        # AES-128 is only decrypted with the much slower pure Python
+        # implementation if neither pycryptodome nor ffmpeg can be used
+        if AES or '#EXT-X-KEY:METHOD=AES-128' not in manifest:
+            return False
+        if info_dict.get('extra_param_to_segment_url') or info_dict.get('_decryption_key_url'):
+            return False
+        return FFmpegFD.available() and FFmpegPostProcessor(downloader=self.ydl).available
+
+    @staticmethod
+    def _is_ad_fragment_start(s):
+        return (s.startswith('#ANVATO-SEGMENT-INFO') and 'type=ad' in s
+                or s.startswith('#UPLYNK-SEGMENT') and s.endswith(',ad'))
 
-        def is_ad_fragment_start(s):
-            return (s.startswith('#ANVATO-SEGMENT-INFO') and 'type=ad' in s
-                    or s.startswith('#UPLYNK-SEGMENT') and s.endswith(',ad'))
+    @staticmethod
+    def _is_ad_fragment_end(s):
+        return (s.startswith('#ANVATO-SEGMENT-INFO') and 'type=master' in s
+                or s.startswith('#UPLYNK-SEGMENT') and s.endswith(',segment'))
 
-        def is_ad_fragment_end(s):
-            return (s.startswith('#ANVATO-SEGMENT-INFO') and 'type=master' in s
-                    or s.startswith('#UPLYNK-SEGMENT') and s.endswith(',segment'))
+    @staticmethod
+    def _is_ended(manifest):
+        return '#EXT-X-ENDLIST' in manifest
 
-        media_frags = 0
+    def _count_ad_fragments(self, manifest):
         ad_frags = 0
         ad_frag_next = False
-        for line in s.splitlines():
+        for line in manifest.splitlines():
             line = line.strip()
             if not line:
                 continue
             if line.startswith('#'):
-                if is_ad_fragment_start(line):
+                if self._is_ad_fragment_start(line):
                     ad_frag_next = True
-                elif is_ad_fragment_end(line):
+                elif self._is_ad_fragment_end(line):
                     ad_frag_next = False
                 continue
             if ad_frag_next:
                 ad_frags += 1
-                continue
-            media_frags += 1
-
-        ctx = {
-            'filename': filename,
-            'total_frags': media_frags,
-            'ad_frags': ad_frags,
-        }
-
-        self._prepare_and_start_frag_download(ctx)
-
-        fragment_retries = self.params.get('fragment_retries', 0)
-        skip_unavailable_fragments = self.params.get('skip_unavailable_fragments', True)
-        test = self.params.get('test', False)
+        return ad_frags
 
+    def _parse_fragments(self, manifest, man_url, info_dict):
+        """
+        Return the media fragments of a media playlist, with their
+        media_sequence and the decrypt_info of the #EXT-X-KEY they use
+        """
         extra_query = None
         extra_param_to_segment_url = info_dict.get('extra_param_to_segment_url')
         if extra_param_to_segment_url:
             extra_query = compat_urlparse.parse_qs(extra_param_to_segment_url)
-        i = 0
         media_sequence = 0
         decrypt_info = {'METHOD': 'NONE'}
         byte_range = {}
         frag_index = 0
         ad_frag_next = False
-        for line in s.splitlines():
+        fragments = []
+        for line in manifest.splitlines():
             line = line.strip()
             if line:
                 if not line.startswith('#'):
                     if ad_frag_next:
+                        # ad fragments still have a media sequence number
+                        media_sequence += 1
                         continue
                     frag_index += 1
-                    if frag_index <= ctx['fragment_index']:
-                        continue
                     frag_url = (
                         line
                         if re.match(r'^https?://', line)
                         else compat_urlparse.urljoin(man_url, line))
                     if extra_query:
                         frag_url = update_url_query(frag_url, extra_query)
-                    count = 0
-                    headers = info_dict.get('http_headers', {})
+                    headers = info_dict.get('http_headers', {}).copy()
                     if byte_range:
                         headers['Range'] = 'bytes=%d-%d' % (byte_range['start'], byte_range['end'] - 1)
-                    while count <= fragment_retries:
-                        try:
-                            success, frag_content = self._download_fragment(
-                                ctx, frag_url, info_dict, headers)
-                            if not success:
-                                return False
-                            break
-                        except compat_urllib_error.HTTPError as err:
-                            # Unavailable (possibly temporary) fragments may be served.
-                            # First we try to retry then either skip or abort.
-                            # See https://github.com/ytdl-org/youtube-dl/issues/10165,
-                            # https://github.com/ytdl-org/youtube-dl/issues/10448).
-                            count += 1
-                            if count <= fragment_retries:
-                                self.report_retry_fragment(err, frag_index, count, fragment_retries)
-                    if count > fragment_retries:
-                        if skip_unavailable_fragments:
-                            i += 1
-                            media_sequence += 1
-                            self.report_skip_fragment(frag_index)
-                            continue
-                        self.report_error(
-                            'giving up after %s fragment retries' % fragment_retries)
-                        return False
-                    if decrypt_info['METHOD'] == 'AES-128':
-                        iv = decrypt_info.get('IV') or compat_struct_pack('>8xq', media_sequence)
-                        decrypt_info['KEY'] = decrypt_info.get('KEY') or self.ydl.urlopen(
-                            self._prepare_url(info_dict, info_dict.get('_decryption_key_url') or decrypt_info['URI'])).read()
-                        # Don't decrypt the content in tests since the data is explicitly truncated and it's not to a valid block
-                        # size (see https://github.com/ytdl-org/youtube-dl/pull/27660). Tests only care that the correct data downloaded,
-                        # not what it decrypts to.
-                        if not test:
-                            frag_content = AES.new(
-                                decrypt_info['KEY'], AES.MODE_CBC, iv).decrypt(frag_content)
-                    self._append_fragment(ctx, frag_content)
-                    # We only download the first fragment during the test
-                    if test:
-                        break
-                    i += 1
+                    fragments.append({
+                        'frag_index': frag_index,
+                        'url': frag_url,
+                        'headers': headers,
+                        'decrypt_info': decrypt_info,
+                        'media_sequence': media_sequence,
+                    })
                     media_sequence += 1
                 elif line.startswith('#EXT-X-KEY'):
-                    decrypt_url = decrypt_info.get('URI')
                     decrypt_info = parse_m3u8_attributes(line[11:])
                     if decrypt_info['METHOD'] == 'AES-128':
                         if 'IV' in decrypt_info:
@@ -195,8 +283,6 @@ class HlsFD(FragmentFD):
                                 man_url, decrypt_info['URI'])
                         if extra_query:
                             decrypt_info['URI'] = update_url_query(decrypt_info['URI'], extra_query)
-                        if decrypt_url != decrypt_info['URI']:
-                            decrypt_info['KEY'] = None
                 elif line.startswith('#EXT-X-MEDIA-SEQUENCE'):
                     media_sequence = int(line[22:])
                 elif line.startswith('#EXT-X-BYTERANGE'):
@@ -206,11 +292,83 @@ class HlsFD(FragmentFD):
                         'start': sub_range_start,
                         'end': sub_range_start + int(splitted_byte_range[0]),
                     }
-                elif is_ad_fragment_start(line):
+                elif self._is_ad_fragment_start(line):
                     ad_frag_next = True
-                elif is_ad_fragment_end(line):
+                elif self._is_ad_fragment_end(line):
                     ad_frag_next = False
+        return fragments
 
-        self._finish_frag_download(ctx)
+    def _add_decrypter(self, ctx, fragment, decrypt_info, info_dict):
+        if decrypt_info['METHOD'] != 'AES-128':
+            return
+        key = self._get_decryption_key(ctx, info_dict.get('_decryption_key_url') or decrypt_info['URI'], info_dict)
+        # Don't decrypt the content in tests since the data is explicitly truncated and it's not to a valid block
+        # size (see https://github.com/ytdl-org/youtube-dl/pull/27660). Tests only care that the correct data downloaded,
+        # not what it decrypts to.
+        if not self.params.get('test', False):
+            iv = decrypt_info.get('IV') or compat_struct_pack('>8xq', fragment['media_sequence'])
+            fragment['decrypter'] = functools.partial(_AES128DecryptingBuffer, key, iv)
 
-        return True
+    def _live_fragments(self, ctx, man_url, manifest, info_dict):
+        """
+        Yield the fragments of the live media playlist manifest as they
+        appear, reloading it every target duration until it ends
+
+        Fragments are identified by their media sequence number, so that
+        only the new ones of each reload are yielded; only the last
+        playlist is kept.
+        """
+        first_sequence = last_sequence = None
+        stalled_reloads = 0
+        while True:
+            reloaded = time.time()
+            if last_sequence is not None:
+                missed = self._search_media_sequence(manifest) - last_sequence - 1
+                if missed > 0:
+                    self.report_warning(
+                        'missed %d fragments of the live stream, which were removed from '
+                        'the playlist before it was reloaded' % missed)
+            new_fragments = 0
+            for fragment in self._parse_fragments(manifest, man_url, info_dict):
+                media_sequence = fragment['media_sequence']
+                if last_sequence is not None and media_sequence <= last_sequence:
+                    continue
+                if first_sequence is None:
+                    first_sequence = media_sequence
+                last_sequence = media_sequence
+                new_fragments += 1
+                fragment['frag_index'] = media_sequence - first_sequence + 1
+                self._add_decrypter(ctx, fragment, fragment.pop('decrypt_info'), info_dict)
+                yield fragment
+            if self._is_ended(manifest):
+                return
+            stalled_reloads = 0 if new_fragments else stalled_reloads + 1
+            if stalled_reloads > self._LIVE_MAX_STALLED_RELOADS:
+                self.report_warning('the live playlist has not been updated, assuming the stream is over')
+                return
+            target_duration = float_or_none(self._search_target_duration(manifest)) or 10
+            # the reload interval is halved while the playlist is unchanged
+            # (see RFC 8216, section 6.3.4)
+            time.sleep(max(0, reloaded + (target_duration if new_fragments else target_duration / 2) - time.time()))
+            try:
+                man_url, manifest = self._download_manifest(info_dict, man_url)
+            except (compat_urllib_error.URLError, compat_http_client.HTTPException, socket.error) as err:
+                # the previous playlist is kept, as if it had not been updated
+                self.report_warning('unable to reload the live playlist: %s' % error_to_compat_str(err))
+
+    @staticmethod
+    def _search_media_sequence(manifest):
+        mobj = re.search(r'#EXT-X-MEDIA-SEQUENCE:\s*(\d+)', manifest)
+        return int(mobj.group(1)) if mobj else 0
+
+    @staticmethod
+    def _search_target_duration(manifest):
+        mobj = re.search(r'#EXT-X-TARGETDURATION:\s*(\d+(?:\.\d+)?)', manifest)
+        return mobj and mobj.group(1)
+
+    def _get_decryption_key(self, ctx, key_url, info_dict):
+        key = ctx['decryption_keys'].get(key_url)
+        if key is None:
+            key = self.ydl.urlopen(self._prepare_url(info_dict, key_url)).read()
+            ctx['decryption_keys'].set(key_url, key)
+        return key
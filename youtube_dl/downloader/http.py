@@ -1,23 +1,34 @@
 from __future__ import unicode_literals
 
 import errno
+import json
 import os
 import socket
 import time
 import random
 import re
 
+try:
+    import threading
+except ImportError:
+    threading = None
+
 from .common import FileDownloader
 from ..compat import (
+    compat_http_client,
+    compat_open as open,
     compat_str,
     compat_urllib_error,
 )
 from ..utils import (
     ContentTooShortError,
     encodeFilename,
+    error_to_compat_str,
     int_or_none,
     sanitize_open,
     sanitized_Request,
+    timeconvert,
+    write_json_file,
     write_xattr,
     XAttrMetadataError,
     XAttrUnavailableError,
@@ -25,6 +36,11 @@ from ..utils import (
 
 
 class HttpFD(FileDownloader):
+    # Files smaller than this many bytes per connection use a single one
+    _MIN_RANGE_SIZE = 1024 * 1024
+    # The progress of ranges is recorded in the .ytdl file at most this often
+    _RANGES_STATE_INTERVAL = 1
+
     def real_download(self, filename, info_dict):
         url = info_dict['url']
 
@@ -35,7 +51,12 @@ class HttpFD(FileDownloader):
 
         ctx = DownloadContext()
         ctx.filename = filename
-        ctx.tmpfilename = self.temp_name(filename)
+        # filename may also be a writable file-like object (e.g. an in-memory
+        # buffer for a fragment), data is written to it directly then
+        ctx.dest_stream = filename if hasattr(filename, 'write') else None
+        ctx.tmpfilename = filename if ctx.dest_stream else self.temp_name(filename)
+        # a named pipe is opened once and can't be rewritten
+        ctx.is_fifo = ctx.dest_stream is None and self.is_fifo(ctx.tmpfilename)
         ctx.stream = None
 
         # Do not include the Accept-Encoding header
@@ -52,7 +73,7 @@ class HttpFD(FileDownloader):
         ctx.open_mode = 'wb'
         ctx.resume_len = 0
         ctx.data_len = None
-        ctx.block_size = self.params.get('buffersize', 1024)
+        ctx.block_size = self.params.get('buffersize', 16 * 1024)
         ctx.start_time = time.time()
         ctx.chunk_size = None
 
@@ -60,10 +81,18 @@ class HttpFD(FileDownloader):
             # Establish possible resume length
             ctx.resume_len = info_dict.get('frag_resume_len')
             if ctx.resume_len is None:
-                ctx.resume_len = self.filesize_or_none(ctx.tmpfilename) or 0
+                ctx.resume_len = 0 if ctx.dest_stream or ctx.is_fifo else (
+                    self.filesize_or_none(ctx.tmpfilename) or 0)
 
         ctx.is_resume = ctx.resume_len > 0
 
+        connections = self.params.get('http_connections') or 1
+        if (connections > 1 and threading and not is_test
+                and ctx.dest_stream is None and ctx.tmpfilename != '-' and not ctx.is_fifo):
+            result = self._download_ranges(ctx, url, headers, info_dict, connections)
+            if result is not None:
+                return result
+
         count = 0
         retries = self.params.get('retries', 0)
 
@@ -77,6 +106,16 @@ class HttpFD(FileDownloader):
         class NextFragment(Exception):
             pass
 
+        class UnableToResume(Exception):
+            pass
+
+        def restart_download():
+            # data written to a named pipe can't be taken back
+            if ctx.is_fifo and ctx.resume_len > 0:
+                raise UnableToResume()
+            ctx.resume_len = 0
+            ctx.open_mode = 'wb'
+
         def set_range(req, start, end):
             range_header = 'bytes=%d-' % start
             if end:
@@ -143,8 +182,7 @@ class HttpFD(FileDownloader):
                     # and performing entire redownload
                     if range_start > 0:
                         self.report_unable_to_resume()
-                    ctx.resume_len = 0
-                    ctx.open_mode = 'wb'
+                    restart_download()
                 ctx.data_len = int_or_none(ctx.data.info().get('Content-length', None))
                 return
             except (compat_urllib_error.HTTPError, ) as err:
@@ -181,8 +219,7 @@ class HttpFD(FileDownloader):
                         else:
                             # The length does not match, we start the download over
                             self.report_unable_to_resume()
-                            ctx.resume_len = 0
-                            ctx.open_mode = 'wb'
+                            restart_download()
                             return
                 elif err.code < 500 or err.code >= 600:
                     # Unexpected HTTP error
@@ -220,23 +257,35 @@ class HttpFD(FileDownloader):
             block_size = ctx.block_size
             start = time.time()
 
+            # Data is received into a reused buffer rather than into a new
+            # bytes object for each block, where possible (not on Python 2)
+            readinto = getattr(ctx.data, 'readinto', None)
+            buf = None
+
             # measure time over whole while-loop, so slow_down() and best_block_size() work together properly
             now = None  # needed for slow_down() in the first loop run
             before = start  # start measuring
 
             def retry(e):
-                to_stdout = ctx.tmpfilename == '-'
-                if ctx.stream is not None:
-                    if not to_stdout:
+                to_stream = ctx.tmpfilename == '-' or ctx.dest_stream is not None or ctx.is_fifo
+                # the reader of a named pipe would take a reopening for its end
+                if ctx.stream is not None and not ctx.is_fifo:
+                    if not to_stream:
                         ctx.stream.close()
                     ctx.stream = None
-                ctx.resume_len = byte_counter if to_stdout else os.path.getsize(encodeFilename(ctx.tmpfilename))
+                ctx.resume_len = byte_counter if to_stream else os.path.getsize(encodeFilename(ctx.tmpfilename))
                 raise RetryDownload(e)
 
             while True:
                 try:
                     # Download and write
-                    data_block = ctx.data.read(block_size if data_len is None else min(block_size, data_len - byte_counter))
+                    read_size = block_size if data_len is None else min(block_size, data_len - byte_counter)
+                    if readinto:
+                        if buf is None or len(buf) < read_size:
+                            buf = memoryview(bytearray(max(read_size, block_size)))
+                        data_block = buf[:readinto(buf[:read_size]) or 0]
+                    else:
+                        data_block = ctx.data.read(read_size)
                 # socket.timeout is a subclass of socket.error but may not have
                 # errno set
                 except socket.timeout as e:
@@ -255,7 +304,13 @@ class HttpFD(FileDownloader):
                     break
 
                 # Open destination file just in time
-                if ctx.stream is None:
+                if ctx.stream is None and ctx.dest_stream is not None:
+                    ctx.stream = ctx.dest_stream
+                    if ctx.open_mode == 'wb':
+                        # Server ignored the requested range, start over
+                        ctx.stream.seek(0)
+                        ctx.stream.truncate()
+                elif ctx.stream is None:
                     try:
                         ctx.stream, ctx.tmpfilename = sanitize_open(
                             ctx.tmpfilename, ctx.open_mode)
@@ -273,7 +328,8 @@ class HttpFD(FileDownloader):
                             self.report_error('unable to set filesize xattr: %s' % str(err))
 
                 try:
-                    ctx.stream.write(data_block)
+                    # buffers written to may keep what they get
+                    ctx.stream.write(data_block if ctx.dest_stream is None or not readinto else data_block.tobytes())
                 except (IOError, OSError) as err:
                     self.to_stderr('\n')
                     self.report_error('unable to write data: %s' % str(err))
@@ -319,7 +375,7 @@ class HttpFD(FileDownloader):
                 self.to_stderr('\n')
                 self.report_error('Did not get any data blocks')
                 return False
-            if ctx.tmpfilename != '-':
+            if ctx.tmpfilename != '-' and ctx.dest_stream is None:
                 ctx.stream.close()
 
             if data_len is not None and byte_counter != data_len:
@@ -332,7 +388,10 @@ class HttpFD(FileDownloader):
 
             # Update file modification time
             if self.params.get('updatetime', True):
-                info_dict['filetime'] = self.try_utime(ctx.filename, ctx.data.info().get('last-modified', None))
+                last_modified = ctx.data.info().get('last-modified', None)
+                info_dict['filetime'] = (
+                    last_modified and timeconvert(last_modified) if ctx.dest_stream is not None
+                    else self.try_utime(ctx.filename, last_modified))
 
             self._hook_progress({
                 'downloaded_bytes': byte_counter,
@@ -357,6 +416,232 @@ class HttpFD(FileDownloader):
                 continue
             except SucceedDownload:
                 return True
+            except UnableToResume:
+                # so that the reader of the pipe gets to its end
+                ctx.stream.close()
+                self.report_error('the server did not resume the download, which was written to a named pipe')
+                return False
 
         self.report_error('giving up after %s retries' % retries)
         return False
+
+    def _probe_ranges(self, url, headers):
+        """ Return (size, last-modified) if the server supports ranges of url """
+        request = sanitized_Request(url, None, headers)
+        request.add_header('Range', 'bytes=0-0')
+        try:
+            data = self.ydl.urlopen(request)
+        except (compat_urllib_error.URLError, compat_http_client.HTTPException, socket.error):
+            # reported by the single connection download
+            return None, None
+        try:
+            mobj = re.match(r'bytes 0-0/(\d+)', data.headers.get('Content-Range') or '')
+            return int(mobj.group(1)) if mobj else None, data.info().get('last-modified')
+        finally:
+            data.close()
+
+    def _read_ranges_state(self, ytdl_filename):
+        try:
+            with open(encodeFilename(ytdl_filename), encoding='utf-8') as f:
+                state = json.load(f)['downloader']
+            return state['size'], [
+                {'start': start, 'end': end, 'downloaded': downloaded}
+                for start, end, downloaded in state['ranges']]
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            return None, None
+
+    def _write_ranges_state(self, ytdl_filename, data_len, ranges):
+        # only the data flushed to the file is recorded
+        write_json_file({'downloader': {
+            'size': data_len,
+            'ranges': [[rng['start'], rng['end'], rng['committed']] for rng in ranges],
+        }}, ytdl_filename)
+
+    def _download_range(self, stream, rng, url, headers, progress):
+        """
+        Download the missing part of a range into stream, retrying on
+        network errors; progress['stop'] interrupts it
+        """
+        count = 0
+        retries = self.params.get('retries', 0)
+        block_size = progress['block_size']
+        buf = None
+        while rng['downloaded'] < rng['end'] - rng['start'] + 1 and not progress['stop'].is_set():
+            range_start = rng['start'] + rng['downloaded']
+            request = sanitized_Request(url, None, headers)
+            request.add_header('Range', 'bytes=%d-%d' % (range_start, rng['end']))
+            try:
+                data = self.ydl.urlopen(request)
+                try:
+                    content_range = data.headers.get('Content-Range') or ''
+                    if not content_range.startswith('bytes %d-' % range_start):
+                        raise ContentTooShortError(0, rng['end'] - range_start + 1)
+                    stream.seek(range_start)
+                    readinto = getattr(data, 'readinto', None)
+                    before = time.time()
+                    while not progress['stop'].is_set():
+                        remaining = rng['end'] - rng['start'] + 1 - rng['downloaded']
+                        if remaining <= 0:
+                            break
+                        read_size = min(block_size, remaining)
+                        if readinto:
+                            if buf is None or len(buf) < read_size:
+                                buf = memoryview(bytearray(max(read_size, block_size)))
+                            data_block = buf[:readinto(buf[:read_size]) or 0]
+                        else:
+                            data_block = data.read(read_size)
+                        if not data_block:
+                            raise ContentTooShortError(rng['downloaded'], rng['end'] - rng['start'] + 1)
+                        stream.write(data_block)
+                        rng['downloaded'] += len(data_block)
+                        if rng['downloaded'] - rng['committed'] >= 1024 * 1024:
+                            stream.flush()
+                            rng['committed'] = rng['downloaded']
+                        now = time.time()
+                        self.slow_down(progress['start'], now, sum(
+                            r['downloaded'] for r in progress['ranges']) - progress['resume_len'])
+                        if not self.params.get('noresizebuffer', False):
+                            block_size = self.best_block_size(now - before, len(data_block))
+                        before = now
+                finally:
+                    data.close()
+            except compat_urllib_error.HTTPError as err:
+                if err.code < 500 or err.code >= 600:
+                    raise
+                error = err
+            except (ContentTooShortError, compat_urllib_error.URLError,
+                    compat_http_client.HTTPException, socket.error) as err:
+                error = err
+            else:
+                continue
+            finally:
+                stream.flush()
+                rng['committed'] = rng['downloaded']
+            count += 1
+            if count > retries:
+                raise error
+            self.report_retry(error, count, retries)
+
+    def _download_ranges(self, ctx, url, headers, info_dict, connections):
+        """
+        Download url over several connections, each one fetching a range of
+        the file into its place in the preallocated .part file
+
+        The progress of each range is recorded in the .ytdl file, so that an
+        interrupted download resumes every range where it stopped. Return
+        None if the server doesn't support ranges or the file is too small
+        to be split.
+        """
+        ytdl_filename = self.ytdl_filename(ctx.filename)
+        data_len, ranges = None, None
+        if self.params.get('continuedl', True) and os.path.isfile(encodeFilename(ytdl_filename)):
+            data_len, ranges = self._read_ranges_state(ytdl_filename)
+        elif ctx.resume_len:
+            # partially downloaded over a single connection
+            return None
+
+        size, last_modified = self._probe_ranges(url, headers)
+        if size is None or size < connections * self._MIN_RANGE_SIZE:
+            return None
+        min_data_len = self.params.get('min_filesize')
+        max_data_len = self.params.get('max_filesize')
+        if min_data_len is not None and size < min_data_len:
+            self.to_screen('\r[download] File is smaller than min-filesize (%s bytes < %s bytes). Aborting.' % (size, min_data_len))
+            return False
+        if max_data_len is not None and size > max_data_len:
+            self.to_screen('\r[download] File is larger than max-filesize (%s bytes > %s bytes). Aborting.' % (size, max_data_len))
+            return False
+
+        try:
+            if ranges and data_len == size and self.filesize_or_none(ctx.tmpfilename) == size:
+                self.report_resuming_byte(sum(rng['downloaded'] for rng in ranges))
+                stream, ctx.tmpfilename = sanitize_open(ctx.tmpfilename, 'r+b')
+            else:
+                range_size = -(-size // connections)
+                ranges = [
+                    {'start': start, 'end': min(start + range_size, size) - 1, 'downloaded': 0}
+                    for start in range(0, size, range_size)]
+                stream, ctx.tmpfilename = sanitize_open(ctx.tmpfilename, 'wb')
+                stream.truncate(size)
+        except (OSError, IOError) as err:
+            self.report_error('unable to open for writing: %s' % error_to_compat_str(err))
+            return False
+        ctx.filename = self.undo_temp_name(ctx.tmpfilename)
+        self.report_destination(ctx.filename)
+        if self.params.get('xattr_set_filesize', False):
+            try:
+                write_xattr(ctx.tmpfilename, 'user.ytdl.filesize', str(size).encode('utf-8'))
+            except (XAttrUnavailableError, XAttrMetadataError) as err:
+                self.report_error('unable to set filesize xattr: %s' % str(err))
+        stream.close()
+
+        for rng in ranges:
+            rng['committed'] = rng['downloaded']
+        progress = {
+            'ranges': ranges,
+            'start': time.time(),
+            'resume_len': sum(rng['downloaded'] for rng in ranges),
+            'block_size': ctx.block_size,
+            'stop': threading.Event(),
+        }
+
+        def run(rng):
+            try:
+                with open(encodeFilename(ctx.tmpfilename), 'r+b') as range_stream:
+                    self._download_range(range_stream, rng, url, headers, progress)
+            except Exception as err:
+                rng['error'] = err
+                progress['stop'].set()
+
+        threads = [threading.Thread(target=run, args=(rng, )) for rng in ranges]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        last_saved = time.time()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.1)
+                    now = time.time()
+                    byte_counter = sum(rng['downloaded'] for rng in ranges)
+                    speed = self.calc_speed(progress['start'], now, byte_counter - progress['resume_len'])
+                    self._hook_progress({
+                        'status': 'downloading',
+                        'downloaded_bytes': byte_counter,
+                        'total_bytes': size,
+                        'tmpfilename': ctx.tmpfilename,
+                        'filename': ctx.filename,
+                        'eta': self.calc_eta(speed, size - byte_counter),
+                        'speed': speed,
+                        'elapsed': now - ctx.start_time,
+                    })
+                    if now - last_saved >= self._RANGES_STATE_INTERVAL:
+                        self._write_ranges_state(ytdl_filename, size, ranges)
+                        last_saved = now
+        finally:
+            progress['stop'].set()
+            for thread in threads:
+                thread.join()
+            errors = [rng['error'] for rng in ranges if 'error' in rng]
+            if errors or any(rng['downloaded'] < rng['end'] - rng['start'] + 1 for rng in ranges):
+                # kept for resuming
+                self._write_ranges_state(ytdl_filename, size, ranges)
+
+        if errors:
+            self.report_error('unable to download a range of the file: %s' % error_to_compat_str(errors[0]))
+            return False
+
+        if os.path.isfile(encodeFilename(ytdl_filename)):
+            os.remove(encodeFilename(ytdl_filename))
+        self.try_rename(ctx.tmpfilename, ctx.filename)
+        if self.params.get('updatetime', True):
+            self.try_utime(ctx.filename, last_modified)
+        self._hook_progress({
+            'downloaded_bytes': size,
+            'total_bytes': size,
+            'filename': ctx.filename,
+            'status': 'finished',
+            'elapsed': time.time() - ctx.start_time,
+        })
+        return True
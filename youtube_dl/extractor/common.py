@@ -63,6 +63,7 @@ from ..utils import (
     join_nonempty,
     js_to_json,
     JSON_LD_RE,
+    LRUCache,
     mimetype2ext,
     orderedSet,
     parse_bitrate,
@@ -423,6 +424,10 @@ class InfoExtractor(object):
     _GEO_COUNTRIES = None
     _GEO_IP_BLOCKS = None
     _WORKING = True
+    # Patterns of _search_regex() and friends, compiled once for all
+    # extractors: the cache of re is too small for the patterns of
+    # hundreds of extractors
+    _REGEX_CACHE = LRUCache(4096)
     # supply this in public subclasses: used in supported sites list, etc
     # IE_DESC = 'short description of IE'
 
@@ -678,7 +683,10 @@ class InfoExtractor(object):
         exceptions = [compat_urllib_error.URLError, compat_http_client.HTTPException, socket.error]
         if hasattr(ssl, 'CertificateError'):
             exceptions.append(ssl.CertificateError)
+        response_cache = getattr(self._downloader, 'response_cache', None)
         try:
+            if response_cache and response_cache.enabled:
+                return response_cache.urlopen(url_or_request)
             return self._downloader.urlopen(url_or_request)
         except tuple(exceptions) as err:
             if isinstance(err, compat_urllib_error.HTTPError):
@@ -1068,10 +1076,10 @@ class InfoExtractor(object):
         RegexNotFoundError, depending on fatal, specifying the field name.
         """
         if isinstance(pattern, (str, compat_str, compiled_regex_type)):
-            mobj = re.search(pattern, string, flags)
+            mobj = self._compile_regex(pattern, flags).search(string)
         else:
             for p in pattern:
-                mobj = re.search(p, string, flags)
+                mobj = self._compile_regex(p, flags).search(string)
                 if mobj:
                     break
 
@@ -1096,6 +1104,23 @@ class InfoExtractor(object):
             self.report_warning('unable to extract %s' % _name + bug_reports_message())
             return None
 
+    @classmethod
+    def _cached_regex(cls, key, compile):
+        regex = cls._REGEX_CACHE.get(key)
+        if regex is None:
+            regex = compile()
+            cls._REGEX_CACHE.set(key, regex)
+        return regex
+
+    @classmethod
+    def _compile_regex(cls, pattern, flags=0):
+        """Return pattern compiled with flags, as re.compile() but cached"""
+        if isinstance(pattern, compiled_regex_type):
+            # fails like re.search() if there are flags
+            return re.compile(pattern, flags)
+        return cls._cached_regex(
+            (type(pattern), pattern, flags), lambda: re.compile(pattern, flags))
+
     def _search_json(self, start_pattern, string, name, video_id, **kwargs):
         """Searches string for the JSON object specified by start_pattern"""
 
@@ -1236,6 +1261,17 @@ class InfoExtractor(object):
                     (?=[^>]+(?:itemprop|name|property|id|http-equiv)=(["\']?)%s\1)
                     [^>]+?content=(["\'])(?P<content>.*?)\2''' % re.escape(prop)
 
+    @classmethod
+    def _compiled_og_regexes(cls, prop, flags=re.DOTALL):
+        """_og_regexes(prop), compiled with flags"""
+        return cls._cached_regex(
+            ('og', prop, flags), lambda: [re.compile(r, flags) for r in cls._og_regexes(prop)])
+
+    @classmethod
+    def _compiled_meta_regex(cls, prop):
+        """_meta_regex(prop), compiled"""
+        return cls._cached_regex(('meta', prop), lambda: re.compile(cls._meta_regex(prop)))
+
     def _og_search_property(self, prop, html, name=None, **kargs):
         if not isinstance(prop, (list, tuple)):
             prop = [prop]
@@ -1243,8 +1279,8 @@ class InfoExtractor(object):
             name = 'OpenGraph %s' % prop[0]
         og_regexes = []
         for p in prop:
-            og_regexes.extend(self._og_regexes(p))
-        escaped = self._search_regex(og_regexes, html, name, flags=re.DOTALL, **kargs)
+            og_regexes.extend(self._compiled_og_regexes(p))
+        escaped = self._search_regex(og_regexes, html, name, **kargs)
         if escaped is None:
             return None
         return unescapeHTML(escaped)
@@ -1259,9 +1295,9 @@ class InfoExtractor(object):
         return self._og_search_property('title', html, **kargs)
 
     def _og_search_video_url(self, html, name='video url', secure=True, **kargs):
-        regexes = self._og_regexes('video') + self._og_regexes('video:url')
+        regexes = self._compiled_og_regexes('video', 0) + self._compiled_og_regexes('video:url', 0)
         if secure:
-            regexes = self._og_regexes('video:secure_url') + regexes
+            regexes = self._compiled_og_regexes('video:secure_url', 0) + regexes
         return self._html_search_regex(regexes, html, name, **kargs)
 
     def _og_search_url(self, html, **kargs):
@@ -1273,7 +1309,7 @@ class InfoExtractor(object):
         if display_name is None:
             display_name = name[0]
         return self._html_search_regex(
-            [self._meta_regex(n) for n in name],
+            [self._compiled_meta_regex(n) for n in name],
             html, display_name, fatal=fatal, group='content', **kwargs)
 
     def _dc_search_uploader(self, html):
@@ -0,0 +1,271 @@
+# coding: utf-8
+from __future__ import unicode_literals
+
+import re
+
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
+
+from .common import InfoExtractor, SearchInfoExtractor
+from ..compat import compat_str
+from ..utils import variadic
+
+
+# Tokens found in most URLs: only used as index keys when nothing better exists
+_COMMON_TOKENS = frozenset((
+    'http', 'https', 'www', 'm', 'com', 'net', 'org', 'tv', 'html', 'php',
+    'video', 'videos', 'watch', 'embed', 'player', 'play'))
+
+# Atoms of a linearised pattern, besides lowercase alphanumeric characters
+# and groups
+_SEP = object()      # a non-alphanumeric character or the start/end of the URL
+_UNKNOWN = object()  # anything else, possibly empty
+
+_REPEAT_OPS = tuple(
+    getattr(sre_parse, op) for op in ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT')
+    if hasattr(sre_parse, op))
+_BOUNDARY_ATS = (sre_parse.AT_BOUNDARY, sre_parse.AT_NON_BOUNDARY)
+
+
+def url_tokens(url):
+    """ Return the set of lowercase alphanumeric runs in an ASCII URL, or None """
+    try:
+        url.encode('ascii')
+    except (AttributeError, UnicodeError):
+        return None
+    return set(re.findall(r'[a-z0-9]+', url.lower()))
+
+
+def _atom_props(atom):
+    """ Return (nullable, starts with _SEP, ends with _SEP) for atom """
+    if isinstance(atom, _Group):
+        return atom.nullable, atom.first_sep, atom.last_sep
+    if atom is _SEP:
+        return False, True, True
+    if atom is _UNKNOWN:
+        return True, False, False
+    return False, False, False
+
+
+def _edge_sep(atoms):
+    # whether the first non-empty atom, if any, starts with _SEP
+    for atom in atoms:
+        nullable, first_sep, _ = _atom_props(atom)
+        if not first_sep:
+            return False
+        if not nullable:
+            break
+    return True
+
+
+class _Group(object):
+    """ Alternatives of atom lists, possibly repeated """
+
+    def __init__(self, alternatives, repeated=False):
+        self.alternatives = alternatives
+        self.repeated = repeated
+        self.nullable = any(all(_atom_props(a)[0] for a in atoms) for atoms in alternatives)
+        self.first_sep = all(_edge_sep(atoms) for atoms in alternatives)
+        self.last_sep = all(_edge_sep(reversed(atoms)) for atoms in alternatives)
+
+
+def _literal_atom(code):
+    if code >= 128:
+        # may match ASCII letters case-insensitively (e.g. U+212A KELVIN SIGN)
+        return _UNKNOWN
+    c = compat_str(chr(code)).lower()
+    return c if c.isalnum() else _SEP
+
+
+def _in_atom(items):
+    # A character class is a separator only if it is a set of ASCII
+    # punctuation literals, like [/?#]
+    for op, av in items:
+        if op != sre_parse.LITERAL or _literal_atom(av) is not _SEP:
+            return _UNKNOWN
+    return _SEP
+
+
+def _linearise(parsed):
+    """ Return the list of atoms of a parsed pattern """
+    atoms = []
+    for op, av in parsed:
+        if op == sre_parse.LITERAL:
+            atoms.append(_literal_atom(av))
+        elif op == sre_parse.IN:
+            atoms.append(_in_atom(av))
+        elif op == sre_parse.SUBPATTERN:
+            # (group, add_flags, del_flags, p) in Python 3.6+, (group, p) before
+            atoms.extend(_linearise(av[-1]))
+        elif op == getattr(sre_parse, 'ATOMIC_GROUP', None):
+            atoms.extend(_linearise(av))
+        elif op == sre_parse.AT:
+            if av not in _BOUNDARY_ATS:
+                atoms.append(_SEP)
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            # zero-width: the neighbouring atoms stay adjacent
+            pass
+        elif op == sre_parse.BRANCH:
+            atoms.append(_Group([_linearise(p) for p in av[1]]))
+        elif op in _REPEAT_OPS:
+            min_count, max_count, p = av
+            if max_count > 0:
+                content = _linearise(p)
+                atoms.append(_Group(
+                    [content] if min_count > 0 else [content, []],
+                    repeated=max_count > 1))
+        else:
+            atoms.append(_UNKNOWN)
+    return atoms
+
+
+def _bounded(atoms, pos, step):
+    # whether the URL character next to atoms[pos] in direction step is
+    # guaranteed to be a _SEP; atoms must start and end with _SEP or _UNKNOWN
+    while True:
+        pos += step
+        nullable, first_sep, last_sep = _atom_props(atoms[pos])
+        if not (first_sep if step > 0 else last_sep):
+            return False
+        if not nullable:
+            return True
+
+
+def _key_score(key):
+    token = key.strip('*')
+    return 0 if token in _COMMON_TOKENS else len(token)
+
+
+def _condition_score(condition):
+    return (min(map(_key_score, condition)), -len(condition))
+
+
+def _condition(atoms):
+    """
+    Return a set of keys such that any URL matched by the atoms has a
+    token matching one of them, or None if there is no such set
+
+    Keys are lowercase tokens, possibly prefixed (resp. suffixed) with *
+    to also match URL tokens ending (resp. starting) with them. The first
+    and last atoms stand for the context of the pattern.
+    """
+    conditions = []
+    run_start = None
+    for i, atom in enumerate(atoms):
+        if isinstance(atom, _Group):
+            if atom.repeated:
+                context = _UNKNOWN, _UNKNOWN
+            else:
+                context = [_SEP if _bounded(atoms, i, step) else _UNKNOWN for step in (-1, 1)]
+            alternatives = [
+                _condition([context[0]] + alternative + [context[1]])
+                for alternative in atom.alternatives]
+            if all(alternatives):
+                conditions.append(frozenset().union(*alternatives))
+        elif atom is not _SEP and atom is not _UNKNOWN:
+            if run_start is None:
+                run_start = i
+            continue
+        if run_start is not None:
+            token = ''.join(atoms[run_start:i])
+            left, right = _bounded(atoms, run_start, -1), _bounded(atoms, i - 1, 1)
+            if left or right:
+                conditions.append(frozenset((
+                    ('' if left else '*') + token + ('' if right else '*'), )))
+            run_start = None
+    return max(conditions, key=_condition_score) if conditions else None
+
+
+def _url_patterns(ie):
+    suitable = getattr(ie.suitable, '__func__', None)
+    if suitable is InfoExtractor.suitable.__func__:
+        return variadic(getattr(ie, '_VALID_URL', None))
+    if suitable is SearchInfoExtractor.suitable.__func__:
+        return (ie._make_valid_url(), )
+    # custom suitable() implementations may accept anything
+
+
+def dispatch_keys(ie):
+    """
+    Return a tuple of keys, one of which matches a token of every URL
+    suitable for the extractor ie, or None if it can't be indexed
+    """
+    if '_DISPATCH_KEYS' in vars(ie):
+        # computed by make_lazy_extractors
+        return ie._DISPATCH_KEYS
+    patterns = _url_patterns(ie)
+    if not patterns:
+        return None
+    keys = set()
+    for pattern in patterns:
+        try:
+            # match() anchors patterns at the start of the URL
+            condition = _condition([_SEP] + _linearise(sre_parse.parse(pattern)) + [_UNKNOWN])
+        except Exception:
+            return None
+        if not condition:
+            return None
+        keys.update(condition)
+    return tuple(sorted(keys))
+
+
+class URLDispatchIndex(object):
+    """
+    Index of a list of extractors by tokens of the URLs they accept
+
+    candidates() yields a subsequence of the extractors, in the same order,
+    containing every extractor whose suitable() may return True for a URL, so
+    that the first suitable candidate is the first suitable extractor.
+    Extractors appended to the list after the index was created are indexed
+    on the next lookup.
+    """
+
+    def __init__(self, ies):
+        self.ies = ies
+        self._indexed = 0
+        self._fallback = []
+        self._exact = {}
+        self._prefixes = {}
+        self._suffixes = {}
+        self._max_affix_len = 0
+
+    def _index(self):
+        for pos in range(self._indexed, len(self.ies)):
+            ie = self.ies[pos]
+            keys = dispatch_keys(ie if isinstance(ie, type) else type(ie))
+            if not keys:
+                self._fallback.append(pos)
+                continue
+            for key in keys:
+                if key.startswith('*'):
+                    table, key = self._suffixes, key[1:]
+                elif key.endswith('*'):
+                    table, key = self._prefixes, key[:-1]
+                else:
+                    table = self._exact
+                if table is not self._exact:
+                    self._max_affix_len = max(self._max_affix_len, len(key))
+                table.setdefault(key, []).append(pos)
+        self._indexed = len(self.ies)
+
+    def positions(self, url):
+        """ Return the sorted positions of the candidate extractors for url """
+        if self._indexed != len(self.ies):
+            self._index()
+        tokens = url_tokens(url)
+        if tokens is None:
+            return range(len(self.ies))
+        found = set(self._fallback)
+        for token in tokens:
+            found.update(self._exact.get(token, ()))
+            for i in range(1, min(len(token), self._max_affix_len) + 1):
+                found.update(self._prefixes.get(token[:i], ()))
+                found.update(self._suffixes.get(token[-i:], ()))
+        return sorted(found)
+
+    def candidates(self, url):
+        """ Yield the extractors that may be suitable for url, in order """
+        for pos in self.positions(url):
+            yield self.ies[pos]
@@ -249,7 +249,8 @@ class KuwoSingerIE(InfoExtractor):
                     webpage)
             ]
 
-        entries = InAdvancePagedList(page_func, page_count, self.PAGE_SIZE)
+        # page_func is thread-safe, so the next pages can be prefetched
+        entries = InAdvancePagedList(page_func, page_count, self.PAGE_SIZE, prefetch=2)
 
         return self.playlist_result(entries, singer_id, singer_name)
 
@@ -271,9 +271,10 @@ class LBRYChannelIE(LBRYBaseIE):
             if language == 'en':
                 languages.append('none')
             params['any_languages'] = languages
+        # _fetch_page is thread-safe, so the next pages can be prefetched
         entries = OnDemandPagedList(
             functools.partial(self._fetch_page, claim_id, url, params),
-            self._PAGE_SIZE)
+            self._PAGE_SIZE, prefetch=2)
         result_value = result.get('value') or {}
         return self.playlist_result(
             entries, claim_id, result_value.get('title'),
@@ -2812,7 +2812,7 @@ class YoutubeIE(YoutubeBaseInfoExtractor):
         if not keywords and webpage:
             keywords = [
                 unescapeHTML(m.group('content'))
-                for m in re.finditer(self._meta_regex('og:video:tag'), webpage)]
+                for m in self._compiled_meta_regex('og:video:tag').finditer(webpage)]
         for keyword in keywords:
             if keyword.startswith('yt:stretch='):
                 mobj = re.search(r'(\d+)\s*:\s*(\d+)', keyword)
@@ -16,6 +16,7 @@ from .utils import (
     float_or_none,
     int_or_none,
     js_to_json,
+    LRUCache,
     remove_quotes,
     str_or_none,
     unified_timestamp,
@@ -404,6 +405,11 @@ class JSInterpreter(object):
 
     _OBJ_NAME = '__youtube_dl_jsinterp_obj'
 
+    # Splitting code into statements and operands only depends on the code
+    # text, so the results are shared by all instances: functions called
+    # repeatedly (eg, for each format) are only parsed once
+    _PARSE_CACHE = LRUCache(4096)
+
     OP_CHARS = None
 
     def __init__(self, code, objects=None):
@@ -621,10 +627,32 @@ class JSInterpreter(object):
         namespace[name] = obj
         return name
 
+    @classmethod
+    def _cached_parse(cls, key, parse):
+        # Code containing named objects is generated at run time and won't
+        # be seen again: don't let it evict anything
+        if cls._OBJ_NAME in key[1]:
+            return parse()
+        result = cls._PARSE_CACHE.get(key, cls._PARSE_CACHE)
+        if result is cls._PARSE_CACHE:
+            result = parse()
+            cls._PARSE_CACHE.set(key, result)
+        return result
+
+    @classmethod
+    def _js_to_json(cls, expr):
+        return cls._cached_parse(('js_to_json', expr), lambda: js_to_json(expr))
+
     @classmethod
     def _separate(cls, expr, delim=',', max_split=None, skip_delims=None):
         if not expr:
-            return
+            return iter(())
+        return iter(cls._cached_parse(
+            ('separate', expr, delim, max_split, skip_delims),
+            lambda: tuple(cls.__separate(expr, delim, max_split, skip_delims))))
+
+    @classmethod
+    def __separate(cls, expr, delim, max_split, skip_delims):
         # collections.Counter() is ~10% slower in both 2.7 and 3.9
         counters = dict((k, 0) for k in _MATCHING_PARENS.values())
         start, splits, pos, delim_len = 0, 0, 0, len(delim) - 1
@@ -708,6 +736,13 @@ class JSInterpreter(object):
         return _cached
 
     def _separate_at_op(self, expr, max_split=None):
+        separated = self._cached_parse(('separate_at_op', expr), lambda: self.__separate_at_op(expr))
+        if separated:
+            op, separated, right_expr = separated
+            # the caller may modify the list of operands
+            return op, list(separated), right_expr
+
+    def __separate_at_op(self, expr):
 
         for op, _ in self._all_operators():
             # hackety: </> have higher priority than <</>>, but don't confuse them
@@ -767,7 +802,7 @@ class JSInterpreter(object):
                 expr = op.join(separated)
             if right_expr is None:
                 continue
-            return op, separated, right_expr
+            return op, tuple(separated), right_expr
 
     def _operator(self, op, left_val, right_expr, expr, local_vars, allow_recursion):
         if op in ('||', '&&'):
@@ -823,6 +858,27 @@ class JSInterpreter(object):
         ''')
     _FINALLY_RE = re.compile(r'finally\s*\{')
     _SWITCH_RE = re.compile(r'switch\s*\(')
+    _CATCH_RE = re.compile(r'catch\s*(?P<err>\(\s*{_NAME_RE}\s*\))?\{{'.format(**globals()))
+    _INC_DEC_RE = re.compile(r'''(?x)
+            (?P<pre_sign>\+\+|--)(?P<var1>{_NAME_RE})|
+            (?P<var2>{_NAME_RE})(?P<post_sign>\+\+|--)'''.format(**globals()))
+    _STATEMENT_RE = re.compile(r'''(?x)
+        (?P<assign>
+            (?P<out>{_NAME_RE})(?P<out_idx>(?:\[{_NESTED_BRACKETS}\])+)?\s*
+            (?P<op>{_OPERATOR_RE})?
+            =(?!=)(?P<expr>.*)$
+        )|(?P<return>
+            (?!if|return|true|false|null|undefined|NaN|Infinity)(?P<name>{_NAME_RE})$
+        )|(?P<attribute>
+            (?P<var>{_NAME_RE})(?:
+                (?P<nullish>\?)?\.(?P<member>[^(]+)|
+                \[(?P<member2>{_NESTED_BRACKETS})\]
+            )\s*
+        )|(?P<indexing>
+            (?P<in>{_NAME_RE})(?P<in_idx>\[.+\])$
+        )|(?P<function>
+            (?P<fname>{_NAME_RE})\((?P<args>.*)\)$
+        )'''.format(**globals()))
 
     def _eval_operator(self, op, left_expr, right_expr, expr, local_vars, allow_recursion):
         left_val = self.interpret_expression(left_expr, local_vars, allow_recursion)
@@ -860,7 +916,7 @@ class JSInterpreter(object):
                 flags, outer = self.JS_RegExp.regex_flags(outer)
                 inner = self.JS_RegExp(inner[1:], flags=flags)
             else:
-                inner = json.loads(js_to_json(inner + expr[0]))  # , strict=True))
+                inner = json.loads(self._js_to_json(inner + expr[0]))  # , strict=True))
             if not outer:
                 return inner, should_return
             expr = self._named_object(local_vars, inner) + outer
@@ -981,7 +1037,7 @@ class JSInterpreter(object):
                 err = e
 
             pending = (None, False)
-            m = re.match(r'catch\s*(?P<err>\(\s*{_NAME_RE}\s*\))?\{{'.format(**globals()), expr)
+            m = self._CATCH_RE.match(expr)
             if m:
                 sub_expr, expr = self._separate_at_paren(expr[m.end() - 1:])
                 if err:
@@ -1072,9 +1128,7 @@ class JSInterpreter(object):
                     return ret, True
             return ret, False
 
-        for m in re.finditer(r'''(?x)
-                (?P<pre_sign>\+\+|--)(?P<var1>{_NAME_RE})|
-                (?P<var2>{_NAME_RE})(?P<post_sign>\+\+|--)'''.format(**globals()), expr):
+        for m in self._INC_DEC_RE.finditer(expr):
             var = m.group('var1') or m.group('var2')
             start, end = m.span()
             sign = m.group('pre_sign') or m.group('post_sign')
@@ -1087,23 +1141,7 @@ class JSInterpreter(object):
         if not expr:
             return None, should_return
 
-        m = re.match(r'''(?x)
-            (?P<assign>
-                (?P<out>{_NAME_RE})(?P<out_idx>(?:\[{_NESTED_BRACKETS}\])+)?\s*
-                (?P<op>{_OPERATOR_RE})?
-                =(?!=)(?P<expr>.*)$
-            )|(?P<return>
-                (?!if|return|true|false|null|undefined|NaN|Infinity)(?P<name>{_NAME_RE})$
-            )|(?P<attribute>
-                (?P<var>{_NAME_RE})(?:
-                    (?P<nullish>\?)?\.(?P<member>[^(]+)|
-                    \[(?P<member2>{_NESTED_BRACKETS})\]
-                )\s*
-            )|(?P<indexing>
-                (?P<in>{_NAME_RE})(?P<in_idx>\[.+\])$
-            )|(?P<function>
-                (?P<fname>{_NAME_RE})\((?P<args>.*)\)$
-            )'''.format(**globals()), expr)
+        m = self._STATEMENT_RE.match(expr)
         md = m.groupdict() if m else {}
         if md.get('assign'):
             left_val = local_vars.get(m.group('out'))
@@ -1158,7 +1196,7 @@ class JSInterpreter(object):
                 return ret, should_return
 
         with compat_contextlib_suppress(ValueError):
-            ret = json.loads(js_to_json(expr))  # strict=True)
+            ret = json.loads(self._js_to_json(expr))  # strict=True)
             if not md.get('attribute'):
                 return ret, should_return
 
@@ -209,6 +209,14 @@ def parseOpts(overrideArguments=None):
         '--socket-timeout',
         dest='socket_timeout', type=float, default=None, metavar='SECONDS',
         help='Time to wait before giving up, in seconds')
+    network.add_option(
+        '--connection-pool-size',
+        dest='connection_pool_size', type=int, default=None, metavar='N',
+        help='Maximum number of idle persistent connections to keep open per host (default is 8); 0 disables connection reuse')
+    network.add_option(
+        '--connection-idle-timeout',
+        dest='connection_idle_timeout', type=float, default=None, metavar='SECONDS',
+        help='Close persistent connections that have been idle for longer than this (default is 30)')
     network.add_option(
         '--source-address',
         metavar='IP', dest='source_address', default=None,
@@ -434,6 +442,11 @@ def parseOpts(overrideArguments=None):
             'If a merge is required (e.g. bestvideo+bestaudio), '
             'output to given container format. One of mkv, mp4, ogg, webm, flv. '
             'Ignored if no merge is required'))
+    video_format.add_option(
+        '--native-merge',
+        action='store_true', dest='native_merge', default=False,
+        help='Merge the formats to be merged without ffmpeg when they are fragmented MP4 (e.g. DASH) or WebM files '
+             'with a video and an audio track; ffmpeg is still used for other formats')
 
     subtitles = optparse.OptionGroup(parser, 'Subtitle Options')
     subtitles.add_option(
@@ -487,9 +500,17 @@ def parseOpts(overrideArguments=None):
         '--keep-fragments',
         action='store_true', dest='keep_fragments', default=False,
         help='Keep downloaded fragments on disk after downloading is finished; fragments are erased by default')
+    downloader.add_option(
+        '-N', '--concurrent-fragments',
+        dest='concurrent_fragment_downloads', metavar='N', default=1, type=int,
+        help='Number of fragments to download concurrently (default is %default) (DASH and hlsnative)')
+    downloader.add_option(
+        '--http-connections',
+        dest='http_connections', metavar='N', default=1, type=int,
+        help='Number of connections used to download a file over HTTP, each one fetching a part of the file (default is %default)')
     downloader.add_option(
         '--buffer-size',
-        dest='buffersize', metavar='SIZE', default='1024',
+        dest='buffersize', metavar='SIZE', default='16K',
         help='Size of download buffer (e.g. 1024 or 16K) (default is %default)')
     downloader.add_option(
         '--no-resize-buffer',
@@ -512,6 +533,35 @@ def parseOpts(overrideArguments=None):
         '--playlist-random',
         action='store_true',
         help='Download playlist videos in random order')
+    downloader.add_option(
+        '--lazy-playlist',
+        action='store_true', dest='lazy_playlist', default=False,
+        help='Process playlist videos as soon as they are listed, rather than after the whole playlist is fetched; '
+             'the number of videos is then unknown. Ignored with --playlist-reverse and --playlist-random')
+    downloader.add_option(
+        '--prefetch-pages',
+        dest='prefetch_pages', metavar='N', default=None, type=int,
+        help='Number of pages of a paged playlist to fetch in the background while the current one is processed, '
+             'for the extractors that support it')
+    downloader.add_option(
+        '--concurrent-entries',
+        dest='concurrent_entries', metavar='N', default=1, type=int,
+        help='Number of playlist videos to extract concurrently (default is %default); they are still downloaded one at a time, in order')
+    downloader.add_option(
+        '--concurrent-formats',
+        action='store_true', dest='concurrent_format_downloads', default=False,
+        help='Download the formats to be merged (e.g. with -f bestvideo+bestaudio) at the same time, '
+             'showing their combined progress; if one fails, the others are stopped')
+    downloader.add_option(
+        '--stream-merge',
+        action='store_true', dest='stream_merge', default=False,
+        help='Pipe the formats to be merged into ffmpeg while they are downloaded, '
+             'instead of writing them to temporary files first (requires named pipes and the native downloaders; '
+             'the formats must be streamable, e.g. DASH or WebM)')
+    downloader.add_option(
+        '--concurrent-sidecars',
+        dest='concurrent_sidecar_downloads', metavar='N', default=1, type=int,
+        help='Number of subtitles and thumbnails to download concurrently, while the video is downloaded (default is %default)')
     downloader.add_option(
         '--xattr-set-filesize',
         dest='xattr_set_filesize', action='store_true',
@@ -666,6 +716,13 @@ def parseOpts(overrideArguments=None):
         '--console-title',
         action='store_true', dest='consoletitle', default=False,
         help='Display progress in console titlebar')
+    verbosity.add_option(
+        '--progress-interval',
+        dest='progress_interval', metavar='SECONDS', type=float, default=None,
+        help='Minimum interval between two updates of the download progress, '
+             'for the progress bar, the console title and progress hooks alike '
+             '(default is 0.1, 0 to report every block received); '
+             'the completion of a download is always reported')
     verbosity.add_option(
         '-v', '--verbose',
         action='store_true', dest='verbose', default=False,
@@ -790,6 +847,24 @@ def parseOpts(overrideArguments=None):
         '--rm-cache-dir',
         action='store_true', dest='rm_cachedir',
         help='Delete all filesystem cache files')
+    filesystem.add_option(
+        '--cache-max-size',
+        dest='cache_max_size', metavar='SIZE', default=None,
+        help='Remove the least recently written cache files when the cache is larger than SIZE, e.g. 50k or 10M')
+    filesystem.add_option(
+        '--cache-memory-size',
+        dest='cache_memory_size', metavar='N', default=None, type=int,
+        help='Number of cache entries kept in memory (default is 64, 0 to always read them from the cache dir)')
+    filesystem.add_option(
+        '--http-cache',
+        action='store_true', dest='http_cache', default=False,
+        help='Keep the webpages and API responses downloaded by extractors in the cache dir, '
+             'reusing and revalidating them as their HTTP caching headers allow. '
+             'The cache size is limited to 256M unless --cache-max-size is given')
+    filesystem.add_option(
+        '--offline-replay',
+        action='store_true', dest='offline_replay', default=False,
+        help='Only use the responses cached with --http-cache for extraction, failing the requests of extractors that were not cached')
 
     thumbnail = optparse.OptionGroup(parser, 'Thumbnail Options')
     thumbnail.add_option(
@@ -877,6 +952,14 @@ def parseOpts(overrideArguments=None):
         '--ffmpeg-location', '--avconv-location', metavar='PATH',
         dest='ffmpeg_location',
         help='Location of the ffmpeg/avconv binary; either the path to the binary or its containing directory.')
+    postproc.add_option(
+        '--fuse-ffmpeg-passes',
+        action='store_true', dest='fuse_ffmpeg_passes', default=True,
+        help='Merge formats, fix files and embed metadata and subtitles with a single ffmpeg run when streams are only copied (default)')
+    postproc.add_option(
+        '--no-fuse-ffmpeg-passes',
+        action='store_false', dest='fuse_ffmpeg_passes',
+        help='Run ffmpeg once for each of these steps')
     postproc.add_option(
         '--exec',
         metavar='CMD', dest='exec_cmd',
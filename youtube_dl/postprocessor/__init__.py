@@ -2,6 +2,7 @@ from __future__ import unicode_literals
 
 from .embedthumbnail import EmbedThumbnailPP
 from .ffmpeg import (
+    FFmpegCommand,
     FFmpegPostProcessor,
     FFmpegEmbedSubtitlePP,
     FFmpegExtractAudioPP,
@@ -16,6 +17,7 @@ from .ffmpeg import (
 from .xattrpp import XAttrMetadataPP
 from .execafterdownload import ExecAfterDownloadPP
 from .metadatafromtitle import MetadataFromTitlePP
+from .nativemerger import NativeMergerPP
 
 
 def get_postprocessor(key):
@@ -25,6 +27,7 @@ def get_postprocessor(key):
 __all__ = [
     'EmbedThumbnailPP',
     'ExecAfterDownloadPP',
+    'FFmpegCommand',
     'FFmpegEmbedSubtitlePP',
     'FFmpegExtractAudioPP',
     'FFmpegFixupM3u8PP',
@@ -36,5 +39,6 @@ __all__ = [
     'FFmpegSubtitlesConvertorPP',
     'FFmpegVideoConvertorPP',
     'MetadataFromTitlePP',
+    'NativeMergerPP',
     'XAttrMetadataPP',
 ]
@@ -196,13 +196,8 @@ class FFmpegPostProcessor(PostProcessor):
                 return mobj.group(1)
         return None
 
-    def run_ffmpeg_multiple_files(self, input_paths, out_path, opts):
-        self.check_version()
-
-        oldest_mtime = min(
-            os.stat(encodeFilename(path)).st_mtime for path in input_paths)
-
-        opts += self._configuration_args()
+    def _ffmpeg_command(self, input_paths, out_path, opts):
+        opts = opts + self._configuration_args()
 
         files_cmd = []
         for path in input_paths:
@@ -220,8 +215,20 @@ class FFmpegPostProcessor(PostProcessor):
 
         if self._downloader.params.get('verbose', False):
             self._downloader.to_screen('[debug] ffmpeg command line: %s' % shell_quote(cmd))
-        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE)
-        stdout, stderr = process_communicate_or_kill(p)
+        return cmd
+
+    def start_ffmpeg_multiple_files(self, input_paths, out_path, opts):
+        """
+        Start ffmpeg like run_ffmpeg_multiple_files() but without waiting
+        for it: the caller must communicate() with the returned process and
+        pass its stderr to check_ffmpeg_result()
+        """
+        self.check_version()
+        return subprocess.Popen(
+            self._ffmpeg_command(input_paths, out_path, opts),
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE)
+
+    def check_ffmpeg_result(self, p, stderr):
         if p.returncode != 0:
             stderr = stderr.decode('utf-8', 'replace')
             msgs = stderr.strip().split('\n')
@@ -229,11 +236,35 @@ class FFmpegPostProcessor(PostProcessor):
             if self._downloader.params.get('verbose', False):
                 self._downloader.to_screen('[debug] ' + '\n'.join(msgs[:-1]))
             raise FFmpegPostProcessorError(msg)
+
+    def run_ffmpeg_multiple_files(self, input_paths, out_path, opts):
+        oldest_mtime = min(
+            os.stat(encodeFilename(path)).st_mtime for path in input_paths)
+
+        p = self.start_ffmpeg_multiple_files(input_paths, out_path, opts)
+        stdout, stderr = process_communicate_or_kill(p)
+        self.check_ffmpeg_result(p, stderr)
         self.try_utime(out_path, oldest_mtime, oldest_mtime)
 
     def run_ffmpeg(self, path, out_path, opts):
         self.run_ffmpeg_multiple_files([path], out_path, opts)
 
+    def plan(self, command, information):
+        """
+        Add the work of the postprocessor to command, an FFmpegCommand,
+        instead of running ffmpeg, and return the result of run().
+
+        Return None if the work can't be done by command, e.g. because it
+        needs to re-encode streams; the postprocessor is then run alone.
+        """
+        return None
+
+    def _run_planned(self, information):
+        command = FFmpegCommand(self, information['filepath'])
+        files_to_delete, information = self.plan(command, information)
+        command.run()
+        return files_to_delete, information
+
     def _ffmpeg_filename_argument(self, fn):
         # Always use 'file:' because the filename may contain ':' (ffmpeg
         # interprets that as a protocol) or can start with '-' (-- is broken in
@@ -242,6 +273,79 @@ class FFmpegPostProcessor(PostProcessor):
         return 'file:' + fn if fn != '-' else fn
 
 
+class FFmpegCommand(object):
+    """
+    An ffmpeg pass copying the streams of a media file into a new version of
+    it, to which the postprocessors of a chain add their work with their
+    plan() method, so that the file is only rewritten once for all of them
+
+    pp is the FFmpegPostProcessor running ffmpeg.
+    """
+
+    def __init__(self, pp, filepath):
+        self._pp = pp
+        self.filepath = filepath
+        # the inputs with the streams of the media file and how to map
+        # them, None for the default stream selection of ffmpeg
+        self.media_inputs = [filepath]
+        self.media_maps = None
+        # (filename, language) of the subtitles to add
+        self.subtitles = []
+        self.metadata_file = None
+        self.files_to_remove = []
+        self._messages = []
+        self._options = []
+
+    def has_steps(self):
+        return bool(self._messages)
+
+    def add_step(self, message, options=()):
+        self._messages.append(message)
+        self._options.extend(options)
+
+    def inputs(self):
+        inputs = self.media_inputs + [fn for fn, _ in self.subtitles]
+        if self.metadata_file:
+            inputs.append(self.metadata_file)
+        return inputs
+
+    def options(self):
+        maps = self.media_maps
+        if maps is None and self.subtitles:
+            maps = [
+                '-map', '0',
+                # Don't copy the existing subtitles, we may be running the
+                # postprocessor a second time
+                '-map', '-0:s',
+                # Don't copy Apple TV chapters track, bin_data (see #19042, #19024,
+                # https://trac.ffmpeg.org/ticket/6016)
+                '-map', '-0:d',
+            ]
+        opts = list(maps or [])
+        for i in range(len(self.subtitles)):
+            opts.extend(['-map', '%d:0' % (len(self.media_inputs) + i)])
+        opts.extend(['-c', 'copy'])
+        opts.extend(self._options)
+        for i, (_, lang) in enumerate(self.subtitles):
+            opts.extend(['-metadata:s:s:%d' % i, 'language=%s' % lang])
+        if self.metadata_file:
+            opts.extend(['-map_metadata', '%d' % (len(self.inputs()) - 1)])
+        return opts
+
+    def run(self):
+        if not self.has_steps():
+            return
+        for message in self._messages:
+            self._pp._downloader.to_screen('[ffmpeg] ' + message)
+        temp_filename = prepend_extension(self.filepath, 'temp')
+        self._pp.run_ffmpeg_multiple_files(self.inputs(), temp_filename, self.options())
+        for fn in self.files_to_remove:
+            os.remove(encodeFilename(fn))
+        if self.filepath in self.media_inputs:
+            os.remove(encodeFilename(self.filepath))
+        os.rename(encodeFilename(temp_filename), encodeFilename(self.filepath))
+
+
 class FFmpegExtractAudioPP(FFmpegPostProcessor):
     def __init__(self, downloader=None, preferredcodec=None, preferredquality=None, nopostoverwrites=False):
         FFmpegPostProcessor.__init__(self, downloader)
@@ -370,6 +474,9 @@ class FFmpegVideoConvertorPP(FFmpegPostProcessor):
 
 class FFmpegEmbedSubtitlePP(FFmpegPostProcessor):
     def run(self, information):
+        return self._run_planned(information)
+
+    def plan(self, command, information):
         if information['ext'] not in ('mp4', 'webm', 'mkv'):
             self._downloader.to_screen('[ffmpeg] Subtitles can only be embedded in mp4, webm or mkv files')
             return [], information
@@ -398,36 +505,26 @@ class FFmpegEmbedSubtitlePP(FFmpegPostProcessor):
         if not sub_langs:
             return [], information
 
-        input_files = [filename] + sub_filenames
-
-        opts = [
-            '-map', '0',
-            '-c', 'copy',
-            # Don't copy the existing subtitles, we may be running the
-            # postprocessor a second time
-            '-map', '-0:s',
-            # Don't copy Apple TV chapters track, bin_data (see #19042, #19024,
-            # https://trac.ffmpeg.org/ticket/6016)
-            '-map', '-0:d',
-        ]
+        opts = []
         if information['ext'] == 'mp4':
             opts += ['-c:s', 'mov_text']
-        for (i, lang) in enumerate(sub_langs):
-            opts.extend(['-map', '%d:0' % (i + 1)])
-            lang_code = ISO639Utils.short2long(lang) or lang
-            opts.extend(['-metadata:s:s:%d' % i, 'language=%s' % lang_code])
+        for lang, sub_filename in zip(sub_langs, sub_filenames):
+            command.subtitles.append((sub_filename, ISO639Utils.short2long(lang) or lang))
 
-        temp_filename = prepend_extension(filename, 'temp')
-        self._downloader.to_screen('[ffmpeg] Embedding subtitles in \'%s\'' % filename)
-        self.run_ffmpeg_multiple_files(input_files, temp_filename, opts)
-        os.remove(encodeFilename(filename))
-        os.rename(encodeFilename(temp_filename), encodeFilename(filename))
+        command.add_step('Embedding subtitles in \'%s\'' % filename, opts)
 
         return sub_filenames, information
 
 
 class FFmpegMetadataPP(FFmpegPostProcessor):
     def run(self, info):
+        return self._run_planned(info)
+
+    def plan(self, command, info):
+        if command.metadata_file and info.get('chapters'):
+            # only one metadata file per pass
+            return None
+
         metadata = {}
 
         def add(meta_list, info_list=None):
@@ -470,14 +567,10 @@ class FFmpegMetadataPP(FFmpegPostProcessor):
             return [], info
 
         filename = info['filepath']
-        temp_filename = prepend_extension(filename, 'temp')
-        in_filenames = [filename]
         options = []
 
         if info['ext'] == 'm4a':
-            options.extend(['-vn', '-acodec', 'copy'])
-        else:
-            options.extend(['-c', 'copy'])
+            options.append('-vn')
 
         for (name, value) in metadata.items():
             options.extend(['-metadata', '%s=%s' % (name, value)])
@@ -498,28 +591,37 @@ class FFmpegMetadataPP(FFmpegPostProcessor):
                     if chapter_title:
                         metadata_file_content += 'title=%s\n' % ffmpeg_escape(chapter_title)
                 f.write(metadata_file_content)
-                in_filenames.append(metadata_filename)
-                options.extend(['-map_metadata', '1'])
+            command.metadata_file = metadata_filename
+            command.files_to_remove.append(metadata_filename)
 
-        self._downloader.to_screen('[ffmpeg] Adding metadata to \'%s\'' % filename)
-        self.run_ffmpeg_multiple_files(in_filenames, temp_filename, options)
-        if chapters:
-            os.remove(metadata_filename)
-        os.remove(encodeFilename(filename))
-        os.rename(encodeFilename(temp_filename), encodeFilename(filename))
+        command.add_step('Adding metadata to \'%s\'' % filename, options)
         return [], info
 
 
 class FFmpegMergerPP(FFmpegPostProcessor):
+    _MERGE_MAPS = ['-map', '0:v:0', '-map', '1:a:0']
+
     def run(self, info):
-        filename = info['filepath']
-        temp_filename = prepend_extension(filename, 'temp')
-        args = ['-c', 'copy', '-map', '0:v:0', '-map', '1:a:0']
-        self._downloader.to_screen('[ffmpeg] Merging formats into "%s"' % filename)
-        self.run_ffmpeg_multiple_files(info['__files_to_merge'], temp_filename, args)
-        os.rename(encodeFilename(temp_filename), encodeFilename(filename))
+        return self._run_planned(info)
+
+    def plan(self, command, info):
+        if command.has_steps():
+            # the merged file is the input of the next steps
+            return None
+        command.media_inputs = list(info['__files_to_merge'])
+        command.media_maps = list(self._MERGE_MAPS)
+        command.add_step('Merging formats into "%s"' % info['filepath'])
         return info['__files_to_merge'], info
 
+    def start_merge(self, input_paths, out_path):
+        """
+        Start merging input_paths into out_path, see
+        start_ffmpeg_multiple_files(); the inputs may be named pipes
+        that are written to while ffmpeg reads them
+        """
+        return self.start_ffmpeg_multiple_files(
+            input_paths, out_path, ['-c', 'copy'] + self._MERGE_MAPS)
+
     def can_merge(self):
         # TODO: figure out merge-capable ffmpeg version
         if self.basename != 'avconv':
@@ -540,53 +642,42 @@ class FFmpegMergerPP(FFmpegPostProcessor):
 
 class FFmpegFixupStretchedPP(FFmpegPostProcessor):
     def run(self, info):
+        return self._run_planned(info)
+
+    def plan(self, command, info):
         stretched_ratio = info.get('stretched_ratio')
         if stretched_ratio is None or stretched_ratio == 1:
             return [], info
 
-        filename = info['filepath']
-        temp_filename = prepend_extension(filename, 'temp')
-
-        options = ['-c', 'copy', '-aspect', '%f' % stretched_ratio]
-        self._downloader.to_screen('[ffmpeg] Fixing aspect ratio in "%s"' % filename)
-        self.run_ffmpeg(filename, temp_filename, options)
-
-        os.remove(encodeFilename(filename))
-        os.rename(encodeFilename(temp_filename), encodeFilename(filename))
+        command.add_step(
+            'Fixing aspect ratio in "%s"' % info['filepath'], ['-aspect', '%f' % stretched_ratio])
 
         return [], info
 
 
 class FFmpegFixupM4aPP(FFmpegPostProcessor):
     def run(self, info):
+        return self._run_planned(info)
+
+    def plan(self, command, info):
         if info.get('container') != 'm4a_dash':
             return [], info
 
-        filename = info['filepath']
-        temp_filename = prepend_extension(filename, 'temp')
-
-        options = ['-c', 'copy', '-f', 'mp4']
-        self._downloader.to_screen('[ffmpeg] Correcting container in "%s"' % filename)
-        self.run_ffmpeg(filename, temp_filename, options)
-
-        os.remove(encodeFilename(filename))
-        os.rename(encodeFilename(temp_filename), encodeFilename(filename))
+        command.add_step('Correcting container in "%s"' % info['filepath'], ['-f', 'mp4'])
 
         return [], info
 
 
 class FFmpegFixupM3u8PP(FFmpegPostProcessor):
     def run(self, info):
-        filename = info['filepath']
-        if self.get_audio_codec(filename) == 'aac':
-            temp_filename = prepend_extension(filename, 'temp')
-
-            options = ['-c', 'copy', '-f', 'mp4', '-bsf:a', 'aac_adtstoasc']
-            self._downloader.to_screen('[ffmpeg] Fixing malformed AAC bitstream in "%s"' % filename)
-            self.run_ffmpeg(filename, temp_filename, options)
-
-            os.remove(encodeFilename(filename))
-            os.rename(encodeFilename(temp_filename), encodeFilename(filename))
+        return self._run_planned(info)
+
+    def plan(self, command, info):
+        # the audio stream is the one of the last media input
+        if self.get_audio_codec(command.media_inputs[-1]) == 'aac':
+            command.add_step(
+                'Fixing malformed AAC bitstream in "%s"' % info['filepath'],
+                ['-f', 'mp4', '-bsf:a', 'aac_adtstoasc'])
         return [], info
 
 
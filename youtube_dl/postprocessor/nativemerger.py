@@ -0,0 +1,698 @@
+from __future__ import unicode_literals
+
+import os
+import struct
+
+from .common import PostProcessor
+from .ffmpeg import FFmpegMergerPP
+from ..compat import (
+    compat_open as open,
+    compat_Struct,
+)
+from ..downloader.ism import (
+    box,
+    s16,
+    u32,
+    u64,
+)
+from ..utils import (
+    encodeFilename,
+    PostProcessingError,
+    prepend_extension,
+)
+
+
+class NativeMergerError(PostProcessingError):
+    pass
+
+
+_COPY_SIZE = 1024 * 1024
+
+f32 = compat_Struct('>f')
+f64 = compat_Struct('>d')
+
+
+def _read_exactly(f, size):
+    data = f.read(size)
+    if len(data) != size:
+        raise NativeMergerError('unexpected end of file')
+    return data
+
+
+def _copy(src, dest, offset, size):
+    src.seek(offset)
+    while size > 0:
+        data = _read_exactly(src, min(size, _COPY_SIZE))
+        dest.write(data)
+        size -= len(data)
+
+
+def _get_uint(data, pos, size):
+    return (u64 if size == 8 else u32).unpack(bytes(data[pos:pos + size]))[0]
+
+
+def _set_uint(data, pos, size, value):
+    data[pos:pos + size] = (u64 if size == 8 else u32).pack(min(value, (1 << (8 * size)) - 1))
+
+
+# ISO base media file format (MP4)
+
+def _read_box_header(f):
+    """ Return (type, size) of the box at the position of f, or None at the end of the file """
+    header = f.read(8)
+    if not header:
+        return None
+    if len(header) != 8:
+        raise NativeMergerError('unexpected end of file')
+    size, box_type = u32.unpack(header[:4])[0], header[4:]
+    if size == 1:
+        size = u64.unpack(_read_exactly(f, 8))[0]
+    elif size == 0:
+        raise NativeMergerError('boxes extending to the end of the file are not supported')
+    return box_type, size
+
+
+def _box_header_size(data, start=0):
+    return 16 if _get_uint(data, start, 4) == 1 else 8
+
+
+def _iter_boxes(data, start, end=None):
+    """ Yield (type, start, payload start, end) of the boxes of data[start:end] """
+    end = len(data) if end is None else end
+    while start < end:
+        if end - start < 8:
+            raise NativeMergerError('invalid box')
+        size = _get_uint(data, start, 4)
+        header_size = _box_header_size(data, start)
+        if size == 1:
+            size = _get_uint(data, start + 8, 8)
+        if size < header_size or start + size > end:
+            raise NativeMergerError('invalid box')
+        yield bytes(data[start + 4:start + 8]), start, start + header_size, start + size
+        start += size
+
+
+def _find_box(data, path, start, end=None):
+    """ Return (payload start, end) of the box at path under data[start:end], or None """
+    for box_type, _, payload, box_end in _iter_boxes(data, start, end):
+        if box_type == path[0]:
+            return (payload, box_end) if len(path) == 1 else _find_box(data, path[1:], payload, box_end)
+    return None
+
+
+def _version_size(data, payload):
+    # size of the version dependent fields of a full box
+    return 8 if data[payload] == 1 else 4
+
+
+class _MP4Input(object):
+    """ A fragmented MP4 file with a single track """
+
+    def __init__(self, f):
+        self.f = f
+        self.ftyp = None
+        moov = None
+        pos = 0
+        while True:
+            f.seek(pos)
+            header = _read_box_header(f)
+            if header is None:
+                raise NativeMergerError('only fragmented MP4 files are supported')
+            box_type, size = header
+            if box_type == b'moof':
+                break
+            if box_type in (b'ftyp', b'moov'):
+                f.seek(pos)
+                data = bytearray(_read_exactly(f, size))
+                if box_type == b'ftyp':
+                    self.ftyp = data
+                else:
+                    moov = data
+            pos += size
+        self.first_moof = pos
+        if moov is None:
+            raise NativeMergerError('no movie box')
+
+        self.mvhd = self.mehd = self.trex = None
+        self.moov_boxes = []
+        traks, mvex = [], None
+        for box_type, start, _, end in _iter_boxes(moov, _box_header_size(moov)):
+            data = moov[start:end]
+            if box_type == b'mvhd':
+                self.mvhd = data
+            elif box_type == b'trak':
+                traks.append(data)
+            elif box_type == b'mvex':
+                mvex = data
+            else:
+                self.moov_boxes.append(data)
+        if self.mvhd is None or mvex is None or len(traks) != 1:
+            raise NativeMergerError('only fragmented MP4 files with a single track are supported')
+        self.trak = traks[0]
+        for box_type, start, _, end in _iter_boxes(mvex, _box_header_size(mvex)):
+            if box_type == b'mehd':
+                self.mehd = mvex[start:end]
+            elif box_type == b'trex':
+                self.trex = mvex[start:end]
+        if self.trex is None:
+            raise NativeMergerError('no track extends box')
+
+        p = _box_header_size(self.mvhd)
+        n = _version_size(self.mvhd, p)
+        self.movie_timescale = _get_uint(self.mvhd, p + 4 + 2 * n, 4)
+        self.duration = _get_uint(self.mvhd, p + 8 + 2 * n, n)
+        if self.mehd is not None:
+            p = _box_header_size(self.mehd)
+            self.duration = max(self.duration, _get_uint(self.mehd, p + 4, _version_size(self.mehd, p)))
+        if not self.movie_timescale:
+            raise NativeMergerError('invalid movie timescale')
+
+        mdhd = _find_box(self.trak, [b'mdia', b'mdhd'], _box_header_size(self.trak))
+        hdlr = _find_box(self.trak, [b'mdia', b'hdlr'], _box_header_size(self.trak))
+        if mdhd is None or hdlr is None:
+            raise NativeMergerError('invalid track box')
+        self.timescale = _get_uint(self.trak, mdhd[0] + 4 + 2 * _version_size(self.trak, mdhd[0]), 4)
+        self.handler = bytes(self.trak[hdlr[0] + 8:hdlr[0] + 12])
+        if not self.timescale:
+            raise NativeMergerError('invalid track timescale')
+
+    def renumbered_trak(self, track_id, movie_timescale):
+        """ Return the track box with track_id, and durations in movie_timescale """
+        trak = bytearray(self.trak)
+
+        def rescale(value):
+            return value * movie_timescale // self.movie_timescale
+
+        tkhd = _find_box(trak, [b'tkhd'], _box_header_size(trak))
+        if tkhd is None:
+            raise NativeMergerError('invalid track box')
+        p = tkhd[0]
+        n = _version_size(trak, p)
+        _set_uint(trak, p + 4 + 2 * n, 4, track_id)
+        _set_uint(trak, p + 12 + 2 * n, n, rescale(_get_uint(trak, p + 12 + 2 * n, n)))
+
+        # edit list segment durations are in the movie timescale too
+        elst = _find_box(trak, [b'edts', b'elst'], _box_header_size(trak))
+        if elst is not None:
+            p = elst[0]
+            n = _version_size(trak, p)
+            for i in range(_get_uint(trak, p + 4, 4)):
+                pos = p + 8 + i * (2 * n + 4)
+                _set_uint(trak, pos, n, rescale(_get_uint(trak, pos, n)))
+        return trak
+
+    def renumbered_trex(self, track_id):
+        trex = bytearray(self.trex)
+        _set_uint(trex, _box_header_size(trex) + 4, 4, track_id)
+        return trex
+
+    def fragments(self):
+        """ Yield (decode time in seconds, moof box, mdat offset, mdat size) of the movie fragments """
+        f = self.f
+        pos = self.first_moof
+        while True:
+            f.seek(pos)
+            header = _read_box_header(f)
+            if header is None:
+                return
+            box_type, size = header
+            if box_type != b'moof':
+                # e.g. segment indexes, which would be invalid
+                pos += size
+                continue
+            f.seek(pos)
+            moof = bytearray(_read_exactly(f, size))
+            mdat = _read_box_header(f)
+            if mdat is None or mdat[0] != b'mdat':
+                raise NativeMergerError('movie fragment without media data')
+            yield self._decode_time(moof), moof, pos + size, mdat[1]
+            pos += size + mdat[1]
+
+    def _decode_time(self, moof):
+        times = []
+        for box_type, _, payload, end in _iter_boxes(moof, _box_header_size(moof)):
+            if box_type != b'traf':
+                continue
+            tfhd = _find_box(moof, [b'tfhd'], payload, end)
+            tfdt = _find_box(moof, [b'tfdt'], payload, end)
+            if tfhd is None or tfdt is None:
+                raise NativeMergerError('movie fragments without decode time are not supported')
+            # data offsets must be relative to the moof box, which is moved
+            if _get_uint(moof, tfhd[0], 4) & 0x1:
+                raise NativeMergerError('movie fragments with base data offsets are not supported')
+            times.append(_get_uint(moof, tfdt[0] + 4, _version_size(moof, tfdt[0])))
+        if not times:
+            raise NativeMergerError('empty movie fragment')
+        return min(times) / float(self.timescale)
+
+    @staticmethod
+    def renumber_moof(moof, sequence_number, track_id):
+        for box_type, _, payload, end in _iter_boxes(moof, _box_header_size(moof)):
+            if box_type == b'mfhd':
+                _set_uint(moof, payload + 4, 4, sequence_number)
+            elif box_type == b'traf':
+                tfhd = _find_box(moof, [b'tfhd'], payload, end)
+                _set_uint(moof, tfhd[0] + 4, 4, track_id)
+
+
+def _merge_mp4(files, out):
+    inputs = [_MP4Input(f) for f in files]
+    if [inp.handler for inp in inputs] != [b'vide', b'soun']:
+        raise NativeMergerError('only a video and an audio track can be merged')
+    video = inputs[0]
+    movie_timescale = video.movie_timescale
+    duration = max(inp.duration * movie_timescale // inp.movie_timescale for inp in inputs)
+
+    mvhd = bytearray(video.mvhd)
+    p = _box_header_size(mvhd)
+    n = _version_size(mvhd, p)
+    _set_uint(mvhd, p + 8 + 2 * n, n, duration)
+    _set_uint(mvhd, len(mvhd) - 4, 4, len(inputs) + 1)  # next track id
+    mvex = b''
+    if video.mehd is not None:
+        mehd = bytearray(video.mehd)
+        p = _box_header_size(mehd)
+        _set_uint(mehd, p + 4, _version_size(mehd, p), duration)
+        mvex += bytes(mehd)
+    mvex += b''.join(bytes(inp.renumbered_trex(i)) for i, inp in enumerate(inputs, 1))
+
+    if video.ftyp is not None:
+        out.write(bytes(video.ftyp))
+    out.write(box(b'moov', (
+        bytes(mvhd)
+        + b''.join(bytes(inp.renumbered_trak(i, movie_timescale)) for i, inp in enumerate(inputs, 1))
+        + box(b'mvex', mvex)
+        + b''.join(bytes(data) for data in video.moov_boxes))))
+
+    # Interleave the fragments by decode time
+    fragments = [inp.fragments() for inp in inputs]
+    heads = [next(it, None) for it in fragments]
+    sequence_number = 0
+    while True:
+        pending = [(head[0], i) for i, head in enumerate(heads) if head is not None]
+        if not pending:
+            break
+        _, i = min(pending)
+        _, moof, mdat_offset, mdat_size = heads[i]
+        sequence_number += 1
+        _MP4Input.renumber_moof(moof, sequence_number, i + 1)
+        out.write(bytes(moof))
+        _copy(inputs[i].f, out, mdat_offset, mdat_size)
+        heads[i] = next(fragments[i], None)
+
+
+# Matroska and WebM
+
+_EBML = 0x1A45DFA3
+_DOC_TYPE = 0x4282
+_VOID = 0xEC
+_SEGMENT = 0x18538067
+_SEEK_HEAD = 0x114D9B74
+_SEEK = 0x4DBB
+_SEEK_ID = 0x53AB
+_SEEK_POSITION = 0x53AC
+_INFO = 0x1549A966
+_TIMECODE_SCALE = 0x2AD7B1
+_DURATION = 0x4489
+_MUXING_APP = 0x4D80
+_WRITING_APP = 0x5741
+_TRACKS = 0x1654AE6B
+_TRACK_ENTRY = 0xAE
+_TRACK_NUMBER = 0xD7
+_TRACK_UID = 0x73C5
+_TRACK_TYPE = 0x83
+_CLUSTER = 0x1F43B675
+_TIMECODE = 0xE7
+_SIMPLE_BLOCK = 0xA3
+_BLOCK_GROUP = 0xA0
+_BLOCK = 0xA1
+_REFERENCE_BLOCK = 0xFB
+_CUES = 0x1C53BB6B
+_CUE_POINT = 0xBB
+_CUE_TIME = 0xB3
+_CUE_TRACK_POSITIONS = 0xB7
+_CUE_TRACK = 0xF7
+_CUE_CLUSTER_POSITION = 0xF1
+
+_MAX_CLUSTER_SIZE = 5 * 1024 * 1024
+
+
+def _vint_length(first_byte):
+    for length in range(1, 9):
+        if first_byte & (0x100 >> length):
+            return length
+    raise NativeMergerError('invalid EBML variable size integer')
+
+
+def _parse_vint(data, pos, keep_marker=False):
+    """ Return (value, position after it) of the variable size integer at data[pos], value is None if unknown """
+    length = _vint_length(data[pos])
+    if pos + length > len(data):
+        raise NativeMergerError('invalid EBML variable size integer')
+    value = data[pos] if keep_marker else data[pos] & ((0x100 >> length) - 1)
+    for b in data[pos + 1:pos + length]:
+        value = (value << 8) | b
+    if not keep_marker and value == (1 << (7 * length)) - 1:
+        value = None
+    return value, pos + length
+
+
+def _read_element_header(f):
+    """ Return (id, size) of the element at the position of f, or None at the end of the file """
+    header = bytearray()
+    for _ in range(2):
+        first = f.read(1)
+        if not first:
+            if header:
+                raise NativeMergerError('unexpected end of file')
+            return None
+        header += first
+        header += _read_exactly(f, _vint_length(header[-1]) - 1)
+    element_id, pos = _parse_vint(header, 0, keep_marker=True)
+    return element_id, _parse_vint(header, pos)[0]
+
+
+def _iter_elements(data, start=0, end=None):
+    """ Yield (id, start, payload start, end) of the elements of data[start:end] """
+    end = len(data) if end is None else end
+    while start < end:
+        element_id, pos = _parse_vint(data, start, keep_marker=True)
+        size, pos = _parse_vint(data, pos)
+        if size is None or pos + size > end:
+            raise NativeMergerError('invalid EBML element')
+        yield element_id, start, pos, pos + size
+        start = pos + size
+
+
+def _uint_bytes(value, length=None):
+    data = bytearray()
+    while value or not data or (length and len(data) < length):
+        data.insert(0, value & 0xff)
+        value >>= 8
+    return bytes(data)
+
+
+def _ebml_size(size, length=None):
+    if length is None:
+        length = 1
+        while size >= (1 << (7 * length)) - 1:
+            length += 1
+    return _uint_bytes(size | (1 << (7 * length)), length)
+
+
+def _ebml_element(element_id, payload, size_length=None):
+    return _uint_bytes(element_id) + _ebml_size(len(payload), size_length) + bytes(payload)
+
+
+def _ebml_uint(element_id, value, length=None):
+    return _ebml_element(element_id, _uint_bytes(value, length))
+
+
+def _read_uint(data, start, end):
+    value = 0
+    for b in data[start:end]:
+        value = (value << 8) | b
+    return value
+
+
+def _read_float(data, start, end):
+    if end - start == 4:
+        return f32.unpack(bytes(data[start:end]))[0]
+    if end - start == 8:
+        return f64.unpack(bytes(data[start:end]))[0]
+    return 0.0
+
+
+class _MatroskaInput(object):
+    """ A Matroska or WebM file with a single track """
+
+    def __init__(self, f):
+        self.f = f
+        header = _read_element_header(f)
+        if header is None or header[0] != _EBML or header[1] is None:
+            raise NativeMergerError('not a Matroska file')
+        ebml = bytearray(_read_exactly(f, header[1]))
+        self.ebml_elements = [
+            (element_id, ebml[payload:end]) for element_id, _, payload, end in _iter_elements(ebml)]
+        self.doc_type = next((
+            bytes(payload).decode('ascii', 'replace') for element_id, payload in self.ebml_elements
+            if element_id == _DOC_TYPE), 'matroska')
+
+        header = _read_element_header(f)
+        if header is None or header[0] != _SEGMENT:
+            raise NativeMergerError('no segment')
+        self.segment_end = None if header[1] is None else f.tell() + header[1]
+
+        self.timecode_scale, self.duration = 1000000, None
+        self.track_entry = self.first_cluster = None
+        while self.segment_end is None or f.tell() < self.segment_end:
+            start = f.tell()
+            header = _read_element_header(f)
+            if header is None:
+                break
+            element_id, size = header
+            if element_id == _CLUSTER:
+                self.first_cluster = start
+                break
+            if size is None:
+                raise NativeMergerError('elements of unknown size are not supported')
+            if element_id == _INFO:
+                self._parse_info(bytearray(_read_exactly(f, size)))
+            elif element_id == _TRACKS:
+                self._parse_tracks(bytearray(_read_exactly(f, size)))
+            else:
+                f.seek(size, os.SEEK_CUR)
+        if self.track_entry is None or self.first_cluster is None:
+            raise NativeMergerError('no track or no cluster')
+
+    def _parse_info(self, info):
+        for element_id, _, payload, end in _iter_elements(info):
+            if element_id == _TIMECODE_SCALE:
+                self.timecode_scale = _read_uint(info, payload, end)
+            elif element_id == _DURATION:
+                self.duration = _read_float(info, payload, end)
+
+    def _parse_tracks(self, tracks):
+        entries = [tracks[payload:end] for element_id, _, payload, end in _iter_elements(tracks)
+                   if element_id == _TRACK_ENTRY]
+        if len(entries) != 1:
+            raise NativeMergerError('only Matroska files with a single track are supported')
+        self.track_entry = entries[0]
+        self.track_number = self.track_uid = self.track_type = None
+        for element_id, _, payload, end in _iter_elements(self.track_entry):
+            if element_id == _TRACK_NUMBER:
+                self.track_number = _read_uint(self.track_entry, payload, end)
+            elif element_id == _TRACK_UID:
+                self.track_uid = _read_uint(self.track_entry, payload, end)
+            elif element_id == _TRACK_TYPE:
+                self.track_type = _read_uint(self.track_entry, payload, end)
+
+    def renumbered_track_entry(self, track_number, track_uid):
+        return _ebml_element(_TRACK_ENTRY, b''.join(
+            _ebml_uint(_TRACK_NUMBER, track_number) if element_id == _TRACK_NUMBER
+            else _ebml_uint(_TRACK_UID, track_uid) if element_id == _TRACK_UID
+            else bytes(self.track_entry[start:end])
+            for element_id, start, _, end in _iter_elements(self.track_entry)))
+
+    def blocks(self):
+        """ Yield (timecode, keyframe, element id, payload) of the blocks and block groups """
+        f = self.f
+        pos = self.first_cluster
+        while self.segment_end is None or pos < self.segment_end:
+            f.seek(pos)
+            header = _read_element_header(f)
+            if header is None:
+                return
+            element_id, size = header
+            if size is None:
+                raise NativeMergerError('elements of unknown size are not supported')
+            pos = f.tell() + size
+            if element_id != _CLUSTER:
+                continue
+            # Only a cluster at a time is kept in memory
+            cluster = bytearray(_read_exactly(f, size))
+            cluster_timecode = 0
+            for element_id, _, payload, end in _iter_elements(cluster):
+                if element_id == _TIMECODE:
+                    cluster_timecode = _read_uint(cluster, payload, end)
+                elif element_id == _SIMPLE_BLOCK:
+                    block = cluster[payload:end]
+                    timecode, flags = self._parse_block(block)
+                    if timecode is not None:
+                        yield cluster_timecode + timecode, bool(flags & 0x80), element_id, block
+                elif element_id == _BLOCK_GROUP:
+                    group = cluster[payload:end]
+                    timecode, keyframe = None, True
+                    for child_id, _, child_payload, child_end in _iter_elements(group):
+                        if child_id == _BLOCK:
+                            timecode = self._parse_block(group[child_payload:child_end])[0]
+                        elif child_id == _REFERENCE_BLOCK:
+                            keyframe = False
+                    if timecode is not None:
+                        yield cluster_timecode + timecode, keyframe, element_id, group
+
+    def _parse_block(self, block):
+        """ Return (relative timecode, flags) of a block of the track, or (None, None) """
+        track_number, pos = _parse_vint(block, 0)
+        if track_number != self.track_number:
+            return None, None
+        return s16.unpack(bytes(block[pos:pos + 2]))[0], block[pos + 2]
+
+
+def _renumber_block(block, track_number, timecode):
+    pos = _parse_vint(block, 0)[1]
+    return _ebml_size(track_number) + s16.pack(timecode) + bytes(block[pos + 2:])
+
+
+def _renumbered_block_element(element_id, payload, track_number, timecode):
+    if element_id == _SIMPLE_BLOCK:
+        return _ebml_element(_SIMPLE_BLOCK, _renumber_block(payload, track_number, timecode))
+    return _ebml_element(_BLOCK_GROUP, b''.join(
+        _ebml_element(_BLOCK, _renumber_block(payload[child_payload:end], track_number, timecode))
+        if child_id == _BLOCK else bytes(payload[start:end])
+        for child_id, start, child_payload, end in _iter_elements(payload)))
+
+
+def _seek_head(positions):
+    return _ebml_element(_SEEK_HEAD, b''.join(
+        _ebml_element(_SEEK, _ebml_element(_SEEK_ID, _uint_bytes(element_id))
+                      + _ebml_uint(_SEEK_POSITION, position, 8))
+        for element_id, position in positions))
+
+
+def _merge_matroska(files, out, doc_type):
+    inputs = [_MatroskaInput(f) for f in files]
+    if [inp.track_type for inp in inputs] != [1, 2]:
+        raise NativeMergerError('only a video and an audio track can be merged')
+    if doc_type == 'webm' and any(inp.doc_type != 'webm' for inp in inputs):
+        raise NativeMergerError('only WebM files can be merged into a WebM file')
+    timecode_scale = inputs[0].timecode_scale
+    if any(inp.timecode_scale != timecode_scale for inp in inputs):
+        raise NativeMergerError('the timecode scales of the files differ')
+
+    out.write(_ebml_element(_EBML, b''.join(
+        _ebml_element(element_id, doc_type.encode('ascii') if element_id == _DOC_TYPE else payload)
+        for element_id, payload in inputs[0].ebml_elements)))
+    out.write(_uint_bytes(_SEGMENT))
+    segment_size_pos = out.tell()
+    out.write(_ebml_size(0, 8))
+    segment_start = out.tell()
+
+    # The positions of the level 1 elements are only known at the end
+    out.write(_seek_head([(_INFO, 0), (_TRACKS, 0), (_CUES, 0)]))
+    positions = [(_INFO, out.tell() - segment_start)]
+    info = _ebml_uint(_TIMECODE_SCALE, timecode_scale)
+    info += _ebml_element(_MUXING_APP, b'youtube-dl') + _ebml_element(_WRITING_APP, b'youtube-dl')
+    durations = [inp.duration for inp in inputs if inp.duration is not None]
+    if durations:
+        info += _ebml_element(_DURATION, f64.pack(max(durations)))
+    out.write(_ebml_element(_INFO, info))
+    positions.append((_TRACKS, out.tell() - segment_start))
+    uids = [inp.track_uid for inp in inputs]
+    out.write(_ebml_element(_TRACKS, b''.join(
+        inp.renumbered_track_entry(i, inp.track_uid if uids.count(inp.track_uid) == 1 else i)
+        for i, inp in enumerate(inputs, 1))))
+
+    # Interleave the blocks by timecode in new clusters, each video keyframe
+    # starting a cluster that is indexed in the cues
+    cues = []
+    cluster = {'blocks': [], 'size': 0}
+
+    def flush_cluster():
+        if not cluster['blocks']:
+            return
+        if cluster['keyframe']:
+            cues.append((cluster['timecode'], out.tell() - segment_start))
+        out.write(_ebml_element(_CLUSTER, _ebml_uint(_TIMECODE, cluster['timecode']) + b''.join(cluster['blocks'])))
+        cluster.update({'blocks': [], 'size': 0})
+
+    blocks = [inp.blocks() for inp in inputs]
+    heads = [next(it, None) for it in blocks]
+    while True:
+        pending = [(head[0], i) for i, head in enumerate(heads) if head is not None]
+        if not pending:
+            break
+        _, i = min(pending)
+        timecode, keyframe, element_id, payload = heads[i]
+        video_keyframe = i == 0 and keyframe
+        if (not cluster['blocks'] or video_keyframe or cluster['size'] >= _MAX_CLUSTER_SIZE
+                or not -0x8000 <= timecode - cluster['timecode'] < 0x8000):
+            flush_cluster()
+            cluster.update({'timecode': max(timecode, 0), 'keyframe': video_keyframe})
+        element = _renumbered_block_element(element_id, payload, i + 1, timecode - cluster['timecode'])
+        cluster['blocks'].append(element)
+        cluster['size'] += len(element)
+        heads[i] = next(blocks[i], None)
+    flush_cluster()
+
+    if cues:
+        positions.append((_CUES, out.tell() - segment_start))
+        out.write(_ebml_element(_CUES, b''.join(
+            _ebml_element(_CUE_POINT, _ebml_uint(_CUE_TIME, timecode) + _ebml_element(
+                _CUE_TRACK_POSITIONS, _ebml_uint(_CUE_TRACK, 1) + _ebml_uint(_CUE_CLUSTER_POSITION, position)))
+            for timecode, position in cues)))
+    segment_size = out.tell() - segment_start
+
+    out.seek(segment_size_pos)
+    out.write(_ebml_size(segment_size, 8))
+    seek_head = _seek_head(positions)
+    out.write(seek_head)
+    if not cues:
+        # fill the space of the missing entry
+        out.write(_ebml_element(_VOID, b'\0' * (len(_seek_head([(_CUES, 0)] * 3)) - len(seek_head) - 2)))
+
+
+def merge_files(filenames, out_filename):
+    """
+    Merge the single track MP4 or Matroska files filenames, a video and an
+    audio file, into out_filename without transcoding, or raise
+    NativeMergerError if they are not supported
+    """
+    ext = os.path.splitext(out_filename)[1][1:].lower()
+    files = [open(encodeFilename(fn), 'rb') for fn in filenames]
+    try:
+        magics = [f.read(8) for f in files]
+        for f in files:
+            f.seek(0)
+        with open(encodeFilename(out_filename), 'wb') as out:
+            try:
+                if all(magic[4:8] == b'ftyp' for magic in magics) and ext in ('mp4', 'm4a', 'm4v', 'mov'):
+                    _merge_mp4(files, out)
+                elif all(magic[:4] == b'\x1a\x45\xdf\xa3' for magic in magics) and ext in ('webm', 'mkv', 'mka'):
+                    _merge_matroska(files, out, 'webm' if ext == 'webm' else 'matroska')
+                else:
+                    raise NativeMergerError('unsupported file types')
+            except (IndexError, struct.error):
+                raise NativeMergerError('invalid file')
+    except Exception:
+        if os.path.exists(encodeFilename(out_filename)):
+            os.remove(encodeFilename(out_filename))
+        raise
+    finally:
+        for f in files:
+            f.close()
+
+
+class NativeMergerPP(PostProcessor):
+    """
+    Merge a video and an audio format without running ffmpeg when they are
+    fragmented MP4 or Matroska/WebM files, falling back to FFmpegMergerPP
+    """
+
+    def run(self, info):
+        filename = info['filepath']
+        temp_filename = prepend_extension(filename, 'temp')
+        try:
+            merge_files(info['__files_to_merge'], temp_filename)
+        except (NativeMergerError, IOError, OSError) as err:
+            merger = FFmpegMergerPP(self._downloader)
+            if not merger.available:
+                self._downloader.report_warning(
+                    'Unable to merge the formats natively: %s. ffmpeg or avconv are not installed, '
+                    'the formats won\'t be merged.' % err)
+                return [], info
+            self._downloader.to_screen('[merger] Unable to merge the formats natively: %s' % err)
+            return merger.run(info)
+        self._downloader.to_screen('[merger] Merged formats into "%s"' % filename)
+        os.rename(encodeFilename(temp_filename), encodeFilename(filename))
+        return info['__files_to_merge'], info
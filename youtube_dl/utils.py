@@ -26,6 +26,7 @@ import os
 import platform
 import random
 import re
+import select
 import socket
 import ssl
 import subprocess
@@ -69,6 +70,7 @@ from .compat import (
     compat_str,
     compat_struct_pack,
     compat_struct_unpack,
+    compat_thread,
     compat_urllib_error,
     compat_urllib_HTTPError,
     compat_urllib_parse,
@@ -85,6 +87,16 @@ from .socks import (
     sockssocket,
 )
 
+try:
+    from collections import OrderedDict as _OrderedDict
+except ImportError:  # Python 2.6
+    from .compat import compat_dict as _OrderedDict
+
+try:
+    import threading
+except ImportError:
+    threading = None
+
 
 def register_socks_protocols():
     # "Register" SOCKS protocols
@@ -1885,9 +1897,11 @@ class partial_application(object):
             return (fn_args.args or [])[:-n_defaults if n_defaults > 0 else None]
 
     def __new__(cls, func):
+        required_args = cls.required_args(func)
+
         @functools.wraps(func)
         def wrapped(*args, **kwargs):
-            if set(cls.required_args(func)[len(args):]).difference(kwargs):
+            if set(required_args[len(args):]).difference(kwargs):
                 return functools.partial(func, *args, **kwargs)
             return func(*args, **kwargs)
 
@@ -2507,6 +2521,11 @@ class PostProcessingError(YoutubeDLError):
         self.msg = msg
 
 
+class DownloadCancelled(YoutubeDLError):
+    """ A download was stopped by FileDownloader.cancel() """
+    pass
+
+
 class MaxDownloadsReached(YoutubeDLError):
     """ --max-downloads limit has been reached. """
     pass
@@ -2623,6 +2642,197 @@ def _create_http_connection(ydl_handler, http_class, is_https, *args, **kwargs):
     return hc
 
 
+class LRUCache(object):
+    """Bounded least recently used cache, safe to use from several threads"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._lock = compat_thread.allocate_lock()
+        self._entries = _OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._entries.pop(key)
+            except KeyError:
+                return default
+            self._entries[key] = value
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = value
+            if len(self._entries) > self.maxsize:
+                del self._entries[next(iter(self._entries))]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class HTTPConnectionPool(object):
+    """
+    Pool of idle persistent HTTP(S) connections
+
+    Connections are keyed by everything that identifies the remote end
+    (scheme, host, proxy, ...). At most max_idle connections are kept for a
+    key and connections idle for more than idle_timeout seconds are closed
+    rather than reused.
+    """
+
+    def __init__(self, max_idle=8, idle_timeout=30):
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self._lock = compat_thread.allocate_lock()
+        self._idle = {}
+
+    @staticmethod
+    def _is_dropped(conn):
+        # An idle connection should have nothing to read: anything readable
+        # means that the server has closed it (or sent garbage)
+        sock = conn.sock
+        if sock is None:
+            return True
+        try:
+            return bool(select.select([sock], [], [], 0)[0])
+        except (ValueError, select.error, socket.error):
+            return True
+
+    def get(self, key):
+        """Return an idle connection for key or None"""
+        now = time.time()
+        with self._lock:
+            conns = self._idle.get(key) or []
+            while conns:
+                conn, released = conns.pop()
+                if now - released <= self.idle_timeout and not self._is_dropped(conn):
+                    return conn
+                conn.close()
+
+    def put(self, key, conn):
+        """Return a connection whose response has been read completely"""
+        if not self.max_idle or conn.sock is None:
+            conn.close()
+            return
+        with self._lock:
+            conns = self._idle.setdefault(key, [])
+            conns.append((conn, time.time()))
+            while len(conns) > self.max_idle:
+                conns.pop(0)[0].close()
+
+    def clear(self):
+        with self._lock:
+            for conns in self._idle.values():
+                for conn, _ in conns:
+                    conn.close()
+            self._idle.clear()
+
+
+class _PooledHTTPResponse(compat_http_client.HTTPResponse):
+    _ytdl_release = None
+
+    def _close_conn(self):
+        # Called when the body has been read to the end and on close():
+        # the connection may only be reused in the former case
+        reusable = not (self.will_close or self.closed or self.length)
+        compat_http_client.HTTPResponse._close_conn(self)
+        release, self._ytdl_release = self._ytdl_release, None
+        if release:
+            release(reusable)
+
+
+def _keepalive_do_open(handler, http_class, req, pool_key, **http_conn_args):
+    """
+    Like AbstractHTTPHandler.do_open() but using a persistent connection
+    from handler's connection pool, the connection is returned to the pool
+    once the response has been read.
+    """
+    pool = handler._conn_pool
+    if not req.host:
+        raise compat_urllib_error.URLError('no host given')
+
+    headers = dict(req.unredirected_hdrs)
+    headers.update((k, v) for k, v in req.headers.items() if k not in headers)
+    headers = dict((name.title(), val) for name, val in headers.items())
+
+    tunnel_headers = {}
+    if req._tunnel_host:
+        proxy_auth_hdr = 'Proxy-Authorization'
+        if proxy_auth_hdr in headers:
+            # Proxy-Authorization should not be sent to origin server
+            tunnel_headers[proxy_auth_hdr] = headers.pop(proxy_auth_hdr)
+    pool_key += (req.host, req._tunnel_host, tunnel_headers.get('Proxy-Authorization'))
+
+    # A request can be replayed on a new connection if the reused one turns
+    # out to have been closed by the server, unless it is not idempotent and
+    # was sent: the server may have processed it before closing
+    replayable = req.data is None or isinstance(req.data, bytes)
+    idempotent = req.get_method() in ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE', 'TRACE')
+
+    while True:
+        h = pool.get(pool_key)
+        reused = h is not None
+        if reused:
+            h.timeout = req.timeout
+            h.sock.settimeout(req.timeout)
+        else:
+            h = http_class(req.host, timeout=req.timeout, **http_conn_args)
+            if req._tunnel_host:
+                h.set_tunnel(req._tunnel_host, headers=tunnel_headers)
+        h.set_debuglevel(handler._debuglevel)
+        h.response_class = _PooledHTTPResponse
+
+        sent = False
+        try:
+            try:
+                h.request(req.get_method(), req.selector, req.data, headers,
+                          encode_chunked=req.has_header('Transfer-encoding'))
+            except socket.error as err:
+                if not (reused and replayable):
+                    raise compat_urllib_error.URLError(err)
+                raise
+            sent = True
+            r = h.getresponse()
+        except (socket.error, compat_http_client.HTTPException) as err:
+            h.close()
+            if (reused and replayable and (idempotent or not sent)
+                    and not isinstance(err, (socket.timeout, compat_urllib_error.URLError))):
+                continue
+            raise
+        except BaseException:
+            h.close()
+            raise
+        break
+
+    def release(reusable):
+        if reusable:
+            pool.put(pool_key, h)
+        else:
+            h.close()
+
+    r._ytdl_release = release
+    r.url = req.get_full_url()
+    r.msg = r.reason
+    return r
+
+
+def _make_connection_pool(params):
+    # HTTP(S)Connection.request() only supports encode_chunked since 3.6
+    if sys.version_info < (3, 6):
+        return None
+    pool_size = params.get('connection_pool_size')
+    if pool_size == 0:
+        return None
+    idle_timeout = params.get('connection_idle_timeout')
+    return HTTPConnectionPool(
+        8 if pool_size is None else pool_size,
+        30 if idle_timeout is None else idle_timeout)
+
+
 def handle_youtubedl_headers(headers):
     filtered_headers = headers
 
@@ -2655,6 +2865,7 @@ class YoutubeDLHandler(compat_urllib_request.HTTPHandler):
     def __init__(self, params, *args, **kwargs):
         compat_urllib_request.HTTPHandler.__init__(self, *args, **kwargs)
         self._params = params
+        self._conn_pool = _make_connection_pool(params)
 
     def http_open(self, req):
         conn_class = compat_http_client.HTTPConnection
@@ -2664,9 +2875,11 @@ class YoutubeDLHandler(compat_urllib_request.HTTPHandler):
             conn_class = make_socks_conn_class(conn_class, socks_proxy)
             del req.headers['Ytdl-socks-proxy']
 
-        return self.do_open(functools.partial(
-            _create_http_connection, self, conn_class, False),
-            req)
+        http_class = functools.partial(
+            _create_http_connection, self, conn_class, False)
+        if self._conn_pool:
+            return _keepalive_do_open(self, http_class, req, ('http', socks_proxy))
+        return self.do_open(http_class, req)
 
     @staticmethod
     def deflate_gz(data):
@@ -2912,6 +3125,7 @@ class YoutubeDLHTTPSHandler(compat_urllib_request.HTTPSHandler):
         compat_urllib_request.HTTPSHandler.__init__(self, *args, **kwargs)
         self._https_conn_class = https_conn_class or compat_http_client.HTTPSConnection
         self._params = params
+        self._conn_pool = _make_connection_pool(params)
 
     def https_open(self, req):
         kwargs = {}
@@ -2927,9 +3141,11 @@ class YoutubeDLHTTPSHandler(compat_urllib_request.HTTPSHandler):
             conn_class = make_socks_conn_class(conn_class, socks_proxy)
             del req.headers['Ytdl-socks-proxy']
 
-        return self.do_open(functools.partial(
-            _create_http_connection, self, conn_class, True),
-            req, **kwargs)
+        http_class = functools.partial(
+            _create_http_connection, self, conn_class, True)
+        if self._conn_pool:
+            return _keepalive_do_open(self, http_class, req, ('https', socks_proxy), **kwargs)
+        return self.do_open(http_class, req, **kwargs)
 
 
 class YoutubeDLCookieJar(compat_cookiejar.MozillaCookieJar):
@@ -3552,12 +3768,12 @@ else:
 
 class locked_file(object):
     def __init__(self, filename, mode, encoding=None):
-        assert mode in ['r', 'a', 'w']
+        assert mode in ['r', 'rb', 'a', 'w']
         self.f = io.open(filename, mode, encoding=encoding)
         self.mode = mode
 
     def __enter__(self):
-        exclusive = self.mode != 'r'
+        exclusive = self.mode[0] != 'r'
         try:
             _lock_file(self.f, exclusive)
         except IOError:
@@ -3580,6 +3796,9 @@ class locked_file(object):
     def read(self, *args):
         return self.f.read(*args)
 
+    def seek(self, *args):
+        return self.f.seek(*args)
+
 
 def get_filesystem_encoding():
     encoding = sys.getfilesystemencoding()
@@ -4146,90 +4365,165 @@ class LazyList(compat_collections_abc.Iterable):
 
 
 class PagedList(object):
+    """
+    A list fetched one page at a time by pagefunc(pagenum)
+
+    Extractors whose pagefunc is thread-safe may pass a prefetch count: up
+    to that many pages after the one being consumed are then fetched in
+    background threads. The prefetch argument of iterslice() and getslice()
+    only changes this count for such lists.
+    """
+
     def __len__(self):
         # This is only useful for tests
         return len(self.getslice())
 
+    def getslice(self, start=0, end=None, prefetch=None):
+        return list(self.iterslice(start, end, prefetch))
+
+    def _fetch_page(self, pagenum):
+        return list(self._pagefunc(pagenum))
+
+    def _iter_pages(self, pagenums, prefetch):
+        """
+        Yield the pages of pagenums, fetching up to prefetch pages ahead
+
+        When the generator is closed, no further page is fetched and the
+        pages being fetched are waited for, their results being discarded.
+        """
+        if prefetch is None or not self._prefetch:
+            prefetch = self._prefetch
+        pagenums = iter(pagenums)
+        if not prefetch or not threading:
+            for pagenum in pagenums:
+                yield self._fetch_page(pagenum)
+            return
+
+        def fetch(pagenum):
+            job = {}
+
+            def run():
+                try:
+                    job['page'] = self._fetch_page(pagenum)
+                except Exception:
+                    job['exc_info'] = sys.exc_info()
+
+            job['thread'] = threading.Thread(target=run)
+            job['thread'].daemon = True
+            job['thread'].start()
+            return job
+
+        window = collections.deque()
+        try:
+            while True:
+                for pagenum in itertools.islice(pagenums, prefetch + 1 - len(window)):
+                    window.append(fetch(pagenum))
+                if not window:
+                    return
+                job = window.popleft()
+                job['thread'].join()
+                if 'exc_info' in job:
+                    raise job['exc_info'][1]
+                yield job['page']
+        finally:
+            for job in window:
+                job['thread'].join()
+
 
 class OnDemandPagedList(PagedList):
-    def __init__(self, pagefunc, pagesize, use_cache=True):
+    def __init__(self, pagefunc, pagesize, use_cache=True, prefetch=0):
         self._pagefunc = pagefunc
         self._pagesize = pagesize
         self._use_cache = use_cache
+        self._prefetch = prefetch
         if use_cache:
             self._cache = {}
 
-    def getslice(self, start=0, end=None):
-        res = []
-        for pagenum in itertools.count(start // self._pagesize):
-            firstid = pagenum * self._pagesize
-            nextfirstid = pagenum * self._pagesize + self._pagesize
-            if start >= nextfirstid:
-                continue
-
-            page_results = None
-            if self._use_cache:
-                page_results = self._cache.get(pagenum)
-            if page_results is None:
-                page_results = list(self._pagefunc(pagenum))
-            if self._use_cache:
-                self._cache[pagenum] = page_results
-
-            startv = (
-                start % self._pagesize
-                if firstid <= start < nextfirstid
-                else 0)
-
-            endv = (
-                ((end - 1) % self._pagesize) + 1
-                if (end is not None and firstid <= end <= nextfirstid)
-                else None)
-
-            if startv != 0 or endv is not None:
-                page_results = page_results[startv:endv]
-            res.extend(page_results)
-
-            # A little optimization - if current page is not "full", ie. does
-            # not contain page_size videos then we can assume that this page
-            # is the last one - there are no more ids on further pages -
-            # i.e. no need to query again.
-            if len(page_results) + startv < self._pagesize:
-                break
+    def _fetch_page(self, pagenum):
+        page_results = None
+        if self._use_cache:
+            page_results = self._cache.get(pagenum)
+        if page_results is None:
+            page_results = super(OnDemandPagedList, self)._fetch_page(pagenum)
+        if self._use_cache:
+            self._cache[pagenum] = page_results
+        return page_results
+
+    def iterslice(self, start=0, end=None, prefetch=None):
+        """ Yield the items of the slice, fetching each page when reached """
+        first_page = start // self._pagesize
+        # pages after the one containing end are never prefetched
+        pagenums = (
+            itertools.count(first_page) if end is None
+            else range(first_page, max(first_page, (end - 1) // self._pagesize) + 1))
+        pages = self._iter_pages(pagenums, prefetch)
+        try:
+            for pagenum, page_results in enumerate(pages, first_page):
+                firstid = pagenum * self._pagesize
+                nextfirstid = pagenum * self._pagesize + self._pagesize
+
+                startv = (
+                    start % self._pagesize
+                    if firstid <= start < nextfirstid
+                    else 0)
+
+                endv = (
+                    ((end - 1) % self._pagesize) + 1
+                    if (end is not None and firstid <= end <= nextfirstid)
+                    else None)
+
+                if startv != 0 or endv is not None:
+                    page_results = page_results[startv:endv]
+                for item in page_results:
+                    yield item
+
+                # A little optimization - if current page is not "full", ie. does
+                # not contain page_size videos then we can assume that this page
+                # is the last one - there are no more ids on further pages -
+                # i.e. no need to query again.
+                if len(page_results) + startv < self._pagesize:
+                    break
 
-            # If we got the whole page, but the next page is not interesting,
-            # break out early as well
-            if end == nextfirstid:
-                break
-        return res
+                # If we got the whole page, but the next page is not interesting,
+                # break out early as well
+                if end == nextfirstid:
+                    break
+        finally:
+            pages.close()
 
 
 class InAdvancePagedList(PagedList):
-    def __init__(self, pagefunc, pagecount, pagesize):
+    def __init__(self, pagefunc, pagecount, pagesize, prefetch=0):
         self._pagefunc = pagefunc
         self._pagecount = pagecount
         self._pagesize = pagesize
+        self._prefetch = prefetch
 
-    def getslice(self, start=0, end=None):
-        res = []
+    def iterslice(self, start=0, end=None, prefetch=None):
+        """ Yield the items of the slice, fetching each page when reached """
         start_page = start // self._pagesize
         end_page = (
-            self._pagecount if end is None else (end // self._pagesize + 1))
+            self._pagecount if end is None
+            else min(self._pagecount, end // self._pagesize + 1))
         skip_elems = start - start_page * self._pagesize
         only_more = None if end is None else end - start
-        for pagenum in range(start_page, end_page):
-            page = list(self._pagefunc(pagenum))
-            if skip_elems:
-                page = page[skip_elems:]
-                skip_elems = None
-            if only_more is not None:
-                if len(page) < only_more:
-                    only_more -= len(page)
-                else:
-                    page = page[:only_more]
-                    res.extend(page)
-                    break
-            res.extend(page)
-        return res
+        pages = self._iter_pages(range(start_page, end_page), prefetch)
+        try:
+            for page in pages:
+                if skip_elems:
+                    page = page[skip_elems:]
+                    skip_elems = None
+                if only_more is not None:
+                    if len(page) < only_more:
+                        only_more -= len(page)
+                    else:
+                        for item in page[:only_more]:
+                            yield item
+                        break
+                for item in page:
+                    yield item
+        finally:
+            pages.close()
 
 
 def uppercase_escape(s):